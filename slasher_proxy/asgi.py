@@ -1,75 +1,479 @@
-from typing import AsyncIterator
+from typing import AsyncIterator, Dict, Optional, Tuple
 
 import asyncio
+import logging
+import os
 from contextlib import asynccontextmanager
 
 from fastapi import FastAPI
 
-from .avalanche import proxy_router
+from .avalanche import proxy_router, query_router
 from .avalanche.block_checker import check_block
+from .avalanche.block_fetcher import BlockFetcher, cchain_rpc_url_from_ws
 from .avalanche.block_parser import parse_and_save_block
+from .avalanche.capture import CaptureLog, Submission, set_capture_log
+from .avalanche.journal import SubmissionJournal, set_submission_journal
+from .avalanche.proxy_router import save_submission, wait_for_fan_outs
+from .avalanche.replacements import ReplacementDetector, set_replacement_detector
 from .avalanche.ws_blocks import WebSocketListener
-from .common.database import start_db
+from .common.async_db import AsyncDatabase, set_async_db
+from .common.backoff import Backoff
+from .common.block_cursor import BlockCursor
+from .common.cluster import ClusterCoordinator
+from .common.database import is_sqlite_dsn, sqlite_filename, start_db
+from .common.deadlines import DeadlineScheduler
 from .common.debug_middleware import debug_exception_middleware
-from .common.log import LOGGER
-from .common.postgres_notify import create_notification_listener
-from .common.settings import get_settings
+from .common.leader import AdvisoryLock, FileLock, LeaderLock, campaign
+from .common.log import LOGGER, configure_logging
+from .common.metrics import REGISTRY, CallbackGauge
+from .common.metrics import router as metrics_router
+from .common.postgres_notify import (
+    BlockNotificationConsumer,
+    consume_block_notifications,
+)
+from .common.profiler import router as profiler_router
+from .common.replica import ReadRouter, bind_database, set_read_router
+from .common.retention import retention_loop
+from .common.settings import ENV_FILE_VARIABLE, SlasherRpcProxySettings, get_settings
+from .common.sqlite_writer import SqliteWriter, call_directly, set_sqlite_writer
+from .common.timing import stage_timing_middleware
+from .common.tx_cache import KNOWN_TXS, warm_known_tx_cache
+
+FAN_OUT_SHUTDOWN_TIMEOUT: float = 10.0
+
+PIPELINE_GAUGES = (
+    "slasher_block_head_height",
+    "slasher_block_processed_height",
+    "slasher_block_lag",
+    "slasher_queue_depth",
+    "slasher_async_db_pool_connections",
+    "slasher_async_db_statement_cache",
+    "slasher_known_tx_cache",
+)
+
+
+def _block_heights(app: FastAPI) -> Tuple[Optional[int], Optional[int]]:
+    """Head height announced by the block source and last verified height."""
+    state = app.state
+    if state.cluster:
+        cursor = state.cluster.cursor
+        return cursor.head_height, cursor.last_processed
+    if state.websocket_listener:
+        listener = state.websocket_listener
+        return listener.fetcher.head_height, listener.last_verified
+    if state.block_notification_consumer:
+        consumer = state.block_notification_consumer
+        return consumer.head_height, consumer.last_verified
+    if state.block_cursor:
+        return state.block_cursor.head_height, state.block_cursor.last_processed
+    return None, None
+
+
+def _queue_depths(app: FastAPI) -> Dict[Tuple[str, ...], float]:
+    state = app.state
+    depths: Dict[Tuple[str, ...], float] = {}
+    if state.websocket_listener:
+        for name, stage in state.websocket_listener.metrics().items():
+            depths[(name,)] = stage["depth"]
+    if state.block_notification_consumer:
+        depths[("notify",)] = state.block_notification_consumer.backlog
+    if state.sqlite_writer:
+        depths[("sqlite_writer",)] = state.sqlite_writer.queue.qsize()
+    if state.journal:
+        depths[("journal",)] = state.journal.backlog
+    if state.deadline_scheduler:
+        depths[("deadlines",)] = state.deadline_scheduler.tracked
+    return depths
+
+
+def _async_db_stats(
+    app: FastAPI, names: Dict[str, str]
+) -> Dict[Tuple[str, ...], float]:
+    """The given AsyncDatabase.stats(), labelled by the names they map to."""
+    if not app.state.async_db:
+        return {}
+    stats = app.state.async_db.stats()
+    return {(label,): stats[key] for key, label in names.items()}
+
+
+def _register_pipeline_gauges(app: FastAPI) -> None:
+    def height(index: int) -> Dict[Tuple[str, ...], float]:
+        value = _block_heights(app)[index]
+        return {} if value is None else {(): value}
+
+    def lag() -> Dict[Tuple[str, ...], float]:
+        head, processed = _block_heights(app)
+        if head is None or processed is None:
+            return {}
+        return {(): max(head - processed, 0)}
+
+    for gauge in (
+        CallbackGauge(
+            "slasher_block_head_height",
+            "Highest block announced by the block source.",
+            (),
+            lambda: height(0),
+        ),
+        CallbackGauge(
+            "slasher_block_processed_height",
+            "Last block persisted and verified.",
+            (),
+            lambda: height(1),
+        ),
+        CallbackGauge(
+            "slasher_block_lag",
+            "Blocks announced but not verified yet.",
+            (),
+            lag,
+        ),
+        CallbackGauge(
+            "slasher_queue_depth",
+            "Items waiting in each ingestion queue.",
+            ("queue",),
+            lambda: _queue_depths(app),
+        ),
+        CallbackGauge(
+            "slasher_async_db_pool_connections",
+            "Connections of the asyncpg pool: open, idle and its bounds.",
+            ("state",),
+            lambda: _async_db_stats(
+                app,
+                {
+                    "pool_size": "open",
+                    "pool_idle": "idle",
+                    "pool_min_size": "min",
+                    "pool_max_size": "max",
+                },
+            ),
+        ),
+        CallbackGauge(
+            "slasher_async_db_statement_cache",
+            "Prepared statement cache of the asyncpg pool: size, hits and misses.",
+            ("stat",),
+            lambda: _async_db_stats(
+                app,
+                {
+                    "statement_cache_size": "size",
+                    "statement_hits": "hits",
+                    "statement_misses": "misses",
+                },
+            ),
+        ),
+        CallbackGauge(
+            "slasher_known_tx_cache",
+            "Known transaction cache: size, capacity, hits, misses (Bloom filter "
+            "positives not in the cache) and negatives.",
+            ("stat",),
+            lambda: {(stat,): value for stat, value in KNOWN_TXS.stats().items()},
+        ),
+    ):
+        REGISTRY.register(gauge)
+
+
+def _leader_lock(settings: SlasherRpcProxySettings) -> LeaderLock:
+    """The lock the workers sharing this database elect their leader with."""
+    if is_sqlite_dsn(settings.dsn):
+        return FileLock(sqlite_filename(settings.dsn) + ".leader")
+    return AdvisoryLock(str(settings.dsn), f"slasher_proxy:{settings.network_name}")
 
 
 @asynccontextmanager
 async def lifespan(app: FastAPI) -> AsyncIterator[None]:
     settings = get_settings()
-    start_db(settings.dsn, network_name=settings.network_name)
+    start_db(
+        settings.dsn,
+        network_name=settings.network_name,
+        sqlite_mmap_size=settings.sqlite_mmap_size,
+        sqlite_cache_size_kib=settings.sqlite_cache_size_kib,
+    )
+    KNOWN_TXS.resize(settings.known_tx_cache_size)
+    # Other workers store transactions this one never hears of; replicas of
+    # a cluster announce theirs.
+    KNOWN_TXS.trust_negatives = settings.workers == 1 or settings.cluster_mode
+    warm_known_tx_cache()
+    if settings.replacement_index_size:
+        set_replacement_detector(ReplacementDetector(settings.replacement_index_size))
 
-    app.state.block_checker_task = None
-    app.state.websocket_listener = None
+    if settings.replica_dsn:
+        set_read_router(
+            ReadRouter(
+                replica=bind_database(settings.replica_dsn),
+                max_lag_blocks=settings.replica_max_lag_blocks,
+                check_interval=settings.replica_lag_check_interval,
+            )
+        )
+
+    app.state.sqlite_writer = None
+    # Blocking writes of the background tasks; on sqlite they all go through
+    # the writer thread, like the submissions.
+    run_write = call_directly
+    if is_sqlite_dsn(settings.dsn):
+        app.state.sqlite_writer = SqliteWriter(settings.sqlite_write_batch_size).start()
+        set_sqlite_writer(app.state.sqlite_writer)
+        run_write = app.state.sqlite_writer.call
 
-    if settings.blocks_channel:
-        LOGGER.info("Starting LISTEN to Postgres")
-        app.state.block_checker_task = asyncio.create_task(
-            create_notification_listener(
-                str(settings.dsn), settings.blocks_channel, check_block
+    app.state.capture_log = None
+    if settings.capture_path:
+        app.state.capture_log = CaptureLog(settings.capture_path)
+        set_capture_log(app.state.capture_log)
+        LOGGER.info("Capturing traffic to %s", settings.capture_path)
+
+    app.state.async_db = None
+    if settings.async_db_enabled:
+        app.state.async_db = await AsyncDatabase(
+            str(settings.dsn),
+            min_size=settings.async_db_pool_min_size,
+            max_size=settings.async_db_pool_max_size,
+            statement_cache_size=settings.async_db_statement_cache_size,
+        ).start()
+        set_async_db(app.state.async_db)
+
+    # Started once the database it drains into is.
+    app.state.journal = None
+    app.state.journal_task = None
+    if settings.journal_path:
+        app.state.journal = SubmissionJournal(
+            settings.journal_path, settings.journal_group_commit_size
+        ).start()
+        set_submission_journal(app.state.journal)
+        notify_channel = settings.cluster_channel if settings.cluster_mode else None
+
+        async def store(submission: Submission) -> None:
+            await save_submission(*submission, notify_channel=notify_channel)
+
+        app.state.journal_task = asyncio.create_task(
+            app.state.journal.drain(
+                store,
+                backoff=Backoff(
+                    settings.reconnect_backoff_base, settings.reconnect_backoff_max
+                ),
             )
         )
-    elif settings.blocks_websocket_url:
-        LOGGER.info("Starting listening to websocket for new blocks")
-        app.state.websocket_listener = WebSocketListener(
-            settings.blocks_websocket_url, parse_and_save_block, check_block
+
+    app.state.block_checker_task = None
+    app.state.websocket_listener = None
+    app.state.block_notification_consumer = None
+    app.state.block_cursor = None
+    app.state.retention_task = None
+    app.state.deadline_scheduler = None
+    app.state.deadline_task = None
+
+    # In a cluster the oldest replica verifies the stored blocks, while the
+    # elected leader only ingests them.
+    app.state.cluster = None
+    app.state.cluster_task = None
+    if settings.cluster_mode:
+        app.state.cluster = ClusterCoordinator(
+            str(settings.dsn),
+            f"slasher_proxy:{settings.network_name}",
+            check_block,
+            channel=settings.cluster_channel,
+            membership_interval=settings.cluster_membership_interval,
+            batch_size=settings.blocks_poll_batch_size,
+            min_interval=settings.blocks_poll_min_interval,
+            max_interval=settings.blocks_poll_max_interval,
+            gap_timeout=settings.blocks_gap_skip_seconds,
+            backoff=Backoff(
+                settings.reconnect_backoff_base, settings.reconnect_backoff_max
+            ),
         )
-        app.state.block_checker_task = asyncio.create_task(
-            app.state.websocket_listener.listen()
+        app.state.cluster_task = asyncio.create_task(app.state.cluster.run())
+
+    async def start_block_processing() -> None:
+        if settings.cluster_mode and not settings.blocks_websocket_url:
+            # The cluster's verifier finds the blocks in the Block table.
+            LOGGER.info("Not ingesting blocks; the cluster verifies stored ones")
+        elif settings.blocks_channel:
+            LOGGER.info("Starting LISTEN to Postgres")
+            app.state.block_notification_consumer = BlockNotificationConsumer(
+                check_block,
+                backoff=Backoff(
+                    settings.reconnect_backoff_base, settings.reconnect_backoff_max
+                ),
+                gap_timeout=settings.blocks_gap_skip_seconds,
+            )
+            app.state.block_checker_task = asyncio.create_task(
+                consume_block_notifications(
+                    str(settings.dsn),
+                    settings.blocks_channel,
+                    app.state.block_notification_consumer,
+                )
+            )
+        elif settings.blocks_websocket_url:
+            LOGGER.info("Starting listening to websocket for new blocks")
+            fetcher = BlockFetcher(
+                settings.blocks_rpc_url
+                or cchain_rpc_url_from_ws(settings.blocks_websocket_url),
+                prefetch=settings.blocks_prefetch,
+                batch_size=settings.blocks_batch_size,
+                streaming=settings.blocks_streaming_parser,
+            )
+            app.state.websocket_listener = WebSocketListener(
+                settings.blocks_websocket_url,
+                parse_and_save_block,
+                check_block,
+                fetcher=fetcher,
+                queue_size=settings.pipeline_queue_size,
+                node_id_ttl=settings.node_id_ttl,
+                backoff=Backoff(
+                    settings.reconnect_backoff_base, settings.reconnect_backoff_max
+                ),
+                async_db=app.state.async_db,
+                run_write=run_write,
+                verify=not settings.cluster_mode,
+            )
+            app.state.block_checker_task = asyncio.create_task(
+                app.state.websocket_listener.listen()
+            )
+        elif settings.blocks_polling:
+            LOGGER.info("Starting polling the database for new blocks")
+            app.state.block_cursor = BlockCursor(
+                check_block,
+                batch_size=settings.blocks_poll_batch_size,
+                min_interval=settings.blocks_poll_min_interval,
+                max_interval=settings.blocks_poll_max_interval,
+                gap_timeout=settings.blocks_gap_skip_seconds,
+                backoff=Backoff(
+                    settings.reconnect_backoff_base, settings.reconnect_backoff_max
+                ),
+                run_write=run_write,
+            )
+            app.state.block_checker_task = asyncio.create_task(
+                app.state.block_cursor.run()
+            )
+        else:
+            LOGGER.info(
+                "Can't LISTEN to postgres blocks updates: "
+                "no NOTIFY channel name or websocket URL is provided."
+                "BLOCKS_CHANNEL env var or settings.blocks_channel "
+                "field must be set to a valid channel name "
+                "for Postgres LISTEN to work correctly!"
+            )
+
+        if settings.retention_blocks:
+            app.state.retention_task = asyncio.create_task(
+                retention_loop(
+                    settings.retention_blocks,
+                    settings.retention_interval,
+                    settings.retention_batch_size,
+                    settings.retention_max_batches,
+                    run_write,
+                )
+            )
+
+        if settings.deadline_blocks or settings.deadline_seconds:
+            app.state.deadline_scheduler = DeadlineScheduler(
+                settings.deadline_blocks,
+                settings.deadline_seconds,
+                interval=settings.deadline_interval,
+                run_write=run_write,
+            )
+            app.state.deadline_task = asyncio.create_task(
+                app.state.deadline_scheduler.run()
+            )
+
+    async def stop_block_processing() -> None:
+        tasks = [
+            task
+            for task in (
+                app.state.retention_task,
+                app.state.deadline_task,
+                app.state.block_checker_task,
+            )
+            if task
+        ]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        if app.state.websocket_listener:
+            await app.state.websocket_listener.fetcher.close()
+        app.state.retention_task = app.state.block_checker_task = None
+        app.state.deadline_task = app.state.deadline_scheduler = None
+        app.state.websocket_listener = None
+        app.state.block_notification_consumer = None
+        app.state.block_cursor = None
+
+    # With several workers or replicas, only the elected one ingests blocks
+    # (and, outside a cluster, verifies them); the others serve requests.
+    app.state.leader_task = None
+    if settings.workers > 1 or settings.cluster_mode:
+        app.state.leader_task = asyncio.create_task(
+            campaign(
+                _leader_lock(settings),
+                start_block_processing,
+                stop_block_processing,
+                settings.leader_election_interval,
+                backoff=Backoff(
+                    settings.reconnect_backoff_base, settings.reconnect_backoff_max
+                ),
+            )
         )
     else:
-        LOGGER.info(
-            "Can't LISTEN to postgres blocks updates: "
-            "no NOTIFY channel name or websocket URL is provided."
-            "BLOCKS_CHANNEL env var or settings.blocks_channel "
-            "field must be set to a valid channel name "
-            "for Postgres LISTEN to work correctly!"
-        )
+        await start_block_processing()
 
+    _register_pipeline_gauges(app)
     try:
         yield
     finally:
-        if app.state.block_checker_task:
-            LOGGER.info("Stopping LISTEN to Postgres")
-            app.state.block_checker_task.cancel()
+        for name in PIPELINE_GAUGES:
+            REGISTRY.unregister(name)
+        # Responses of the slower validators, before the stores close.
+        await wait_for_fan_outs(FAN_OUT_SHUTDOWN_TIMEOUT)
+        if app.state.leader_task:
+            app.state.leader_task.cancel()
+            await asyncio.gather(app.state.leader_task, return_exceptions=True)
+        else:
+            await stop_block_processing()
+        if app.state.cluster_task:
+            app.state.cluster_task.cancel()
+            await asyncio.gather(app.state.cluster_task, return_exceptions=True)
+        if app.state.journal:
+            # What is left is drained on the next start.
+            set_submission_journal(None)
+            if app.state.journal_task:
+                app.state.journal_task.cancel()
+                await asyncio.gather(app.state.journal_task, return_exceptions=True)
+            app.state.journal.stop()
+        if app.state.capture_log:
+            set_capture_log(None)
+            app.state.capture_log.close()
+        if app.state.async_db:
+            set_async_db(None)
+            await app.state.async_db.close()
+        if app.state.sqlite_writer:
+            set_sqlite_writer(None)
+            app.state.sqlite_writer.stop()
+        set_replacement_detector(None)
 
 
 def create_slasher_app() -> FastAPI:
     settings = get_settings()
-    level = settings.log_level  # str | None
-    if level is None:
-        level_num = 20
-    elif level.isdigit():
-        level_num = int(level)
-    else:
-        level_num = 20
-    LOGGER.setLevel(level_num)
+    # log_level is validated to be one of the standard level names.
+    configure_logging(
+        logging.getLevelName(settings.log_level or "INFO"),
+        json_format=settings.log_json,
+        non_blocking=settings.log_non_blocking,
+        queue_size=settings.log_queue_size,
+    )
     app = FastAPI(title="Slasher RPC Proxy", lifespan=lifespan)
 
     app.middleware("http")(debug_exception_middleware)
+    app.middleware("http")(
+        stage_timing_middleware(
+            server_timing=settings.server_timing,
+            slow_request_seconds=settings.slow_request_seconds,
+        )
+    )
     app.include_router(proxy_router.router)
+    app.include_router(query_router.router)
+    app.include_router(metrics_router)
+    app.include_router(profiler_router)
     LOGGER.info("Returning app instance")
 
     return app
+
+
+def create_worker_app() -> FastAPI:
+    """create_slasher_app() for a uvicorn worker process (see cli.avalanche)."""
+    get_settings(os.environ.get(ENV_FILE_VARIABLE))
+    return create_slasher_app()
@@ -0,0 +1,335 @@
+# asyncpg versions of the hot-path database operations. Each function runs in
+# one transaction and replaces the per-row ORM round trips of its Pony
+# counterpart with a few set-based statements over the tables Pony generates
+# on Postgres (lower-cased entity names).
+from typing import Any, Dict, Optional
+
+import time
+from datetime import datetime
+
+from slasher_proxy.avalanche.block_checker import CommitmentState, plan_block_check
+from slasher_proxy.avalanche.block_fetcher import FetchedBlock
+from slasher_proxy.avalanche.block_parser import compact_block_from_json
+from slasher_proxy.avalanche.block_stream import CompactBlock
+from slasher_proxy.avalanche.replacements import get_replacement_detector
+from slasher_proxy.common import (
+    C_STATUS_OMITTED,
+    C_STATUS_PENDING,
+    C_STATUS_UNEXPECTED,
+    T_STATUS_IN_BLOCK,
+    T_STATUS_SUBMITTED,
+    UNKNOWN_SENDER,
+)
+from slasher_proxy.common.async_db import AsyncDatabase
+from slasher_proxy.common.checkpoint import LAST_PROCESSED_BLOCK_KEY
+from slasher_proxy.common.cluster import known_tx_message
+from slasher_proxy.common.log import LOGGER
+from slasher_proxy.common.metrics import (
+    BLOCK_TRANSACTIONS,
+    CHECK_BLOCK_SECONDS,
+    record_transitions,
+)
+
+INSERT_SUBMITTED_TX = """
+INSERT INTO "transaction" (hash, status, created_at, from_address, nonce, replaces)
+VALUES ($1, $2, $3, $4, 0, $5)
+ON CONFLICT (hash) DO NOTHING
+RETURNING hash
+"""
+
+# For a transaction stored before its replacement was known.
+SET_REPLACES = """
+UPDATE "transaction" SET replaces = t.r
+FROM unnest($1::bytea[], $2::bytea[]) AS t(h, r)
+WHERE hash = t.h AND replaces IS NULL
+"""
+
+# Nothing is returned for a duplicate submission.
+INSERT_COMMITMENT = """
+INSERT INTO commitment (node, tx_hash, "index", accumulator, status, created_at)
+VALUES ($1, $2, $3, $4, $5, $6)
+ON CONFLICT (node, tx_hash) DO NOTHING
+RETURNING id
+"""
+
+NOTIFY = "SELECT pg_notify($1, $2)"
+
+BUMP_NODE_STATS = """
+INSERT INTO nodestats
+    (node, total_transactions, reordered_count, censored_count, last_updated)
+VALUES ($1, 1, 0, 0, $2)
+ON CONFLICT (node) DO UPDATE
+SET total_transactions = nodestats.total_transactions + 1
+"""
+
+INSERT_BLOCK = """
+INSERT INTO block (number, hash, node_id, created_at)
+VALUES ($1, $2, $3, $4)
+ON CONFLICT (hash) DO NOTHING
+"""
+
+# Transactions submitted through the proxy get their real sender and nonce.
+UPSERT_BLOCK_TXS = """
+INSERT INTO "transaction" (hash, status, created_at, from_address, nonce)
+SELECT h, $4, $5, f, n FROM unnest($1::bytea[], $2::text[], $3::int[]) AS t(h, f, n)
+ON CONFLICT (hash) DO UPDATE
+SET from_address = EXCLUDED.from_address, nonce = EXCLUDED.nonce
+WHERE "transaction".from_address = $6 AND EXCLUDED.from_address <> ''
+"""
+
+INSERT_BLOCK_TXS = """
+INSERT INTO blocktransaction (block, "transaction", "order")
+SELECT $1, h, o FROM unnest($2::bytea[], $3::int[]) AS t(h, o)
+ON CONFLICT DO NOTHING
+"""
+
+SELECT_BLOCK_NODE = "SELECT node_id FROM block WHERE number = $1"
+
+SELECT_BLOCK_TXS = """
+SELECT bt."order", t.hash, t.replaces
+FROM blocktransaction bt JOIN "transaction" t ON t.hash = bt."transaction"
+WHERE bt.block = $1
+ORDER BY bt."order"
+"""
+
+SELECT_BLOCK_STATE = """
+SELECT offset_index, shift_index FROM blockstate WHERE block_number = $1
+"""
+
+SELECT_COMMITMENTS = """
+SELECT id, tx_hash, "index", status FROM commitment
+WHERE node = $1 AND tx_hash = ANY($2::bytea[])
+"""
+
+MARK_TXS_IN_BLOCK = """
+UPDATE "transaction" SET status = $2 WHERE hash = ANY($1::bytea[])
+"""
+
+UPDATE_COMMITMENT_STATUSES = """
+UPDATE commitment c SET status = v.status
+FROM unnest($1::int[], $2::int[]) AS v(id, status)
+WHERE c.id = v.id
+"""
+
+INSERT_UNEXPECTED_COMMITMENTS = """
+INSERT INTO commitment (node, tx_hash, "index", status, created_at)
+SELECT $1, h, i, $4, $5 FROM unnest($2::bytea[], $3::int[]) AS t(h, i)
+"""
+
+MARK_OMITTED = """
+UPDATE commitment SET status = $6
+WHERE id IN (
+    SELECT id FROM commitment
+    WHERE status = $5 AND node = $1 AND "index" >= $2 AND "index" < $3
+    ORDER BY "index"
+    LIMIT $4
+)
+RETURNING id
+"""
+
+INSERT_BLOCK_STATE = """
+INSERT INTO blockstate (block_number, offset_index, shift_index)
+VALUES ($1, $2, $3)
+"""
+
+SET_LAST_PROCESSED_BLOCK = """
+INSERT INTO auxiliarydata (key, value) VALUES ($1, $2::int::text)
+ON CONFLICT (key) DO UPDATE SET value = EXCLUDED.value
+WHERE auxiliarydata.value::int < EXCLUDED.value::int
+"""
+
+
+async def record_submission(
+    adb: AsyncDatabase,
+    node_id: str,
+    tx_hash: bytes,
+    tx_index: int,
+    node_commitment: bytes,
+    replaces: Optional[bytes] = None,
+    notify_channel: Optional[str] = None,
+) -> bool:
+    """
+    Store a transaction accepted by the validator with its commitment, and
+    the transaction it replaces, if known.
+    Returns False for a duplicate submission, which is not recorded again.
+    With ``notify_channel``, a new transaction is announced to the other
+    replicas of a cluster.
+    """
+    now = datetime.now()
+    async with adb.transaction() as conn:
+        inserted = await adb.fetchrow(
+            conn,
+            INSERT_SUBMITTED_TX,
+            tx_hash,
+            T_STATUS_SUBMITTED,
+            now,
+            UNKNOWN_SENDER,
+            replaces,
+        )
+        if inserted is not None and notify_channel:
+            await adb.execute(conn, NOTIFY, notify_channel, known_tx_message(tx_hash))
+        elif inserted is None and replaces:
+            await adb.execute(conn, SET_REPLACES, [tx_hash], [replaces])
+        recorded = await adb.fetchrow(
+            conn,
+            INSERT_COMMITMENT,
+            node_id,
+            tx_hash,
+            tx_index,
+            node_commitment,
+            C_STATUS_PENDING,
+            now,
+        )
+        if recorded is None:
+            LOGGER.info("Duplicate submission of %s to %s", tx_hash.hex(), node_id)
+            return False
+        await adb.execute(conn, BUMP_NODE_STATS, node_id, datetime.utcnow())
+    return True
+
+
+async def save_block(
+    adb: AsyncDatabase, block: FetchedBlock, node_id: str
+) -> Dict[str, Any]:
+    """Bulk counterpart of block_parser.parse_and_save_block()."""
+    if isinstance(block, CompactBlock):
+        compact_block = block
+    else:
+        compact_block = compact_block_from_json(block)
+    height = compact_block.number
+    txs = compact_block.transactions
+    hashes = [tx.hash for tx in txs]
+    detector = get_replacement_detector()
+    replacements = detector.find(txs) if detector else {}
+    now = datetime.now()
+    async with adb.transaction() as conn:
+        await adb.execute(conn, INSERT_BLOCK, height, compact_block.hash, node_id, now)
+        await adb.execute(
+            conn,
+            UPSERT_BLOCK_TXS,
+            hashes,
+            [tx.from_address for tx in txs],
+            [tx.nonce for tx in txs],
+            T_STATUS_SUBMITTED,
+            now,
+            UNKNOWN_SENDER,
+        )
+        if replacements:
+            await adb.execute(
+                conn,
+                SET_REPLACES,
+                list(replacements),
+                list(replacements.values()),
+            )
+        await adb.execute(
+            conn, INSERT_BLOCK_TXS, height, hashes, [tx.order for tx in txs]
+        )
+    if detector:
+        detector.evict(txs)
+    LOGGER.info("Block %s processed with %s transactions", height, len(txs))
+    return {"height": height, "transaction_count": len(txs)}
+
+
+async def check_block(
+    adb: AsyncDatabase, block_number: int, checkpoint: bool = False
+) -> None:
+    """
+    Bulk counterpart of block_checker.check_block(): the same decisions, made
+    by plan_block_check() over rows loaded with three queries. With
+    ``checkpoint`` the block also becomes the last processed one, in the same
+    transaction.
+    """
+    LOGGER.debug("Processing block %s for verification.", block_number)
+    started = time.perf_counter()
+    async with adb.transaction() as conn:
+        block = await adb.fetchrow(conn, SELECT_BLOCK_NODE, block_number)
+        if block is None:
+            LOGGER.error("Block %s not found in database.", block_number)
+            return
+        node_id = block["node_id"]
+        txs = [
+            (
+                row["order"],
+                bytes(row["hash"]),
+                row["replaces"] and bytes(row["replaces"]),
+            )
+            for row in await adb.fetch(conn, SELECT_BLOCK_TXS, block_number)
+        ]
+        LOGGER.debug("Block %s contains %s transactions.", block_number, len(txs))
+
+        prev_state = await adb.fetchrow(conn, SELECT_BLOCK_STATE, block_number - 1)
+        if prev_state is None:
+            LOGGER.warning(
+                "State for block %s not found. Initializing new state.",
+                block_number - 1,
+            )
+            offset_index, shift_index = 0, 0
+        else:
+            offset_index, shift_index = prev_state
+
+        lookup = [tx_hash for _, tx_hash, _ in txs]
+        lookup.extend(replaces for _, _, replaces in txs if replaces)
+        commitments = {
+            bytes(row["tx_hash"]): CommitmentState(
+                row["id"], row["index"], row["status"]
+            )
+            for row in await adb.fetch(conn, SELECT_COMMITMENTS, node_id, lookup)
+        }
+        plan = plan_block_check(txs, commitments, offset_index, shift_index)
+
+        await adb.execute(
+            conn,
+            MARK_TXS_IN_BLOCK,
+            [tx_hash for _, tx_hash, _ in txs],
+            T_STATUS_IN_BLOCK,
+        )
+        changed = [c for c in commitments.values() if c.changed]
+        if changed:
+            await adb.execute(
+                conn,
+                UPDATE_COMMITMENT_STATUSES,
+                [c.id for c in changed],
+                [c.status for c in changed],
+            )
+        if plan.unexpected:
+            await adb.execute(
+                conn,
+                INSERT_UNEXPECTED_COMMITMENTS,
+                node_id,
+                [tx_hash for tx_hash, _ in plan.unexpected],
+                [index for _, index in plan.unexpected],
+                C_STATUS_UNEXPECTED,
+                datetime.now(),
+            )
+        omitted = await adb.fetch(
+            conn,
+            MARK_OMITTED,
+            node_id,
+            plan.start_range,
+            plan.end_range,
+            plan.total_new_txs,
+            C_STATUS_PENDING,
+            C_STATUS_OMITTED,
+        )
+        await adb.execute(
+            conn,
+            INSERT_BLOCK_STATE,
+            block_number,
+            plan.offset_index,
+            plan.shift_index,
+        )
+        if checkpoint:
+            await adb.execute(
+                conn, SET_LAST_PROCESSED_BLOCK, LAST_PROCESSED_BLOCK_KEY, block_number
+            )
+    CHECK_BLOCK_SECONDS.observe(time.perf_counter() - started)
+    BLOCK_TRANSACTIONS.observe(len(txs))
+    record_transitions(node_id, {**plan.transitions, "omitted": len(omitted)})
+    LOGGER.info("Block %s processed.", block_number)
+
+
+async def set_last_processed_block(adb: AsyncDatabase, height: int) -> None:
+    """checkpoint.set_last_processed_block() over the pool."""
+    async with adb.transaction() as conn:
+        await adb.execute(
+            conn, SET_LAST_PROCESSED_BLOCK, LAST_PROCESSED_BLOCK_KEY, height
+        )
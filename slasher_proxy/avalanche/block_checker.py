@@ -1,4 +1,9 @@
 # block_checker.py
+from typing import Dict, Iterable, List, NamedTuple, Optional, Tuple
+
+import logging
+import time
+from collections import Counter
 
 from pony.orm import db_session
 
@@ -11,30 +16,58 @@ from slasher_proxy.common import (
     C_STATUS_UNEXPECTED,
     T_STATUS_IN_BLOCK,
 )
-from slasher_proxy.common.log import LOGGER
-from slasher_proxy.common.model import Block, BlockState, Commitment, Transaction
+from slasher_proxy.common.log import LOGGER, RateLimitedLog
+from slasher_proxy.common.metrics import (
+    BLOCK_TRANSACTIONS,
+    CHECK_BLOCK_SECONDS,
+    record_transitions,
+)
+from slasher_proxy.common.model import Block, BlockState, BlockTransaction, Commitment
+
+# Per-transaction messages; a block full of them would otherwise flood the log.
+_log_reordered = RateLimitedLog(LOGGER, logging.INFO)
+_log_already_processed = RateLimitedLog(LOGGER, logging.WARNING)
+_log_unexpected = RateLimitedLog(LOGGER, logging.INFO)
+# Hashes per IN list, below sqlite's limit of bound parameters.
+_LOOKUP_CHUNK: int = 500
 
 
-@db_session
 def check_block(block_number: int) -> None:
     """
     Check the block and update the commitment status.
     """
-    LOGGER.info(f"Processing block {block_number} for verification.")
+    started = time.perf_counter()
+    result = _check_block(block_number)
+    if result is not None:
+        node_id, tx_count, transitions = result
+        CHECK_BLOCK_SECONDS.observe(time.perf_counter() - started)
+        BLOCK_TRANSACTIONS.observe(tx_count)
+        record_transitions(node_id, transitions)
+
+
+@db_session
+def _check_block(block_number: int) -> Optional[Tuple[str, int, Dict[str, int]]]:
+    """
+    check_block() without the metrics: the decisions of plan_block_check(),
+    applied through Pony. Returns the node, the transaction count and the
+    status changes by name, or None if the block is missing.
+    """
+    LOGGER.debug("Processing block %s for verification.", block_number)
     block = Block.get(number=block_number)
     if not block:
-        LOGGER.error(f"Block {block_number} not found in database.")
-        return
+        LOGGER.error("Block %s not found in database.", block_number)
+        return None
 
     node_id = block.node_id
-    tx_list = block.block_transactions
+    links = block.block_transactions.select().order_by(BlockTransaction.order)[:]
+    txs = [(bt.order, bt.transaction.hash, bt.transaction.replaces) for bt in links]
 
-    LOGGER.info(f"Block {block_number} contains {len(tx_list)} transactions.")
+    LOGGER.debug("Block %s contains %s transactions.", block_number, len(txs))
 
     prev_block_state = BlockState.get(block_number=block_number - 1)
     if not prev_block_state:
         LOGGER.warning(
-            f"State for block {block_number - 1} not found. Initializing new state."
+            "State for block %s not found. Initializing new state.", block_number - 1
         )
         offset_index = 0
         shift_index = 0
@@ -42,65 +75,136 @@ def check_block(block_number: int) -> None:
         offset_index = prev_block_state.offset_index
         shift_index = prev_block_state.shift_index
 
+    lookup = [tx_hash for _, tx_hash, _ in txs]
+    lookup.extend(replaces for _, _, replaces in txs if replaces)
+    entities: Dict[bytes, Commitment] = {}
+    for start in range(0, len(lookup), _LOOKUP_CHUNK):
+        chunk = lookup[start : start + _LOOKUP_CHUNK]
+        for c in Commitment.select(lambda c: c.node == node_id and c.tx_hash in chunk):
+            entities[c.tx_hash] = c
+    commitments = {
+        tx_hash: CommitmentState(c.id, c.index, c.status)
+        for tx_hash, c in entities.items()
+    }
+    plan = plan_block_check(txs, commitments, offset_index, shift_index)
+
+    for bt in links:
+        bt.transaction.status = T_STATUS_IN_BLOCK
+    for tx_hash, state in commitments.items():
+        if state.changed:
+            entities[tx_hash].status = state.status
+    for tx_hash, index in plan.unexpected:
+        Commitment(
+            node=node_id, tx_hash=tx_hash, index=index, status=C_STATUS_UNEXPECTED
+        )
+
+    transitions = Counter(plan.transitions)
+    omitted = Commitment.select(
+        lambda c: c.status == C_STATUS_PENDING
+        and c.node == node_id
+        and c.index >= plan.start_range
+        and c.index < plan.end_range
+    ).order_by(Commitment.index)[: plan.total_new_txs]
+    for c in omitted:
+        c.status = C_STATUS_OMITTED
+        transitions["omitted"] += 1
+    BlockState(
+        block_number=block_number,
+        offset_index=plan.offset_index,
+        shift_index=plan.shift_index,
+    )
+    LOGGER.info("Block %s processed.", block_number)
+    return node_id, len(txs), transitions
+
+
+class CommitmentState:
+    """The columns of a commitment that block verification reads and changes."""
+
+    __slots__ = ("id", "index", "status", "changed")
+
+    def __init__(self, id: int, index: int, status: int) -> None:
+        self.id = id
+        self.index = index
+        self.status = status
+        self.changed = False
+
+    def set_status(self, status: int) -> None:
+        self.status = status
+        self.changed = True
+
+
+class BlockCheckPlan(NamedTuple):
+    # commitments for transactions that had none: (tx_hash, index)
+    unexpected: List[Tuple[bytes, int]]
+    start_range: int
+    end_range: int
+    # how many pending commitments of the range to mark omitted
+    total_new_txs: int
+    offset_index: int
+    shift_index: int
+    # status changes made on the CommitmentStates, by status name
+    transitions: Dict[str, int]
+
+
+def plan_block_check(
+    txs: Iterable[Tuple[int, bytes, Optional[bytes]]],
+    commitments: Dict[bytes, CommitmentState],
+    offset_index: int,
+    shift_index: int,
+) -> BlockCheckPlan:
+    """
+    The decisions of check_block() for data loaded up front, so they can be
+    applied with a few bulk statements (see async_ops).
+
+    ``txs`` holds (order, hash, replaces) per block transaction in block order
+    and ``commitments`` the node's commitments for those hashes and for the
+    hashes they replace. Status changes are made on the CommitmentState
+    objects; everything else is returned.
+    """
     reordered_txs = 0
+    tx_count = 0
     start_range = offset_index + 1
     processed_indexes = set()
-    current_order = 0
-    for tx in tx_list:
-        current_order = tx.order
-        tx_hash = tx.transaction.hash
-        comm = Commitment.get(node=node_id, tx_hash=tx_hash)
-        tx_obj = Transaction.get(hash=tx_hash)
-        if tx_obj:
-            tx_obj.status = T_STATUS_IN_BLOCK
-            # Check if this transaction is a replacement
-            if tx_obj.replaces:
-                replaced_tx_hash = tx_obj.replaces
-                replaced_comm = Commitment.get(node=node_id, tx_hash=replaced_tx_hash)
-                if replaced_comm and replaced_comm.status in [
-                    C_STATUS_PENDING,
-                    C_STATUS_OMITTED,
-                ]:
-                    replaced_comm.status = C_STATUS_REVOKED
+    unexpected: List[Tuple[bytes, int]] = []
+    transitions: Dict[str, int] = Counter()
+    for order, tx_hash, replaces in txs:
+        tx_count += 1
+        current_order = order
+        if replaces:
+            replaced_comm = commitments.get(replaces)
+            if replaced_comm and replaced_comm.status in [
+                C_STATUS_PENDING,
+                C_STATUS_OMITTED,
+            ]:
+                replaced_comm.set_status(C_STATUS_REVOKED)
+                transitions["revoked"] += 1
+        comm = commitments.get(tx_hash)
         if comm:
             if comm.status == C_STATUS_OMITTED:
                 reordered_txs += 1
-                comm.status = C_STATUS_REORDERED
-                LOGGER.info(f"Commitment {comm.index} reordered.")
+                comm.set_status(C_STATUS_REORDERED)
+                transitions["reordered"] += 1
+                _log_reordered("Commitment %s reordered.", comm.index)
             elif comm.status == C_STATUS_PENDING:
                 processed_indexes.add(comm.index)
-                comm.status = C_STATUS_FULFILLED
+                comm.set_status(C_STATUS_FULFILLED)
+                transitions["fulfilled"] += 1
             elif comm.status in [C_STATUS_REORDERED, C_STATUS_FULFILLED]:
-                LOGGER.warning(f"Commitment {comm.index} already processed.")
+                _log_already_processed("Commitment %s already processed.", comm.index)
         else:
-            LOGGER.info(f"New commitment for tx {tx_hash} found.")
-            # Save new commitment
-            Commitment(
-                node=node_id,
-                tx_hash=tx_hash,
-                index=current_order + 1,
-                status=C_STATUS_UNEXPECTED,
-            )
-            current_order += 1
-
-    total_new_txs = len(tx_list) - reordered_txs
-    end_range = start_range + total_new_txs + shift_index
-    processing_range = set(range(start_range, end_range))
-    out_of_range_txs = len(processed_indexes - processing_range)
+            _log_unexpected("New commitment for tx %r found.", tx_hash)
+            unexpected.append((tx_hash, current_order + 1))
+            transitions["unexpected"] += 1
 
-    commitments = Commitment.select(
-        lambda c: c.status == C_STATUS_PENDING
-        and c.node == node_id
-        and c.index >= start_range
-        and c.index < end_range
-    ).order_by(Commitment.index)[:total_new_txs]
-    for c in commitments:
-        c.status = C_STATUS_OMITTED
-    shift_index += out_of_range_txs
-    offset_index += total_new_txs
-    BlockState(
-        block_number=block_number,
-        offset_index=offset_index,
-        shift_index=shift_index,
+    total_new_txs = tx_count - reordered_txs
+    end_range = start_range + total_new_txs + shift_index
+    out_of_range_txs = len(processed_indexes - set(range(start_range, end_range)))
+    return BlockCheckPlan(
+        unexpected=unexpected,
+        start_range=start_range,
+        end_range=end_range,
+        total_new_txs=total_new_txs,
+        offset_index=offset_index + total_new_txs,
+        shift_index=shift_index + out_of_range_txs,
+        transitions=transitions,
     )
-    LOGGER.info(f"Block {block_number} processed.")
@@ -0,0 +1,308 @@
+from types import TracebackType
+from typing import Any, AsyncIterator, Dict, List, Optional, Type, Union
+
+import asyncio
+import time
+from urllib.parse import urlparse
+
+import aiohttp
+
+from slasher_proxy.avalanche.block_stream import CompactBlock, extract_blocks
+from slasher_proxy.common.log import LOGGER
+from slasher_proxy.common.metrics import UPSTREAM_REQUEST_SECONDS
+
+DEFAULT_PREFETCH: int = 8
+DEFAULT_MAX_CONNECTIONS: int = 8
+DEFAULT_REQUEST_TIMEOUT: float = 10.0
+DEFAULT_RETRIES: int = 3
+DEFAULT_BATCH_SIZE: int = 20
+
+# A decoded JSON-RPC response, or a CompactBlock in streaming mode.
+FetchedBlock = Union[Dict[str, Any], CompactBlock]
+
+# Single and batched block requests alike.
+_FETCH_SECONDS = UPSTREAM_REQUEST_SECONDS.labels("eth_getBlockByNumber")
+
+
+def block_height(block: FetchedBlock) -> int:
+    if isinstance(block, CompactBlock):
+        return block.number
+    return int(block["result"]["number"], 16)
+
+
+def http_base_from_ws(url: str) -> str:
+    """Convert a ws(s):// node URL into the matching http(s)://host:port base."""
+    parsed_url = urlparse(url)
+    hostname = parsed_url.hostname
+    port = parsed_url.port or (443 if parsed_url.scheme == "wss" else 80)
+    rpc_scheme = "https" if parsed_url.scheme == "wss" else "http"
+    return f"{rpc_scheme}://{hostname}:{port}"
+
+
+def cchain_rpc_url_from_ws(url: str) -> str:
+    """C-Chain JSON-RPC endpoint served by the same node as the websocket URL."""
+    return f"{http_base_from_ws(url)}/ext/bc/C/rpc"
+
+
+class BlockFetcher:
+    """
+    Fetches full C-Chain blocks (with transaction objects) for heights announced
+    by a header-only source, such as a ``newHeads`` subscription.
+
+    All requests go through a single pooled aiohttp session. Up to ``prefetch``
+    requests run concurrently ahead of the consumer, while ``next_block`` hands
+    blocks out strictly in ascending height order. When the consumer lags
+    behind the head, e.g. while backfilling after a reconnect, consecutive
+    heights are fetched ``batch_size`` at a time with JSON-RPC batch requests.
+
+    With ``streaming`` set, response bodies are never decoded as a whole: the
+    fields ingestion needs are pulled from the raw bytes into CompactBlocks.
+    """
+
+    def __init__(
+        self,
+        rpc_url: str,
+        prefetch: int = DEFAULT_PREFETCH,
+        max_connections: int = DEFAULT_MAX_CONNECTIONS,
+        timeout: float = DEFAULT_REQUEST_TIMEOUT,
+        retries: int = DEFAULT_RETRIES,
+        batch_size: int = DEFAULT_BATCH_SIZE,
+        streaming: bool = False,
+    ) -> None:
+        if prefetch < 1:
+            raise ValueError("prefetch must be at least 1")
+        self.rpc_url = rpc_url
+        self.prefetch = prefetch
+        self.max_connections = max_connections
+        self.timeout = timeout
+        self.retries = retries
+        self.batch_size = max(batch_size, 1)
+        self.streaming = streaming
+        self.next_height: Optional[int] = None  # next height to hand out
+        self.head_height: Optional[int] = None  # highest announced height
+        self._session: Optional[aiohttp.ClientSession] = None
+        self._inflight: Dict[int, "asyncio.Future[FetchedBlock]"] = {}
+        self._tasks: "set[asyncio.Task[None]]" = set()
+        self._head_changed = asyncio.Event()
+        self._announced_at: Dict[int, float] = {}
+
+    async def __aenter__(self) -> "BlockFetcher":
+        return self
+
+    async def __aexit__(
+        self,
+        exc_type: Optional[Type[BaseException]],
+        exc: Optional[BaseException],
+        tb: Optional[TracebackType],
+    ) -> None:
+        await self.close()
+
+    def _get_session(self) -> aiohttp.ClientSession:
+        if self._session is None or self._session.closed:
+            self._session = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(limit=self.max_connections),
+                timeout=aiohttp.ClientTimeout(total=self.timeout),
+            )
+        return self._session
+
+    async def close(self) -> None:
+        self._cancel_inflight()
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
+
+    @staticmethod
+    def _request(number: int) -> Dict[str, Any]:
+        return {
+            "jsonrpc": "2.0",
+            "id": number,
+            "method": "eth_getBlockByNumber",
+            "params": [hex(number), True],
+        }
+
+    @staticmethod
+    def _check_response(number: int, data: Dict[str, Any]) -> Dict[str, Any]:
+        if "error" in data:
+            raise ValueError(f"RPC error: {data['error']}")
+        if not isinstance(data.get("result"), dict):
+            # The node announced the header but cannot serve the body yet.
+            raise ValueError(f"Block {number} is not available yet")
+        return data
+
+    async def _post(self, payload: Any, label: str) -> Any:
+        last_error: Optional[Exception] = None
+        for attempt in range(1, self.retries + 1):
+            started = time.perf_counter()
+            try:
+                async with self._get_session().post(
+                    self.rpc_url, json=payload
+                ) as response:
+                    response.raise_for_status()
+                    if self.streaming:
+                        data = await response.read()
+                    else:
+                        data = await response.json()
+                _FETCH_SECONDS.observe(time.perf_counter() - started)
+                return data
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                last_error = e
+                LOGGER.warning(
+                    "Fetching %s failed (attempt %s/%s): %s",
+                    label,
+                    attempt,
+                    self.retries,
+                    e,
+                )
+                await asyncio.sleep(0.1 * attempt)
+        raise RuntimeError(f"Failed to fetch {label}: {last_error}")
+
+    async def fetch_block(self, number: int) -> FetchedBlock:
+        """
+        Fetch one block with full transactions. Returns the JSON-RPC response,
+        i.e. a dict with the block under the "result" key, or a CompactBlock
+        in streaming mode.
+        """
+        last_error: Optional[Exception] = None
+        for attempt in range(1, self.retries + 1):
+            data = await self._post(self._request(number), f"block {number}")
+            try:
+                if self.streaming:
+                    blocks = extract_blocks(data)
+                    if len(blocks) != 1:
+                        raise ValueError(f"Block {number} is not available yet")
+                    return blocks[0]
+                return self._check_response(number, data)
+            except ValueError as e:
+                last_error = e
+                await asyncio.sleep(0.1 * attempt)
+        raise RuntimeError(f"Failed to fetch block {number}: {last_error}")
+
+    async def fetch_blocks(self, numbers: List[int]) -> Dict[int, FetchedBlock]:
+        """
+        Fetch several blocks in one JSON-RPC batch request. Heights missing
+        from the reply or answered with an error are left out of the result.
+        """
+        label = f"blocks {numbers[0]}..{numbers[-1]}"
+        replies = await self._post([self._request(n) for n in numbers], label)
+        blocks: Dict[int, FetchedBlock] = {}
+        if self.streaming:
+            for compact in extract_blocks(replies):
+                blocks[compact.number] = compact
+            return blocks
+        if not isinstance(replies, list):
+            raise ValueError(f"Unexpected batch reply for {label}: {replies}")
+        for reply in replies:
+            number = reply.get("id")
+            try:
+                blocks[number] = self._check_response(number, reply)
+            except ValueError as e:
+                LOGGER.warning("Batch fetch of block %s failed: %s", number, e)
+        return blocks
+
+    def announce(self, height: int) -> None:
+        """Record a newly seen head height and start prefetching towards it."""
+        if self.next_height is None:
+            self.next_height = height
+        if self.head_height is None or height > self.head_height:
+            self.head_height = height
+            self._announced_at[height] = time.monotonic()
+        self._schedule()
+        self._head_changed.set()
+
+    def reset(self, next_height: Optional[int]) -> None:
+        """
+        Drop in-flight fetches and restart delivery from ``next_height``, e.g.
+        the block after the last one that was fully processed. With None, the
+        fetcher starts from the next announced head.
+        """
+        self._cancel_inflight()
+        self.next_height = next_height
+        if next_height is not None and self.head_height is not None:
+            self.head_height = max(self.head_height, next_height - 1)
+        self._schedule()
+
+    def _cancel_inflight(self) -> None:
+        for task in self._tasks:
+            task.cancel()
+        self._tasks.clear()
+        for future in self._inflight.values():
+            if future.done() and not future.cancelled():
+                future.exception()  # mark failed prefetches as retrieved
+            future.cancel()
+        self._inflight.clear()
+
+    def _schedule(self) -> None:
+        if self.next_height is None or self.head_height is None:
+            return
+        backlog = self.head_height - self.next_height + 1
+        chunk_size = self.batch_size if backlog > self.prefetch else 1
+        last = min(self.head_height, self.next_height + self.prefetch * chunk_size - 1)
+        chunk: List[int] = []
+        for height in range(self.next_height, last + 1):
+            if height in self._inflight:
+                continue
+            self._inflight[height] = asyncio.get_running_loop().create_future()
+            chunk.append(height)
+            if len(chunk) == chunk_size:
+                self._start(chunk)
+                chunk = []
+        if chunk:
+            self._start(chunk)
+
+    def _start(self, heights: List[int]) -> None:
+        task = asyncio.create_task(self._fetch_chunk(heights))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _fetch_chunk(self, heights: List[int]) -> None:
+        try:
+            if len(heights) == 1:
+                blocks = {heights[0]: await self.fetch_block(heights[0])}
+            else:
+                blocks = await self.fetch_blocks(heights)
+        except Exception as e:
+            blocks = {}
+            error: Exception = e
+        else:
+            error = RuntimeError("Block is missing from the batch reply")
+        for height in heights:
+            future = self._inflight.get(height)
+            if future is None or future.done():
+                continue
+            if height in blocks:
+                future.set_result(blocks[height])
+            else:
+                future.set_exception(error)
+
+    async def next_block(self) -> FetchedBlock:
+        """Wait for the next block in height order and return it."""
+        while (
+            self.next_height is None
+            or self.head_height is None
+            or self.next_height > self.head_height
+        ):
+            self._head_changed.clear()
+            await self._head_changed.wait()
+        height = self.next_height
+        self._schedule()
+        try:
+            block = await asyncio.shield(self._inflight[height])
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            # A failed fetch is dropped so the next call retries the same height.
+            self._inflight.pop(height, None)
+            raise
+        self._inflight.pop(height, None)
+        self.next_height = height + 1
+        self._schedule()
+        return block
+
+    def delivery_lag(self, height: int) -> float:
+        """Seconds between the announcement of ``height`` and now."""
+        announced_at = self._announced_at.pop(height, None)
+        return time.monotonic() - announced_at if announced_at is not None else 0.0
+
+    async def blocks(self) -> AsyncIterator[FetchedBlock]:
+        while True:
+            yield await self.next_block()
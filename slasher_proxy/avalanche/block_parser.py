@@ -1,10 +1,20 @@
-from typing import Any, Dict, cast
+from typing import Any, Dict, List, Union, cast
 
-import requests
-from pony.orm import db_session
+import logging
 
+import requests
+from pony.orm import TransactionIntegrityError, db_session
+
+from slasher_proxy.avalanche.block_stream import (
+    CompactBlock,
+    CompactTransaction,
+    hex_to_bytes,
+)
+from slasher_proxy.avalanche.replacements import get_replacement_detector
+from slasher_proxy.common import UNKNOWN_SENDER
 from slasher_proxy.common.log import LOGGER
 from slasher_proxy.common.model import Block, BlockTransaction, Transaction
+from slasher_proxy.common.tx_cache import KNOWN_TXS
 
 
 def get_cchain_block_by_number(number: int) -> Dict[str, Any]:
@@ -41,7 +51,8 @@ def get_platform_block_by_height(height: int) -> Dict[str, Any]:
     return cast(Dict[str, Any], response_json)
 
 
-def parse_and_save_block(json_data: Dict[str, Any], node_id: str) -> Dict[str, Any]:
+def compact_block_from_json(json_data: Dict[str, Any]) -> CompactBlock:
+    """Convert a decoded block JSON-RPC response into a CompactBlock."""
     # Extract block data from the top-level "result" key
     result_data = json_data.get("result")
     if not isinstance(result_data, dict):
@@ -55,47 +66,132 @@ def parse_and_save_block(json_data: Dict[str, Any], node_id: str) -> Dict[str, A
     if not isinstance(height_str, str):
         raise ValueError("Block number is required.")
 
-    if block_hash_str.startswith("0x"):
-        block_hash = bytes.fromhex(block_hash_str[2:])
-    else:
-        block_hash = block_hash_str.encode()
-
     height = int(height_str, 16)
     txs = result_data.get("transactions", [])
     if not isinstance(txs, list):
         raise ValueError("Transactions should be a list.")
 
-    # Save to DB
+    transactions = []
+    for i, tx_info in enumerate(txs):
+        tx_hash_str = tx_info.get("hash")
+        if not isinstance(tx_hash_str, str):
+            LOGGER.warning("Invalid transaction hash in block %s, index %s", height, i)
+            continue
+        transactions.append(
+            CompactTransaction(
+                order=i,
+                hash=hex_to_bytes(tx_hash_str),
+                from_address=str(tx_info.get("from") or ""),
+                nonce=int(tx_info.get("nonce") or "0", 16),
+            )
+        )
+    return CompactBlock(
+        hash=hex_to_bytes(block_hash_str), number=height, transactions=transactions
+    )
+
+
+# Keeps bulk lookups under sqlite's bound-parameter limit.
+LOOKUP_CHUNK_SIZE: int = 500
+
+
+def _load_transactions(hashes: List[bytes]) -> Dict[bytes, Transaction]:
+    """Fetch the given transactions with one query per LOOKUP_CHUNK_SIZE hashes."""
+    found: Dict[bytes, Transaction] = {}
+    for i in range(0, len(hashes), LOOKUP_CHUNK_SIZE):
+        chunk = hashes[i : i + LOOKUP_CHUNK_SIZE]
+        for txn in Transaction.select(lambda t: t.hash in chunk):
+            found[txn.hash] = txn
+    return found
+
+
+def _save_block(
+    compact_block: CompactBlock,
+    node_id: str,
+    replacements: Dict[bytes, bytes],
+    trust_cache: bool,
+) -> Dict[str, Any]:
+    height = compact_block.number
     with db_session:
-        block = Block.get(hash=block_hash)
-        if not block:
-            block = Block(hash=block_hash, number=height, node_id=node_id)
-            LOGGER.info(f"New block created: {height}")
-
-        for i, tx_info in enumerate(txs):
-            tx_hash_str = tx_info.get("hash")
-            if not isinstance(tx_hash_str, str):
-                LOGGER.warning(f"Invalid transaction hash in block {height}, index {i}")
-                continue
-
-            if tx_hash_str.startswith("0x"):
-                tx_hash = bytes.fromhex(tx_hash_str[2:])
-            else:
-                tx_hash = tx_hash_str.encode()
-
-            txn = Transaction.get(hash=tx_hash)
-            if not txn:
+        block = Block.get(hash=compact_block.hash)
+        # Links of a block saved before, e.g. by a run that stopped before
+        # verifying it; saving the block again only adds the missing ones.
+        linked = set()
+        if block:
+            linked = {
+                bt.transaction.hash
+                for bt in BlockTransaction.select(lambda bt: bt.block == block)
+            }
+        else:
+            block = Block(hash=compact_block.hash, number=height, node_id=node_id)
+            LOGGER.info("New block created: %s", height)
+
+        # Transactions the cache has never seen are inserted without a lookup;
+        # all others are loaded together instead of one query per transaction.
+        to_load = [
+            tx.hash
+            for tx in compact_block.transactions
+            if not trust_cache or KNOWN_TXS.lookup(tx.hash) is not False
+        ]
+        known = _load_transactions(to_load)
+        debug = LOGGER.isEnabledFor(logging.DEBUG)
+        for tx_info in compact_block.transactions:
+            txn = known.get(tx_info.hash)
+            if txn is None:
                 txn = Transaction(
-                    hash=tx_hash,
-                    from_address=str(tx_info.get("from") or ""),
-                    nonce=int(tx_info.get("nonce") or "0", 16),
+                    hash=tx_info.hash,
+                    from_address=tx_info.from_address,
+                    nonce=tx_info.nonce,
+                    replaces=replacements.get(tx_info.hash),
                 )
-                LOGGER.debug(f"New transaction created: {tx_hash_str}")
-
-            BlockTransaction(block=block, transaction=txn, order=i)
-
-    LOGGER.info(f"Block {height} processed with {len(txs)} transactions")
+                known[tx_info.hash] = txn
+                if debug:
+                    LOGGER.debug("New transaction created: %s", tx_info.hash.hex())
+            else:
+                if txn.from_address == UNKNOWN_SENDER and tx_info.from_address:
+                    txn.from_address = tx_info.from_address
+                    txn.nonce = tx_info.nonce
+                if txn.replaces is None and tx_info.hash in replacements:
+                    txn.replaces = replacements[tx_info.hash]
+
+            if tx_info.hash not in linked:
+                BlockTransaction(block=block, transaction=txn, order=tx_info.order)
+
+    KNOWN_TXS.add_many(tx.hash for tx in compact_block.transactions)
+    LOGGER.info(
+        "Block %s processed with %s transactions",
+        height,
+        len(compact_block.transactions),
+    )
     return {
         "height": height,
-        "transaction_count": len(txs),
+        "transaction_count": len(compact_block.transactions),
     }
+
+
+def save_block(compact_block: CompactBlock, node_id: str) -> Dict[str, Any]:
+    detector = get_replacement_detector()
+    replacements = detector.find(compact_block.transactions) if detector else {}
+    try:
+        result = _save_block(compact_block, node_id, replacements, trust_cache=True)
+    except TransactionIntegrityError as e:
+        # A transaction the cache did not know about was already stored, e.g.
+        # by another process. Retry with every transaction looked up.
+        LOGGER.warning(
+            "Retrying block %s without the known-tx cache: %s", compact_block.number, e
+        )
+        result = _save_block(compact_block, node_id, replacements, trust_cache=False)
+    if detector:
+        detector.evict(compact_block.transactions)
+    return result
+
+
+def parse_and_save_block(
+    json_data: Union[Dict[str, Any], CompactBlock], node_id: str
+) -> Dict[str, Any]:
+    """
+    Save a block given either as a decoded JSON-RPC response or as a
+    CompactBlock produced by the streaming extractor (see block_stream).
+    """
+    if isinstance(json_data, CompactBlock):
+        return save_block(json_data, node_id)
+    return save_block(compact_block_from_json(json_data), node_id)
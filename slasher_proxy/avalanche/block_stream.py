@@ -0,0 +1,161 @@
+from typing import Any, Dict, List, NamedTuple, Union
+
+import re
+from binascii import unhexlify
+
+
+class CompactTransaction(NamedTuple):
+    order: int  # position of the transaction in the block
+    hash: bytes
+    from_address: str
+    nonce: int
+
+
+class CompactBlock(NamedTuple):
+    hash: bytes
+    number: int
+    transactions: List[CompactTransaction]
+
+
+# The only keys ingestion uses, with their string values. Everything else in
+# the payload is skipped by the regex engine without being tokenized.
+_TOKEN = re.compile(rb'"(hash|number|from|nonce|transactions)"\s*:\s*(?:"([^"]*)")?')
+# Slots of the per-object scratch lists used while scanning.
+_HASH, _NUMBER, _FROM, _NONCE, _TXS = range(5)
+_SLOTS = {b"hash": _HASH, b"number": _NUMBER, b"from": _FROM, b"nonce": _NONCE}
+
+
+def hex_to_bytes(value: Union[bytes, str]) -> bytes:
+    """Decode a 0x-prefixed hash, falling back to the raw text like the dict path."""
+    if isinstance(value, str):
+        return bytes.fromhex(value[2:]) if value.startswith("0x") else value.encode()
+    return unhexlify(value[2:]) if value.startswith(b"0x") else value
+
+
+class _TransactionList(List[CompactTransaction]):
+    __slots__ = ("seen",)
+
+    def __init__(self) -> None:
+        super().__init__()
+        self.seen = 0  # transaction objects seen, including skipped ones
+
+
+def extract_blocks(raw: Union[bytes, str]) -> List[CompactBlock]:
+    """
+    Pull blocks out of raw JSON without materializing it.
+
+    Accepts a bare block object, a JSON-RPC response or a batch of responses.
+    Only the block hash and number and, per transaction, ``hash``, ``from``
+    and ``nonce`` are extracted; every other field is skipped over. Every
+    object that carries a ``transactions`` list is reported as a block.
+
+    Object nesting is tracked by counting braces between matched keys, which
+    relies on C-Chain block JSON holding only hex strings as string values (no
+    braces or escaped quotes inside strings). An object is complete once the
+    depth drops below it between two keys, whatever order its keys came in.
+    """
+    data = raw.encode() if isinstance(raw, str) else raw
+    count = data.count
+    blocks: List[CompactBlock] = []
+    current: Dict[int, List[Any]] = {}  # object being filled, per brace depth
+    depth = 0
+    prev = 0
+    for match in _TOKEN.finditer(data):
+        start = match.start()
+        opens = count(b"{", prev, start)
+        closes = count(b"}", prev, start)
+        if closes and current and depth - closes < max(current):
+            lowest = (
+                depth - closes if not opens else _lowest_depth(data, prev, start, depth)
+            )
+            _flush_closed(current, lowest, blocks)
+        depth += opens - closes
+        prev = match.end()
+        key, value = match.groups()
+        obj = current.get(depth)
+        if key == b"transactions":
+            if obj is not None and obj[_TXS] is not None:
+                _flush(current, depth, blocks)
+                obj = None
+            if obj is None:
+                obj = current[depth] = [None] * 5
+            obj[_TXS] = _TransactionList()
+        elif value is not None:  # skip non-string values, e.g. null
+            slot = _SLOTS[key]
+            if obj is None:
+                obj = current[depth] = [None] * 5
+            elif obj[slot] is not None:
+                _flush(current, depth, blocks)
+                obj = current[depth] = [None] * 5
+            obj[slot] = value
+    depth += count(b"{", prev) - count(b"}", prev)
+    if depth != 0:
+        raise ValueError("Truncated block JSON")
+    for level in sorted(current, reverse=True):
+        if level in current:
+            _flush(current, level, blocks)
+    return blocks
+
+
+def _lowest_depth(data: bytes, start: int, end: int, depth: int) -> int:
+    """The lowest brace depth reached in ``data[start:end]``."""
+    lowest = depth
+    closes = 0
+    close = data.find(b"}", start, end)
+    while close != -1:
+        closes += 1
+        lowest = min(lowest, depth + data.count(b"{", start, close) - closes)
+        close = data.find(b"}", close + 1, end)
+    return lowest
+
+
+def _flush_closed(
+    current: Dict[int, List[Any]], depth: int, blocks: List[CompactBlock]
+) -> None:
+    """Complete every object deeper than ``depth``, innermost first."""
+    while current:
+        level = max(current)
+        if level <= depth:
+            break
+        _flush(current, level, blocks)
+
+
+def _flush(
+    current: Dict[int, List[Any]], depth: int, blocks: List[CompactBlock]
+) -> None:
+    """Complete the object at ``depth``: a transaction, a block or neither."""
+    if depth + 1 in current:
+        # A block's last transaction, completed while the block is current.
+        _flush(current, depth + 1, blocks)
+    obj = current.pop(depth)
+    parent = current.get(depth - 1)
+    if parent is not None and parent[_TXS] is not None:
+        # An entry of the parent block's "transactions" array.
+        txs = parent[_TXS]
+        order = txs.seen
+        txs.seen += 1
+        if obj[_HASH] is not None:
+            txs.append(
+                CompactTransaction(
+                    order,
+                    hex_to_bytes(obj[_HASH]),
+                    obj[_FROM].decode() if obj[_FROM] is not None else "",
+                    int(obj[_NONCE] or b"0", 16),
+                )
+            )
+    elif obj[_TXS] is not None:
+        if obj[_HASH] is None:
+            raise ValueError("Block hash is required.")
+        if obj[_NUMBER] is None:
+            raise ValueError("Block number is required.")
+        blocks.append(
+            CompactBlock(hex_to_bytes(obj[_HASH]), int(obj[_NUMBER], 16), obj[_TXS])
+        )
+
+
+def extract_block(raw: Union[bytes, str]) -> CompactBlock:
+    """extract_blocks() for a payload that must hold exactly one block."""
+    blocks = extract_blocks(raw)
+    if len(blocks) != 1:
+        raise ValueError(f"Expected one block in the payload, found {len(blocks)}")
+    return blocks[0]
@@ -0,0 +1,187 @@
+"""
+An append-only log of the submissions and blocks the proxy ingests, for
+replaying production traffic (see bench/replay.py).
+"""
+
+from typing import BinaryIO, Iterator, NamedTuple, Optional, Union
+
+import struct
+import threading
+import time
+
+from slasher_proxy.avalanche.block_fetcher import FetchedBlock
+from slasher_proxy.avalanche.block_parser import compact_block_from_json
+from slasher_proxy.avalanche.block_stream import CompactBlock, CompactTransaction
+
+MAGIC = b"SLCAP1\n"
+KIND_SUBMISSION = 1
+KIND_BLOCK = 2
+
+# kind, wall clock time, payload length
+_HEADER = struct.Struct("<BdI")
+# tx index, then the node, hash and commitment, and the hash of the
+# transaction it replaces, if any, in the rest of the payload
+_SUBMISSION = struct.Struct("<QHHH")
+# number, transaction count, then the node and hash
+_BLOCK = struct.Struct("<QIHH")
+# order, nonce, then the hash and sender
+_TRANSACTION = struct.Struct("<IQHH")
+
+
+class Submission(NamedTuple):
+    node_id: str
+    tx_hash: bytes
+    tx_index: int
+    commitment: bytes
+    replaces: Optional[bytes] = None
+
+
+class BlockEvent(NamedTuple):
+    node_id: str
+    block: CompactBlock
+
+
+class CapturedEvent(NamedTuple):
+    timestamp: float
+    event: Union[Submission, BlockEvent]
+
+
+def encode_submission(event: Submission) -> bytes:
+    node = event.node_id.encode()
+    return (
+        _SUBMISSION.pack(
+            event.tx_index, len(node), len(event.tx_hash), len(event.commitment)
+        )
+        + node
+        + event.tx_hash
+        + event.commitment
+        + (event.replaces or b"")
+    )
+
+
+def _encode_block(event: BlockEvent) -> bytes:
+    node = event.node_id.encode()
+    block = event.block
+    parts = [
+        _BLOCK.pack(block.number, len(block.transactions), len(node), len(block.hash)),
+        node,
+        block.hash,
+    ]
+    for tx in block.transactions:
+        sender = tx.from_address.encode()
+        parts += [
+            _TRANSACTION.pack(tx.order, tx.nonce, len(tx.hash), len(sender)),
+            tx.hash,
+            sender,
+        ]
+    return b"".join(parts)
+
+
+def decode_submission(payload: bytes) -> Submission:
+    tx_index, node_len, hash_len, commitment_len = _SUBMISSION.unpack_from(payload)
+    offset = _SUBMISSION.size
+    node = payload[offset : offset + node_len].decode()
+    offset += node_len
+    tx_hash = payload[offset : offset + hash_len]
+    offset += hash_len
+    commitment = payload[offset : offset + commitment_len]
+    replaces = payload[offset + commitment_len :] or None
+    return Submission(node, tx_hash, tx_index, commitment, replaces)
+
+
+def _decode_block(payload: bytes) -> BlockEvent:
+    number, count, node_len, hash_len = _BLOCK.unpack_from(payload)
+    offset = _BLOCK.size
+    node = payload[offset : offset + node_len].decode()
+    offset += node_len
+    block_hash = payload[offset : offset + hash_len]
+    offset += hash_len
+    transactions = []
+    for _ in range(count):
+        order, nonce, tx_hash_len, sender_len = _TRANSACTION.unpack_from(
+            payload, offset
+        )
+        offset += _TRANSACTION.size
+        tx_hash = payload[offset : offset + tx_hash_len]
+        offset += tx_hash_len
+        sender = payload[offset : offset + sender_len].decode()
+        offset += sender_len
+        transactions.append(CompactTransaction(order, tx_hash, sender, nonce))
+    return BlockEvent(node, CompactBlock(block_hash, number, transactions))
+
+
+class CaptureLog:
+    """
+    Appends submissions and blocks to a file as length-prefixed binary
+    records stamped with the wall clock time. Writes are buffered: a crash
+    loses the tail of the log, which read_capture() then ignores.
+    """
+
+    def __init__(self, path: str) -> None:
+        self.path = path
+        self._lock = threading.Lock()
+        self._file: BinaryIO = open(path, "ab")
+        if self._file.tell() == 0:
+            self._file.write(MAGIC)
+        self.records = 0
+
+    def _append(self, kind: int, payload: bytes) -> None:
+        header = _HEADER.pack(kind, time.time(), len(payload))
+        with self._lock:
+            self._file.write(header + payload)
+            self.records += 1
+
+    def submission(
+        self,
+        node_id: str,
+        tx_hash: bytes,
+        tx_index: int,
+        commitment: bytes,
+        replaces: Optional[bytes] = None,
+    ) -> None:
+        self._append(
+            KIND_SUBMISSION,
+            encode_submission(
+                Submission(node_id, tx_hash, tx_index, commitment, replaces)
+            ),
+        )
+
+    def block(self, node_id: str, block: FetchedBlock) -> None:
+        if not isinstance(block, CompactBlock):
+            block = compact_block_from_json(block)
+        self._append(KIND_BLOCK, _encode_block(BlockEvent(node_id, block)))
+
+    def close(self) -> None:
+        with self._lock:
+            self._file.close()
+
+
+def read_capture(path: str) -> Iterator[CapturedEvent]:
+    """The events of a capture log in the order they were written."""
+    with open(path, "rb") as f:
+        if f.read(len(MAGIC)) != MAGIC:
+            raise ValueError(f"{path} is not a capture log")
+        while True:
+            header = f.read(_HEADER.size)
+            if len(header) < _HEADER.size:
+                return
+            kind, timestamp, length = _HEADER.unpack(header)
+            payload = f.read(length)
+            if len(payload) < length:
+                return  # cut short by a crash
+            if kind == KIND_SUBMISSION:
+                yield CapturedEvent(timestamp, decode_submission(payload))
+            elif kind == KIND_BLOCK:
+                yield CapturedEvent(timestamp, _decode_block(payload))
+
+
+capture_log_instance: Optional[CaptureLog] = None
+
+
+def get_capture_log() -> Optional[CaptureLog]:
+    return capture_log_instance
+
+
+def set_capture_log(capture_log: Optional[CaptureLog]) -> None:
+    global capture_log_instance
+    capture_log_instance = capture_log
@@ -1,4 +1,4 @@
-from typing import Any, Dict
+from typing import Any, Dict, List, Tuple, Union
 
 
 def decode_avalanche_transaction(raw_tx: str) -> Dict[str, Any]:
@@ -17,3 +17,67 @@ def decode_avalanche_transaction(raw_tx: str) -> Dict[str, Any]:
         "s": ...,
     }
     return decoded_tx
+
+
+RlpItem = Union[bytes, List["RlpItem"]]
+
+
+def _rlp_item(data: bytes, offset: int) -> Tuple[RlpItem, int]:
+    """The RLP item at ``offset`` and the offset right after it."""
+    if offset >= len(data):
+        raise ValueError("Truncated RLP item")
+    prefix = data[offset]
+    if prefix < 0x80:
+        return data[offset : offset + 1], offset + 1
+    if prefix < 0xB8 or 0xC0 <= prefix < 0xF8:
+        length = prefix - (0x80 if prefix < 0xC0 else 0xC0)
+        start = offset + 1
+    else:
+        size = prefix - (0xB7 if prefix < 0xC0 else 0xF7)
+        start = offset + 1 + size
+        length = int.from_bytes(data[offset + 1 : start], "big")
+    end = start + length
+    if end > len(data):
+        raise ValueError("Truncated RLP item")
+    if prefix < 0xC0:
+        return data[start:end], end
+    items: List[RlpItem] = []
+    while start < end:
+        item, start = _rlp_item(data, start)
+        items.append(item)
+    if start != end:
+        raise ValueError("RLP list overruns its length")
+    return items, end
+
+
+def rlp_decode(data: bytes) -> RlpItem:
+    item, end = _rlp_item(data, 0)
+    if end != len(data):
+        raise ValueError("Trailing bytes after the RLP item")
+    return item
+
+
+def transaction_nonce(raw_tx: bytes) -> int:
+    """
+    The nonce of a signed transaction: the first field of a legacy one, the
+    second, after the chain id, of an EIP-2718 typed one.
+    """
+    if raw_tx and raw_tx[0] >= 0xC0:
+        fields, position = rlp_decode(raw_tx), 0
+    elif raw_tx and raw_tx[0] <= 0x7F:
+        fields, position = rlp_decode(raw_tx[1:]), 1
+    else:
+        raise ValueError("Not a signed transaction")
+    if not isinstance(fields, list) or len(fields) <= position:
+        raise ValueError("Not a signed transaction")
+    nonce = fields[position]
+    if not isinstance(nonce, bytes):
+        raise ValueError("Invalid transaction nonce")
+    return int.from_bytes(nonce, "big")
+
+
+def transaction_sender(raw_tx: bytes) -> str:
+    """The lowercase address that signed the transaction."""
+    from eth_account import Account
+
+    return str(Account.recover_transaction(raw_tx)).lower()
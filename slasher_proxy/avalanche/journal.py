@@ -0,0 +1,305 @@
+"""
+A crash-safe journal of accepted submissions. The proxy answers a client once
+its submission is durable in the journal, and a background task moves the
+records into the database, which takes the commit off the request path.
+"""
+
+from typing import (
+    Awaitable,
+    Callable,
+    Dict,
+    Iterator,
+    List,
+    NamedTuple,
+    Optional,
+    Tuple,
+    Union,
+)
+
+import asyncio
+import itertools
+import mmap
+import os
+import queue
+import struct
+import threading
+import zlib
+from concurrent.futures import Future
+
+from slasher_proxy.avalanche.capture import (
+    Submission,
+    decode_submission,
+    encode_submission,
+)
+from slasher_proxy.common.backoff import Backoff
+from slasher_proxy.common.log import LOGGER
+
+MAGIC = b"SLJNL1\n"
+# Offset of the first record not drained into the database yet.
+_DRAINED = struct.Struct("<Q")
+HEADER_SIZE = len(MAGIC) + _DRAINED.size
+# payload length and its CRC-32
+_RECORD = struct.Struct("<II")
+DEFAULT_GROUP_COMMIT_SIZE: int = 256
+DEFAULT_DRAIN_BATCH_SIZE: int = 256
+# A fully drained journal larger than this is truncated.
+DEFAULT_COMPACT_BYTES: int = 64 * 1024 * 1024
+
+
+class _Append(NamedTuple):
+    record: bytes
+    future: "Future[None]"
+
+
+def encode_record(submission: Submission) -> bytes:
+    payload = encode_submission(submission)
+    return _RECORD.pack(len(payload), zlib.crc32(payload)) + payload
+
+
+def read_records(
+    buffer: Union[bytes, mmap.mmap], offset: int, end: int
+) -> Iterator[Tuple[int, Submission]]:
+    """
+    The submissions in ``buffer[offset:end]``, each with the offset right
+    after it. Stops at a record cut short or failing its checksum.
+    """
+    while offset + _RECORD.size <= end:
+        length, crc = _RECORD.unpack_from(buffer, offset)
+        start = offset + _RECORD.size
+        if start + length > end:
+            return
+        payload = buffer[start : start + length]
+        if zlib.crc32(payload) != crc:
+            return
+        offset = start + length
+        yield offset, decode_submission(payload)
+
+
+class SubmissionJournal:
+    """
+    An append-only file of length-prefixed, checksummed submission records.
+
+    Appends are queued to a writer thread, which writes everything queued
+    meanwhile at once and makes it durable with a single fdatasync(), up to
+    ``group_commit_size`` records per sync, so concurrent submissions share
+    its cost. An append resolves once its record is durable.
+
+    The header holds the offset of the first record not yet drained into the
+    database. Opening the journal drops a torn record at its end, which was
+    never acknowledged, and drain() then stores the records left behind
+    before the new ones, reading them through a memory map. A record stored
+    but not yet marked drained when the proxy stopped is stored again, which
+    is recorded as a duplicate submission and ignored. A fully drained
+    journal larger than ``compact_bytes`` is truncated.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        group_commit_size: int = DEFAULT_GROUP_COMMIT_SIZE,
+        compact_bytes: int = DEFAULT_COMPACT_BYTES,
+    ) -> None:
+        self.path = path
+        self.group_commit_size = max(group_commit_size, 1)
+        self.compact_bytes = compact_bytes
+        self.queue: "queue.Queue[Optional[_Append]]" = queue.Queue()
+        self.thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+        self._on_durable: Optional[Callable[[], None]] = None
+        self.appended = 0
+        self.syncs = 0
+        self.drained_records = 0
+        self._fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o644)
+        self.size = os.fstat(self._fd).st_size
+        if self.size < HEADER_SIZE:
+            os.ftruncate(self._fd, 0)
+            os.pwrite(self._fd, MAGIC + _DRAINED.pack(HEADER_SIZE), 0)
+            os.fsync(self._fd)
+            self.size = HEADER_SIZE
+        header = os.pread(self._fd, HEADER_SIZE, 0)
+        if header[: len(MAGIC)] != MAGIC:
+            os.close(self._fd)
+            raise ValueError(f"{path} is not a submission journal")
+        (drained,) = _DRAINED.unpack_from(header, len(MAGIC))
+        # Past the end after a crash during compaction.
+        self.drained = drained if HEADER_SIZE <= drained <= self.size else HEADER_SIZE
+        records = self._read(self.drained, self.size)
+        self.backlog = len(records)
+        end = records[-1][0] if records else self.drained
+        if end < self.size:
+            LOGGER.warning(
+                "Dropping %s bytes of a torn record at the end of %s",
+                self.size - end,
+                path,
+            )
+            os.ftruncate(self._fd, end)
+            os.fsync(self._fd)
+            self.size = end
+        if self.backlog:
+            LOGGER.info("%s submissions in %s to replay", self.backlog, path)
+
+    def _read(
+        self, offset: int, end: int, limit: Optional[int] = None
+    ) -> List[Tuple[int, Submission]]:
+        if end <= offset:
+            return []
+        with mmap.mmap(self._fd, end, access=mmap.ACCESS_READ) as view:
+            return list(itertools.islice(read_records(view, offset, end), limit))
+
+    def start(self) -> "SubmissionJournal":
+        if self.thread is None:
+            self.thread = threading.Thread(
+                target=self._run, name="journal-writer", daemon=True
+            )
+            self.thread.start()
+        return self
+
+    def stop(self, timeout: Optional[float] = None) -> None:
+        """Write the records already queued, stop the thread, close the file."""
+        if self.thread is not None:
+            self.queue.put(None)
+            self.thread.join(timeout)
+            self.thread = None
+        with self._lock:
+            os.close(self._fd)
+
+    def append(self, submission: Submission) -> "Future[None]":
+        """Queue a record; the future resolves once it is durable."""
+        if self.thread is None:
+            raise RuntimeError("The journal writer is not started")
+        future: "Future[None]" = Future()
+        self.queue.put(_Append(encode_record(submission), future))
+        return future
+
+    async def write(self, submission: Submission) -> None:
+        """Like append(), waiting for the record without holding the event loop."""
+        await asyncio.wrap_future(self.append(submission))
+
+    def _run(self) -> None:
+        while True:
+            item = self.queue.get()
+            if item is None:
+                return
+            batch = [item]
+            stopping = False
+            while len(batch) < self.group_commit_size:
+                try:
+                    item = self.queue.get_nowait()
+                except queue.Empty:
+                    break
+                if item is None:
+                    stopping = True
+                    break
+                batch.append(item)
+            self._commit(batch)
+            if stopping:
+                return
+
+    def _commit(self, batch: List[_Append]) -> None:
+        data = b"".join(append.record for append in batch)
+        try:
+            with self._lock:
+                # A failed write is overwritten by the next one.
+                os.pwrite(self._fd, data, self.size)
+                os.fdatasync(self._fd)
+                self.size += len(data)
+                self.backlog += len(batch)
+        except OSError as e:
+            LOGGER.error("Journal write failed: %s", e)
+            for append in batch:
+                append.future.set_exception(e)
+            return
+        self.appended += len(batch)
+        self.syncs += 1
+        for append in batch:
+            append.future.set_result(None)
+        if self._on_durable is not None:
+            self._on_durable()
+
+    def read_pending(self, limit: int) -> List[Tuple[int, Submission]]:
+        """Up to ``limit`` undrained submissions with the offset after each."""
+        with self._lock:
+            end = self.size
+        return self._read(self.drained, end, limit)
+
+    def mark_drained(self, offset: int, count: int) -> None:
+        """Record that the ``count`` submissions before ``offset`` are stored."""
+        with self._lock:
+            if offset == self.size and offset >= self.compact_bytes:
+                # Truncated before the header is reset: a crash in between
+                # leaves an offset past the end, which opening resets.
+                os.ftruncate(self._fd, HEADER_SIZE)
+                offset = self.size = HEADER_SIZE
+            os.pwrite(self._fd, _DRAINED.pack(offset), len(MAGIC))
+            os.fdatasync(self._fd)
+            self.drained = offset
+            self.backlog -= count
+        self.drained_records += count
+
+    async def drain(
+        self,
+        store: Callable[[Submission], Awaitable[object]],
+        batch_size: int = DEFAULT_DRAIN_BATCH_SIZE,
+        backoff: Optional[Backoff] = None,
+    ) -> None:
+        """
+        Store the journaled submissions with ``store``, in order, until
+        cancelled. A failed store is retried after a backoff delay.
+        """
+        backoff = backoff or Backoff()
+        loop = asyncio.get_running_loop()
+        durable = asyncio.Event()
+
+        def on_durable() -> None:
+            loop.call_soon_threadsafe(durable.set)
+
+        self._on_durable = on_durable
+        try:
+            while True:
+                durable.clear()
+                records = await asyncio.to_thread(self.read_pending, batch_size)
+                if not records:
+                    await durable.wait()
+                    continue
+                stored, failure = 0, None
+                try:
+                    for _, submission in records:
+                        await store(submission)
+                        stored += 1
+                except Exception as e:
+                    failure = e
+                if stored:
+                    offset = records[stored - 1][0]
+                    await asyncio.to_thread(self.mark_drained, offset, stored)
+                if failure is not None:
+                    delay = backoff.next_delay()
+                    LOGGER.error(f"Draining the submission journal failed: {failure}")
+                    LOGGER.info("Retrying in %.1f seconds...", delay)
+                    await asyncio.sleep(delay)
+                else:
+                    backoff.reset()
+        finally:
+            self._on_durable = None
+
+    def stats(self) -> Dict[str, float]:
+        return {
+            "appended": self.appended,
+            "syncs": self.syncs,
+            "mean_group": self.appended / self.syncs if self.syncs else 0.0,
+            "drained": self.drained_records,
+            "backlog": self.backlog,
+            "bytes": self.size,
+        }
+
+
+# Set by the app lifespan when JOURNAL_PATH is configured.
+submission_journal_instance: Optional[SubmissionJournal] = None
+
+
+def get_submission_journal() -> Optional[SubmissionJournal]:
+    return submission_journal_instance
+
+
+def set_submission_journal(journal: Optional[SubmissionJournal]) -> None:
+    global submission_journal_instance
+    submission_journal_instance = journal
@@ -1,54 +1,215 @@
 # proxy_router.py
-from typing import Annotated
+from typing import Annotated, Any, Awaitable, Callable, Dict, List, Optional, Set, Tuple
 
+import asyncio
 import json
+import logging
+import time
 
 import aiohttp
 from fastapi import APIRouter, Depends, HTTPException, Request
 from fastapi.responses import JSONResponse
-from pony.orm import db_session
+from pony.orm import TransactionIntegrityError, db_session, flush
 
-from slasher_proxy.common import C_STATUS_PENDING, T_STATUS_SUBMITTED
-from slasher_proxy.common.log import LOGGER
+from slasher_proxy.avalanche.async_ops import record_submission
+from slasher_proxy.avalanche.block_stream import hex_to_bytes
+from slasher_proxy.avalanche.capture import Submission, get_capture_log
+from slasher_proxy.avalanche.decode import transaction_nonce, transaction_sender
+from slasher_proxy.avalanche.journal import get_submission_journal
+from slasher_proxy.avalanche.replacements import (
+    ReplacementDetector,
+    get_replacement_detector,
+)
+from slasher_proxy.common import (
+    C_STATUS_PENDING,
+    T_STATUS_SUBMITTED,
+    UNKNOWN_SENDER,
+    db,
+)
+from slasher_proxy.common.async_db import get_async_db
+from slasher_proxy.common.cluster import known_tx_message
+from slasher_proxy.common.log import LOGGER, RateLimitedLog
+from slasher_proxy.common.metrics import UPSTREAM_REQUEST_SECONDS
 from slasher_proxy.common.model import Commitment, NodeStats, Transaction
 from slasher_proxy.common.settings import SlasherRpcProxySettings, get_settings
+from slasher_proxy.common.sqlite_writer import get_sqlite_writer
+from slasher_proxy.common.timing import DB, PARSE, SERIALIZE, UPSTREAM, stage
+from slasher_proxy.common.tx_cache import KNOWN_TXS
 
 router = APIRouter()
 
+_FORWARD_SECONDS = UPSTREAM_REQUEST_SECONDS.labels("eth_sendRawTransaction")
+_log_undecodable = RateLimitedLog(LOGGER, logging.WARNING)
+
 
 # ACTHUNG!!! HTTPExceptions are caught by FastAPI itself
 # and not propagated to  the custom exception middleware!
 # That's why we log error explicitly here
 
 
-@router.post("/eth_sendRawTransaction")
-async def handle_send_raw_transaction(
-    request: Request,
-    settings: Annotated[SlasherRpcProxySettings, Depends(get_settings)],
-) -> JSONResponse:
-    body = await request.json()
-    if body.get("method") != "eth_sendRawTransaction":
-        raise HTTPException(status_code=400, detail="Invalid method")
-    if (
-        "params" not in body
-        or not isinstance(body["params"], list)
-        or len(body["params"]) != 1
-    ):
-        raise HTTPException(status_code=400, detail="Invalid params")
-    raw_content = json.dumps(body).encode("utf-8")  # Convert JSON to bytes
-    LOGGER.debug(raw_content)
+def _bump_node_stats(node_id: str) -> None:
+    # One statement rather than Pony's read-modify-write, so replicas and
+    # workers counting for the same node never fail its optimistic check.
+    flush()
+    updated = db.execute(
+        "UPDATE NodeStats SET total_transactions = total_transactions + 1 "
+        "WHERE node = $node_id",
+        {"node_id": node_id},
+    )
+    if not updated.rowcount:
+        NodeStats(node=node_id, total_transactions=1)
 
-    # Forward the request to the validator node.
+
+def _store_submission(
+    node_id: str,
+    tx_hash: bytes,
+    tx_index: int,
+    node_commitment: bytes,
+    replaces: Optional[bytes],
+    trust_cache: bool,
+    notify_channel: Optional[str],
+) -> bool:
+    with db_session:
+        # A Bloom negative skips the lookup. It is not proof the hash was
+        # never stored (evicted entries, restarts, other processes), so a
+        # duplicate insert is retried by store_submission() with the lookup.
+        txn = (
+            None
+            if trust_cache and KNOWN_TXS.lookup(tx_hash) is False
+            else Transaction.get(hash=tx_hash)
+        )
+        if not txn:
+            # The sender and nonce are filled in once the transaction is mined.
+            txn = Transaction(
+                hash=tx_hash,
+                from_address=UNKNOWN_SENDER,
+                nonce=0,
+                status=T_STATUS_SUBMITTED,
+                replaces=replaces,
+            )
+            # Added before the commit, so a later write in the same batch of
+            # the sqlite writer looks the transaction up instead of
+            # inserting it again. A hash cached for a rolled back write only
+            # costs a lookup.
+            KNOWN_TXS.add(tx_hash)
+            if notify_channel:
+                # Delivered to the other replicas on commit.
+                db.execute(
+                    "SELECT pg_notify($channel, $message)",
+                    {"channel": notify_channel, "message": known_tx_message(tx_hash)},
+                )
+        elif Commitment.get(node=node_id, tx_hash=tx_hash):
+            # The same submission again, e.g. retried through another replica.
+            return False
+        elif replaces and txn.replaces is None:
+            # Stored before, by a block or a submission to another node.
+            txn.replaces = replaces
+        Commitment(
+            node=node_id,
+            tx_hash=tx_hash,
+            index=tx_index,
+            accumulator=node_commitment,
+            status=C_STATUS_PENDING,
+        )
+        _bump_node_stats(node_id)
+    return True
+
+
+def store_submission(
+    node_id: str,
+    tx_hash: bytes,
+    tx_index: int,
+    node_commitment: bytes,
+    replaces: Optional[bytes] = None,
+    notify_channel: Optional[str] = None,
+) -> bool:
+    """
+    Store a transaction accepted by the validator with its commitment, and
+    the transaction it replaces, if known.
+    Returns False for a duplicate submission, which is not recorded again.
+    With ``notify_channel``, a new transaction is announced to the other
+    replicas of a cluster.
+    """
+    args = (node_id, tx_hash, tx_index, node_commitment, replaces)
     try:
-        async with aiohttp.ClientSession() as session:
-            async with session.post(settings.rpc_url, json=body) as response:
-                response_data = await response.json()
+        stored = _store_submission(*args, True, notify_channel)
+    except TransactionIntegrityError as e:
+        LOGGER.warning(
+            "Retrying submission %s without the known-tx cache: %s", tx_hash.hex(), e
+        )
+        stored = _store_submission(*args, False, notify_channel)
+    if not stored:
+        LOGGER.info("Duplicate submission of %s to %s", tx_hash.hex(), node_id)
+    return stored
+
+
+async def save_submission(
+    node_id: str,
+    tx_hash: bytes,
+    tx_index: int,
+    node_commitment: bytes,
+    replaces: Optional[bytes] = None,
+    notify_channel: Optional[str] = None,
+) -> bool:
+    """store_submission() through the database path the proxy runs with."""
+    async_db = get_async_db()
+    writer = get_sqlite_writer()
+    if async_db is not None:
+        stored = await record_submission(
+            async_db,
+            node_id,
+            tx_hash,
+            tx_index,
+            node_commitment,
+            replaces,
+            notify_channel,
+        )
+        KNOWN_TXS.add(tx_hash)
+        return stored
+    if writer is not None:
+        stored = await writer.run(
+            store_submission, node_id, tx_hash, tx_index, node_commitment, replaces
+        )
+        return bool(stored)
+    return store_submission(
+        node_id, tx_hash, tx_index, node_commitment, replaces, notify_channel
+    )
+
+
+def _find_replaced(
+    detector: ReplacementDetector, raw_tx: object, tx_hash: bytes
+) -> Optional[bytes]:
+    """The transaction the submitted one replaces, by its sender and nonce."""
+    try:
+        if not isinstance(raw_tx, str):
+            raise ValueError("not a hex string")
+        data = hex_to_bytes(raw_tx)
+        sender, nonce = transaction_sender(data), transaction_nonce(data)
+    except Exception as e:
+        _log_undecodable("Cannot decode the sender of %s: %s", tx_hash.hex(), e)
+        return None
+    return detector.observe(sender, nonce, tx_hash)
+
+
+async def _forward(
+    session: aiohttp.ClientSession, rpc_url: str, body: Dict[str, Any]
+) -> Dict[str, Any]:
+    """Send the request to a validator and return its decoded response."""
+    started = time.perf_counter()
+    try:
+        async with session.post(rpc_url, json=body) as response:
+            response_data: Dict[str, Any] = await response.json()
     except Exception as e:
         LOGGER.error(f"Error forwarding to validator: {str(e)}", exc_info=True)
         raise HTTPException(
             status_code=500, detail=f"Error forwarding to validator: {str(e)}"
         )
+    _FORWARD_SECONDS.observe(time.perf_counter() - started)
+    return response_data
 
+
+def _accepted(response_data: Dict[str, Any]) -> Tuple[bytes, int, bytes]:
+    """The hash, index and commitment of a transaction the validator accepted."""
     # Check for errors in the response.
     if "error" in response_data:
         error_message = response_data["error"].get("message", "Unknown error")
@@ -79,26 +240,170 @@ async def handle_send_raw_transaction(
         if commitment_hex.startswith("0x")
         else bytes.fromhex(commitment_hex)
     )
+    return tx_hash, tx_index, node_commitment
 
-    node_id = getattr(settings, "node_id", "avalanche")
 
-    with db_session:
-        txn = Transaction.get(hash=tx_hash)
-        if not txn:
-            txn = Transaction(
-                hash=tx_hash, raw_content=raw_content, status=T_STATUS_SUBMITTED
+async def _record(
+    settings: SlasherRpcProxySettings,
+    node_id: str,
+    tx_hash: bytes,
+    tx_index: int,
+    node_commitment: bytes,
+    replaces: Optional[bytes],
+) -> None:
+    notify_channel = settings.cluster_channel if settings.cluster_mode else None
+    with stage(DB):
+        journal = get_submission_journal()
+        if journal is not None:
+            # Stored in the database by the journal's drain task.
+            await journal.write(
+                Submission(node_id, tx_hash, tx_index, node_commitment, replaces)
             )
-        Commitment(
-            node=node_id,
-            tx_hash=tx_hash,
-            index=tx_index,
-            accumulator=node_commitment,
-            status=C_STATUS_PENDING,
-        )
-        # Update node statistics.
-        stats = NodeStats.get(node=node_id)
-        if stats:
-            stats.total_transactions += 1
         else:
-            NodeStats(node=node_id, total_transactions=1)
-    return JSONResponse(content=response_data)
+            await save_submission(
+                node_id, tx_hash, tx_index, node_commitment, replaces, notify_channel
+            )
+    capture_log = get_capture_log()
+    if capture_log is not None:
+        capture_log.submission(node_id, tx_hash, tx_index, node_commitment, replaces)
+
+
+# Fan-outs still recording the slower validators after answering the client.
+_FAN_OUTS: Set["asyncio.Task[None]"] = set()
+
+
+async def wait_for_fan_outs(timeout: float) -> None:
+    """Give the fan-outs in progress up to ``timeout`` seconds, then cancel them."""
+    if not _FAN_OUTS:
+        return
+    _, pending = await asyncio.wait(set(_FAN_OUTS), timeout=timeout)
+    for fan_out in pending:
+        fan_out.cancel()
+    if pending:
+        LOGGER.warning("Cancelled %s submission fan-out(s)", len(pending))
+
+
+async def _fan_out(
+    settings: SlasherRpcProxySettings,
+    body: Dict[str, Any],
+    replaced: Callable[[bytes], Awaitable[Optional[bytes]]],
+    answer: "asyncio.Future[Dict[str, Any]]",
+) -> None:
+    """
+    Send the request to every fan-out validator at once and record the
+    commitment of each that accepts it, as its responses arrive. ``answer``
+    gets the first accepted response once ``fanout_quorum`` of them are
+    recorded, or the first failure once the quorum cannot be reached.
+    """
+    try:
+        await _fan_out_responses(settings, body, replaced, answer)
+    finally:
+        if not answer.done():
+            # Cancelled at shutdown before a quorum.
+            answer.set_exception(
+                HTTPException(status_code=503, detail="Submission fan-out stopped")
+            )
+
+
+async def _fan_out_responses(
+    settings: SlasherRpcProxySettings,
+    body: Dict[str, Any],
+    replaced: Callable[[bytes], Awaitable[Optional[bytes]]],
+    answer: "asyncio.Future[Dict[str, Any]]",
+) -> None:
+    accepted: List[Dict[str, Any]] = []
+    failures: List[HTTPException] = []
+    async with aiohttp.ClientSession() as session:
+        forwards = {
+            asyncio.ensure_future(_forward(session, rpc_url, body)): node_id
+            for node_id, rpc_url in settings.fanout_validators.items()
+        }
+        pending = set(forwards)
+        while pending:
+            done, pending = await asyncio.wait(
+                pending, return_when=asyncio.FIRST_COMPLETED
+            )
+            for forward in done:
+                node_id = forwards[forward]
+                try:
+                    response_data = forward.result()
+                    tx_hash, tx_index, node_commitment = _accepted(response_data)
+                    await _record(
+                        settings,
+                        node_id,
+                        tx_hash,
+                        tx_index,
+                        node_commitment,
+                        await replaced(tx_hash),
+                    )
+                except HTTPException as e:
+                    failures.append(e)
+                    continue
+                except Exception as e:
+                    LOGGER.error(f"Recording the submission to {node_id} failed: {e}")
+                    failures.append(HTTPException(status_code=500, detail=str(e)))
+                    continue
+                accepted.append(response_data)
+            if answer.done():
+                continue
+            if len(accepted) >= settings.fanout_quorum:
+                answer.set_result(accepted[0])
+            elif len(accepted) + len(pending) < settings.fanout_quorum:
+                answer.set_exception(failures[0])
+
+
+@router.post("/eth_sendRawTransaction")
+async def handle_send_raw_transaction(
+    request: Request,
+    settings: Annotated[SlasherRpcProxySettings, Depends(get_settings)],
+) -> JSONResponse:
+    with stage(PARSE):
+        body = await request.json()
+        if body.get("method") != "eth_sendRawTransaction":
+            raise HTTPException(status_code=400, detail="Invalid method")
+        if (
+            "params" not in body
+            or not isinstance(body["params"], list)
+            or len(body["params"]) != 1
+        ):
+            raise HTTPException(status_code=400, detail="Invalid params")
+        raw_content = json.dumps(body).encode("utf-8")  # Convert JSON to bytes
+        LOGGER.debug(raw_content)
+
+    detector = get_replacement_detector()
+    lookups: Dict[bytes, "asyncio.Future[Optional[bytes]]"] = {}
+
+    async def replaced(tx_hash: bytes) -> Optional[bytes]:
+        # Looked up once per hash: the index holds it after the first time.
+        # Recovering the sender's key is CPU-bound, so it runs off the loop.
+        if detector is None:
+            return None
+        if tx_hash not in lookups:
+            lookups[tx_hash] = asyncio.get_running_loop().run_in_executor(
+                None, _find_replaced, detector, body["params"][0], tx_hash
+            )
+        return await lookups[tx_hash]
+
+    if settings.fanout_validators:
+        answer: "asyncio.Future[Dict[str, Any]]" = (
+            asyncio.get_running_loop().create_future()
+        )
+        fan_out = asyncio.create_task(_fan_out(settings, body, replaced, answer))
+        _FAN_OUTS.add(fan_out)
+        fan_out.add_done_callback(_FAN_OUTS.discard)
+        with stage(UPSTREAM):
+            response_data = await answer
+        with stage(SERIALIZE):
+            return JSONResponse(content=response_data)
+
+    # Forward the request to the validator node.
+    with stage(UPSTREAM):
+        async with aiohttp.ClientSession() as session:
+            response_data = await _forward(session, settings.rpc_url, body)
+    tx_hash, tx_index, node_commitment = _accepted(response_data)
+    node_id = getattr(settings, "node_id", "avalanche")
+    await _record(
+        settings, node_id, tx_hash, tx_index, node_commitment, await replaced(tx_hash)
+    )
+    with stage(SERIALIZE):
+        return JSONResponse(content=response_data)
@@ -0,0 +1,129 @@
+# query_router.py
+from typing import Any, Dict, List, Optional
+
+from fastapi import APIRouter, HTTPException, Query, Response
+from pony import orm
+
+from slasher_proxy.common import C_STATUS_OMITTED
+from slasher_proxy.common.replica import get_read_router
+from slasher_proxy.common.timing import DB, stage
+
+router = APIRouter()
+
+# Read-only endpoints. They use raw SQL that works on both Postgres and
+# sqlite, so the ReadRouter can send them to a replica that has no entities
+# mapped. The X-Read-Source header tells which database answered.
+
+READ_SOURCE_HEADER = "X-Read-Source"
+
+
+def _hex(value: Any) -> str:
+    return "0x" + bytes(value).hex()
+
+
+def _parse_hash(value: str) -> bytes:
+    try:
+        return bytes.fromhex(value[2:] if value.startswith("0x") else value)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid hash")
+
+
+@router.get("/stats/{node}")
+def node_stats(node: str, response: Response) -> Dict[str, Any]:
+    def query(database: orm.Database) -> Dict[str, Any]:
+        totals = database.select(
+            "SELECT total_transactions, reordered_count, censored_count "
+            "FROM nodestats WHERE node = $node",
+            {"node": node},
+        )
+        live = database.select(
+            "SELECT status, COUNT(*) FROM commitment WHERE node = $node "
+            "GROUP BY status",
+            {"node": node},
+        )
+        archived = database.select(
+            "SELECT status, count FROM commitmentsummary WHERE node = $node",
+            {"node": node},
+        )
+        commitments: Dict[int, int] = {}
+        for status, count in list(live) + list(archived):
+            commitments[status] = commitments.get(status, 0) + count
+        return {
+            "node": node,
+            "total_transactions": totals[0][0] if totals else 0,
+            "reordered_count": totals[0][1] if totals else 0,
+            "censored_count": totals[0][2] if totals else 0,
+            "commitments_by_status": commitments,
+        }
+
+    with stage(DB):
+        result, response.headers[READ_SOURCE_HEADER] = get_read_router().read(query)
+    return result
+
+
+@router.get("/transactions/{tx_hash}")
+def transaction_status(tx_hash: str, response: Response) -> Dict[str, Any]:
+    hash_bytes = _parse_hash(tx_hash)
+
+    def query(database: orm.Database) -> Optional[Dict[str, Any]]:
+        txs = database.select(
+            'SELECT status, from_address, nonce FROM "transaction" WHERE hash = $h',
+            {"h": hash_bytes},
+        )
+        if not txs:
+            return None
+        commitments = database.select(
+            'SELECT node, "index", status FROM commitment WHERE tx_hash = $h',
+            {"h": hash_bytes},
+        )
+        status, from_address, nonce = txs[0]
+        return {
+            "hash": _hex(hash_bytes),
+            "status": status,
+            "from_address": from_address,
+            "nonce": nonce,
+            "commitments": [
+                {"node": node, "index": index, "status": c_status}
+                for node, index, c_status in commitments
+            ],
+        }
+
+    with stage(DB):
+        result, response.headers[READ_SOURCE_HEADER] = get_read_router().read(query)
+    if result is None:
+        raise HTTPException(status_code=404, detail="Transaction not found")
+    return result
+
+
+@router.get("/evidence/{node}")
+def censorship_evidence(
+    node: str,
+    response: Response,
+    limit: int = Query(100, ge=1, le=1000),
+) -> List[Dict[str, Any]]:
+    """Commitments of ``node`` that were omitted from the blocks they were due in."""
+
+    def query(database: orm.Database) -> List[Dict[str, Any]]:
+        rows = database.select(
+            'SELECT "index", tx_hash, status, created_at FROM commitment '
+            "WHERE node = $node AND status = $omitted "
+            'ORDER BY "index" DESC LIMIT $limit',
+            {
+                "node": node,
+                "omitted": C_STATUS_OMITTED,
+                "limit": limit,
+            },
+        )
+        return [
+            {
+                "index": index,
+                "tx_hash": _hex(c_hash),
+                "status": status,
+                "created_at": str(created_at),
+            }
+            for index, c_hash, status, created_at in rows
+        ]
+
+    with stage(DB):
+        result, response.headers[READ_SOURCE_HEADER] = get_read_router().read(query)
+    return result
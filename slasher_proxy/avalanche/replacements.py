@@ -0,0 +1,83 @@
+"""
+Finding replacement transactions: a transaction with the sender and nonce of
+one submitted before replaces it, and check_block revokes the commitments to
+the replaced one once the replacement is in a block.
+"""
+
+from typing import Dict, Iterable, Optional, Tuple
+
+import threading
+from collections import OrderedDict
+
+from slasher_proxy.avalanche.block_stream import CompactTransaction
+
+DEFAULT_INDEX_SIZE: int = 100_000
+
+
+class ReplacementDetector:
+    """
+    Bounded, thread-safe in-memory index of submitted transactions by
+    ``(sender, nonce)``, so finding what a transaction replaces needs no
+    lookup of Transaction by sender and nonce.
+
+    observe() indexes a submission and returns the transaction it replaces.
+    During block ingestion find() looks up all the block's transactions at
+    once, which also catches replacements that were sent around the proxy,
+    and evict() then drops their nonces, as nothing can replace a mined
+    transaction. The oldest entries are dropped beyond ``max_size``, e.g.
+    for transactions that were never mined.
+    """
+
+    def __init__(self, max_size: int = DEFAULT_INDEX_SIZE) -> None:
+        self.max_size = max(max_size, 1)
+        self._index: "OrderedDict[Tuple[str, int], bytes]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.replacements = 0
+
+    def __len__(self) -> int:
+        return len(self._index)
+
+    def observe(self, sender: str, nonce: int, tx_hash: bytes) -> Optional[bytes]:
+        """Index a submitted transaction; returns the one it replaces, if any."""
+        key = (sender.lower(), nonce)
+        with self._lock:
+            replaced = self._index.get(key)
+            self._index[key] = tx_hash
+            self._index.move_to_end(key)
+            if len(self._index) > self.max_size:
+                self._index.popitem(last=False)
+            if replaced == tx_hash:
+                return None
+            if replaced is not None:
+                self.replacements += 1
+            return replaced
+
+    def find(self, txs: Iterable[CompactTransaction]) -> Dict[bytes, bytes]:
+        """The indexed transactions replaced by ``txs``: replacement -> replaced."""
+        found: Dict[bytes, bytes] = {}
+        with self._lock:
+            for tx in txs:
+                replaced = self._index.get((tx.from_address.lower(), tx.nonce))
+                if replaced is not None and replaced != tx.hash:
+                    found[tx.hash] = replaced
+        self.replacements += len(found)
+        return found
+
+    def evict(self, txs: Iterable[CompactTransaction]) -> None:
+        """Drop the nonces of mined transactions."""
+        with self._lock:
+            for tx in txs:
+                self._index.pop((tx.from_address.lower(), tx.nonce), None)
+
+
+# Set by the app lifespan when REPLACEMENT_INDEX_SIZE is not 0.
+replacement_detector_instance: Optional[ReplacementDetector] = None
+
+
+def get_replacement_detector() -> Optional[ReplacementDetector]:
+    return replacement_detector_instance
+
+
+def set_replacement_detector(detector: Optional[ReplacementDetector]) -> None:
+    global replacement_detector_instance
+    replacement_detector_instance = detector
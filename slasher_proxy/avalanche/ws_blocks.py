@@ -1,14 +1,37 @@
-from typing import Any, Callable, Dict, Optional
+from typing import Any, Callable, Dict, List, Optional, Tuple
 
 import asyncio
 import json
-from urllib.parse import urlparse
+import time
+from concurrent.futures import ThreadPoolExecutor
 
 import aiohttp
 import websockets
 from websockets.exceptions import ConnectionClosed
 
+from slasher_proxy.avalanche import async_ops
+from slasher_proxy.avalanche.block_fetcher import (
+    BlockFetcher,
+    FetchedBlock,
+    block_height,
+    cchain_rpc_url_from_ws,
+    http_base_from_ws,
+)
+from slasher_proxy.avalanche.capture import get_capture_log
+from slasher_proxy.common.async_db import AsyncDatabase
+from slasher_proxy.common.backoff import Backoff
+from slasher_proxy.common.checkpoint import (
+    get_last_processed_block,
+    verify_and_checkpoint,
+)
 from slasher_proxy.common.log import LOGGER
+from slasher_proxy.common.pipeline import (
+    DEFAULT_QUEUE_SIZE,
+    Stage,
+    StageMetrics,
+    run_stages,
+)
+from slasher_proxy.common.sqlite_writer import call_directly
 
 
 async def get_node_id(rpc_url: str) -> Optional[str]:
@@ -28,41 +51,210 @@ async def get_node_id(rpc_url: str) -> Optional[str]:
                 return None
 
 
+DEFAULT_NODE_ID_TTL: float = 3600.0
+
+# rpc_url -> (node_id, expires_at)
+_node_id_cache: Dict[str, Tuple[str, float]] = {}
+
+
+async def get_cached_node_id(
+    rpc_url: str, ttl: float = DEFAULT_NODE_ID_TTL
+) -> Optional[str]:
+    """get_node_id() with results kept for ``ttl`` seconds per RPC URL."""
+    cached = _node_id_cache.get(rpc_url)
+    if cached is not None and cached[1] > time.monotonic():
+        return cached[0]
+    node_id = await get_node_id(rpc_url)
+    if node_id is not None:
+        _node_id_cache[rpc_url] = (node_id, time.monotonic() + ttl)
+    return node_id
+
+
 class WebSocketListener:
+    """
+    Ingests blocks announced over a ``newHeads`` subscription as a pipeline of
+    stages: receive -> fetch -> persist -> verify.
+
+    The receive stage only records the announced head height in the fetcher,
+    so the websocket is always read promptly; a burst of headers collapses into
+    a single, higher head. The fetch stage hands full blocks, in order, to the
+    bounded persist queue and stops fetching ahead while that queue is full.
+    Persist and verify run their blocking DB work in single-thread executors,
+    which keeps the event loop free and preserves block order.
+
+    The height of the last verified block is stored in the database, in the
+    transaction that verifies it. Whenever the pipeline (re)starts, fetching
+    resumes right after it, so blocks produced while disconnected are
+    backfilled before the live stream continues. A block persisted but not
+    yet verified before the restart is saved again, which only adds the links
+    it is missing.
+
+    With ``async_db`` set, persist and verify use the asyncpg operations of
+    async_ops instead of ``parse_and_save_func`` and ``check_block_func``.
+    Otherwise their writes are made through ``run_write``, by default a
+    direct call; on sqlite it is the writer thread's ``call``.
+
+    With ``verify`` unset the pipeline ends with persist, for a cluster whose
+    replicas verify the stored blocks (see common.cluster).
+    """
+
     def __init__(
         self,
         url: str,
-        parse_and_save_func: Callable[[Dict[str, Any], str], Dict[str, Any]],
+        parse_and_save_func: Callable[[Any, str], Dict[str, Any]],
         check_block_func: Callable[[int], None],
+        fetcher: Optional[BlockFetcher] = None,
+        queue_size: int = DEFAULT_QUEUE_SIZE,
+        node_id_ttl: float = DEFAULT_NODE_ID_TTL,
+        backoff: Optional[Backoff] = None,
+        async_db: Optional[AsyncDatabase] = None,
+        run_write: Optional[Callable[..., Any]] = None,
+        verify: bool = True,
     ):
         self.url = url
         self.parse_and_save_func = parse_and_save_func
         self.check_block_func = check_block_func
+        # newHeads only carries headers, full blocks are fetched over JSON-RPC.
+        self.fetcher = fetcher or BlockFetcher(cchain_rpc_url_from_ws(url))
+        self.queue_size = queue_size
+        self.node_id_ttl = node_id_ttl
+        self.backoff = backoff or Backoff()
+        self.async_db = async_db
+        self.run_write = run_write or call_directly
+        self.verify = verify
+        self.node_id: Optional[str] = None
+        # Highest block persisted and verified in this run.
+        self.last_verified: Optional[int] = None
+        self.receive_metrics = StageMetrics()
+        self.fetch_metrics = StageMetrics()
+        self.persist_stage: Optional[Stage[FetchedBlock]] = None
+        self.verify_stage: Optional[Stage[int]] = None
+
+    def build_stages(self) -> None:
+        if self.async_db is not None:
+            # asyncpg does not block the loop, so no executors are needed.
+            self.verify_stage = None
+            if self.verify:
+                self.verify_stage = Stage(
+                    "verify", self.__verify_block_async, maxsize=self.queue_size
+                )
+            self.persist_stage = Stage(
+                "persist",
+                self.__persist_block_async,
+                downstream=self.verify_stage,
+                maxsize=self.queue_size,
+            )
+            return
+        self.verify_stage = None
+        if self.verify:
+            self.verify_stage = Stage(
+                "verify",
+                self.__verify_block,
+                maxsize=self.queue_size,
+                blocking=True,
+                executor=ThreadPoolExecutor(1, thread_name_prefix="verify"),
+            )
+        self.persist_stage = Stage(
+            "persist",
+            self.__persist_block,
+            downstream=self.verify_stage,
+            maxsize=self.queue_size,
+            blocking=True,
+            executor=ThreadPoolExecutor(1, thread_name_prefix="persist"),
+        )
+
+    def metrics(self) -> Dict[str, Dict[str, float]]:
+        """Queue depth, throughput and lag of every ingestion stage."""
+        fetch_backlog = 0
+        if self.fetcher.head_height is not None and self.fetcher.next_height:
+            fetch_backlog = self.fetcher.head_height - self.fetcher.next_height + 1
+        result: Dict[str, Dict[str, float]] = {
+            "receive": {"depth": 0, "processed": self.receive_metrics.processed},
+            "fetch": {
+                "depth": max(fetch_backlog, 0),
+                "processed": self.fetch_metrics.processed,
+                "throughput": self.fetch_metrics.throughput,
+                "last_lag": self.fetch_metrics.last_lag,
+                "max_lag": self.fetch_metrics.max_lag,
+            },
+        }
+        for stage in (self.persist_stage, self.verify_stage):
+            if stage is not None:
+                result[stage.name] = stage.snapshot()
+        return result
 
     async def listen(self) -> None:
+        while True:
+            try:
+                last_processed = await asyncio.to_thread(get_last_processed_block)
+                self.fetcher.reset(
+                    last_processed + 1 if last_processed is not None else None
+                )
+                if last_processed is not None:
+                    LOGGER.info("Resuming block ingestion after %s", last_processed)
+                # Built right before the run, which shuts their executors down.
+                self.build_stages()
+                await self.__run_pipeline()
+            except Exception as e:
+                delay = self.backoff.next_delay()
+                LOGGER.error(f"Block ingestion pipeline failed: {e}")
+                LOGGER.info("Restarting the pipeline in %.1f seconds...", delay)
+                await asyncio.sleep(delay)
+
+    async def __run_pipeline(self) -> None:
+        """
+        Run receive, fetch and the stages until one of them fails. All of them
+        are stopped before this returns, so a restarted pipeline never shares
+        the fetcher with a loop left over from the previous one.
+        """
+        assert self.persist_stage
+        stages = [s for s in (self.persist_stage, self.verify_stage) if s]
+        tasks: List["asyncio.Task[None]"] = [
+            asyncio.create_task(self.__receive(), name="receive"),
+            asyncio.create_task(self.__fetch_blocks(), name="fetch"),
+            asyncio.create_task(run_stages(*stages), name="stages"),
+        ]
+        try:
+            done, _ = await asyncio.wait(tasks, return_when=asyncio.FIRST_EXCEPTION)
+            for task in done:
+                task.result()
+        finally:
+            for task in tasks:
+                task.cancel()
+            executors = [
+                stage.executor for stage in stages if stage.executor is not None
+            ]
+            for executor in executors:
+                executor.shutdown(wait=False, cancel_futures=True)
+            await asyncio.gather(*tasks, return_exceptions=True)
+            # Wait for a DB call already running in a stage thread, so it
+            # cannot overlap with the same block handled by the next pipeline.
+            loop = asyncio.get_running_loop()
+            for executor in executors:
+                await asyncio.shield(loop.run_in_executor(None, executor.shutdown))
+
+    async def __receive(self) -> None:
         while True:
             try:
                 await self.__handle_websocket_connection()
             except Exception as e:
                 LOGGER.error(f"Error in WebSocket connection: {e}")
-                LOGGER.info("Reconnecting in 5 seconds...")
-                await asyncio.sleep(5)
+            delay = self.backoff.next_delay()
+            LOGGER.info("Reconnecting in %.1f seconds...", delay)
+            await asyncio.sleep(delay)
 
     async def __handle_websocket_connection(self) -> None:
-        node_id = await self.__get_node_id()
+        self.node_id = await self.__get_node_id()
 
         async with websockets.connect(self.url) as websocket:
             LOGGER.info(f"Connected to WebSocket at {self.url}")
+            self.backoff.reset()
             await self.__subscribe_to_new_heads(websocket)
-            await self.__process_messages(websocket, node_id)
+            await self.__process_messages(websocket)
 
     async def __get_node_id(self) -> str:
-        parsed_url = urlparse(self.url)
-        hostname = parsed_url.hostname
-        port = parsed_url.port or (443 if parsed_url.scheme == "wss" else 80)
-        rpc_scheme = "https" if parsed_url.scheme == "wss" else "http"
-        rpc_url = f"{rpc_scheme}://{hostname}:{port}/ext/info"
-        node_id = await get_node_id(rpc_url)
+        rpc_url = f"{http_base_from_ws(self.url)}/ext/info"
+        node_id = await get_cached_node_id(rpc_url, self.node_id_ttl)
         if node_id is None:
             raise ValueError("NodeID is not available.")
         return node_id
@@ -77,18 +269,58 @@ class WebSocketListener:
         }
         await websocket.send(json.dumps(subscribe_msg))
 
-    async def __process_messages(self, websocket: Any, node_id: str) -> None:
+    async def __process_messages(self, websocket: Any) -> None:
         while True:
             try:
                 message = await websocket.recv()
                 data = json.loads(message)
                 if "params" in data and "result" in data["params"]:
                     block_number = int(data["params"]["result"]["number"], 16)
-                    LOGGER.info(f"New block received: {block_number}")
-                    self.parse_and_save_func(data["params"], node_id)
-                    self.check_block_func(block_number)
+                    LOGGER.info("New block received: %s", block_number)
+                    self.fetcher.announce(block_number)
+                    self.receive_metrics.processed += 1
                 else:
-                    LOGGER.info(f"Received message: {json.dumps(data, indent=2)}")
+                    LOGGER.info("Received message: %s", message)
             except ConnectionClosed:
                 LOGGER.error("WebSocket connection closed. Reconnecting...")
                 break
+
+    async def __fetch_blocks(self) -> None:
+        assert self.persist_stage is not None
+        while True:
+            block = await self.fetcher.next_block()
+            height = block_height(block)
+            self.fetch_metrics.observe(self.fetcher.delivery_lag(height), 0.0)
+            # Waits while the persist queue is full; the fetcher then stops
+            # prefetching and further headers only move its head height.
+            await self.persist_stage.put(block)
+
+    def __persist_block(self, block: FetchedBlock) -> int:
+        if self.node_id is None:
+            raise ValueError("NodeID is not available.")
+        self.run_write(self.parse_and_save_func, block, self.node_id)
+        self.__capture(block)
+        return block_height(block)
+
+    def __verify_block(self, height: int) -> None:
+        self.run_write(verify_and_checkpoint, self.check_block_func, height)
+        self.last_verified = height
+
+    async def __persist_block_async(self, block: FetchedBlock) -> int:
+        assert self.async_db is not None
+        if self.node_id is None:
+            raise ValueError("NodeID is not available.")
+        await async_ops.save_block(self.async_db, block, self.node_id)
+        self.__capture(block)
+        return block_height(block)
+
+    def __capture(self, block: FetchedBlock) -> None:
+        capture_log = get_capture_log()
+        if capture_log is not None:
+            assert self.node_id is not None
+            capture_log.block(self.node_id, block)
+
+    async def __verify_block_async(self, height: int) -> None:
+        assert self.async_db is not None
+        await async_ops.check_block(self.async_db, height, checkpoint=True)
+        self.last_verified = height
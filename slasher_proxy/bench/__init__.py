@@ -0,0 +1,49 @@
+from typing import Any, Callable, Dict, List, NamedTuple
+
+import gc
+import time
+import tracemalloc
+
+
+class Measurement(NamedTuple):
+    seconds: float  # mean wall time per call
+    peak_bytes: int  # peak traced allocation of a single call
+
+
+def measure(func: Callable[[], Any], repeat: int = 5) -> Measurement:
+    """Time ``func`` over ``repeat`` calls, then trace the memory of one more."""
+    func()  # warm up caches and lazy imports
+    gc.collect()
+    started = time.perf_counter()
+    for _ in range(repeat):
+        func()
+    seconds = (time.perf_counter() - started) / repeat
+    gc.collect()
+    tracemalloc.start()
+    try:
+        func()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return Measurement(seconds, peak)
+
+
+def format_table(rows: List[Dict[str, Any]]) -> str:
+    """Render result rows as a plain aligned text table."""
+    if not rows:
+        return ""
+    columns = list(rows[0])
+    cells = [[_format_cell(row[c]) for c in columns] for row in rows]
+    widths = [
+        max(len(c), *(len(line[i]) for line in cells)) for i, c in enumerate(columns)
+    ]
+    lines = ["  ".join(c.rjust(w) for c, w in zip(columns, widths))]
+    for line in cells:
+        lines.append("  ".join(c.rjust(w) for c, w in zip(line, widths)))
+    return "\n".join(lines)
+
+
+def _format_cell(value: Any) -> str:
+    if isinstance(value, float):
+        return f"{value:.6g}"
+    return str(value)
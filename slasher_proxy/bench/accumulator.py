@@ -0,0 +1,272 @@
+"""
+RollingHashAccumulator and CountingBloomFilterAccumulator, as shipped, next to
+candidate implementations that produce the same states.
+"""
+
+from typing import Any, Callable, Dict, List, Sequence
+
+import hashlib
+import os
+import struct
+
+from slasher_proxy.bench import measure
+from slasher_proxy.common.accumulator import RollingHashAccumulator, int_to_bytes
+from slasher_proxy.common.sketch import (
+    DEFAULT_COUNTER_SIZE,
+    DEFAULT_NUM_COUNTERS,
+    DEFAULT_NUM_HASHES,
+    CountingBloomFilterAccumulator,
+)
+
+try:
+    import numpy
+except ImportError:  # optional: only its variants are skipped
+    numpy = None
+HAVE_NUMPY = numpy is not None
+
+DEFAULT_ROLLING_SIZES = (1_000, 10_000, 100_000)
+DEFAULT_SKETCH_SIZES = (64, 1024, 16384)
+# struct codes of the big-endian unsigned counter sizes
+_COUNTER_CODES = {1: "B", 2: "H", 4: "I", 8: "Q"}
+
+
+class CheckpointedRollingHashAccumulator(RollingHashAccumulator):
+    """
+    Keeps the state after every append, so deleting a transaction rehashes
+    only the ones after it instead of all of them.
+    """
+
+    def __init__(
+        self, initial_state: bytes = b"\x00" * 32, initial_count: int = 0
+    ) -> None:
+        super().__init__(initial_state, initial_count)
+        self.states: List[bytes] = [initial_state]
+
+    def add_transaction(self, tx_hash: bytes) -> int:
+        index = super().add_transaction(tx_hash)
+        self.states.append(self.state)
+        return index
+
+    def delete_transaction(self, global_index: int) -> None:
+        local_index = global_index - self.initial_count - 1
+        if local_index < 0 or local_index >= len(self.tx_hashes):
+            raise IndexError("Transaction global index out of range")
+        del self.tx_hashes[local_index]
+        del self.states[local_index + 1 :]
+        state = self.states[local_index]
+        for i in range(local_index, len(self.tx_hashes)):
+            index = int_to_bytes(self.initial_count + i + 1)
+            state = hashlib.sha256(state + index + self.tx_hashes[i]).digest()
+            self.states.append(state)
+        self.state = state
+
+
+class PackedCountingBloomFilter(CountingBloomFilterAccumulator):
+    """
+    Hashes from the raw digest rather than its hex form, and packs and unpacks
+    the counters with one struct call instead of growing a bytes object per
+    counter.
+    """
+
+    def _hash(self, tx_hash: bytes, index: int) -> int:
+        combined = tx_hash + self.salt + index.to_bytes(4, byteorder="big")
+        return int.from_bytes(hashlib.sha256(combined).digest(), "big") % (
+            self.num_counters
+        )
+
+    def to_bytes(self) -> bytes:
+        min_counter = min(self.counters)
+        counters = struct.pack(
+            f">{self.num_counters}{_COUNTER_CODES[self.counter_size]}",
+            *(c - min_counter for c in self.counters),
+        )
+        return (
+            counters
+            + min_counter.to_bytes(self.counter_size, byteorder="big")
+            + self.salt
+        )
+
+    @classmethod
+    def from_bytes(
+        cls,
+        state: bytes,
+        num_counters: int = DEFAULT_NUM_COUNTERS,
+        num_hashes: int = DEFAULT_NUM_HASHES,
+        counter_size: int = DEFAULT_COUNTER_SIZE,
+    ) -> "PackedCountingBloomFilter":
+        counter_bytes = counter_size * num_counters
+        if len(state) != counter_bytes + counter_size + 16:
+            raise ValueError("State does not match the accumulator parameters.")
+        counters = struct.unpack_from(
+            f">{num_counters}{_COUNTER_CODES[counter_size]}", state
+        )
+        min_counter = int.from_bytes(
+            state[counter_bytes : counter_bytes + counter_size], byteorder="big"
+        )
+        accumulator = cls(num_counters, num_hashes, counter_size, state[-16:])
+        accumulator.counters = [c + min_counter for c in counters]
+        return accumulator
+
+
+def numpy_to_bytes(accumulator: CountingBloomFilterAccumulator) -> bytes:
+    """CountingBloomFilterAccumulator.to_bytes() with the packing vectorized."""
+    assert numpy is not None
+    counters = numpy.asarray(accumulator.counters, dtype=numpy.int64)
+    min_counter = int(counters.min())
+    dtype = f">u{accumulator.counter_size}"
+    packed: bytes = (counters - min_counter).astype(dtype).tobytes()
+    return (
+        packed
+        + min_counter.to_bytes(accumulator.counter_size, byteorder="big")
+        + accumulator.salt
+    )
+
+
+def numpy_from_bytes(
+    state: bytes, num_counters: int, counter_size: int = DEFAULT_COUNTER_SIZE
+) -> CountingBloomFilterAccumulator:
+    """CountingBloomFilterAccumulator.from_bytes() with the unpacking vectorized."""
+    assert numpy is not None
+    counter_bytes = counter_size * num_counters
+    counters = numpy.frombuffer(state, dtype=f">u{counter_size}", count=num_counters)
+    min_counter = int.from_bytes(
+        state[counter_bytes : counter_bytes + counter_size], byteorder="big"
+    )
+    accumulator = CountingBloomFilterAccumulator(
+        num_counters, counter_size=counter_size, salt=state[-16:]
+    )
+    accumulator.counters = (counters.astype(numpy.int64) + min_counter).tolist()
+    return accumulator
+
+
+def _hashes(count: int) -> List[bytes]:
+    return [os.urandom(32) for _ in range(count)]
+
+
+def _row(
+    primitive: str,
+    operation: str,
+    size: int,
+    variant: str,
+    func: Callable[[], Any],
+    ops_per_call: int,
+    repeat: int,
+) -> Dict[str, Any]:
+    result = measure(func, repeat)
+    return {
+        "primitive": primitive,
+        "operation": operation,
+        "size": size,
+        "variant": variant,
+        "ops_per_s": ops_per_call / result.seconds,
+        "peak_kib": result.peak_bytes / 1024,
+    }
+
+
+def _rolling_rows(size: int, repeat: int) -> List[Dict[str, Any]]:
+    rows = []
+    hashes = _hashes(size)
+    variants = [
+        ("baseline", RollingHashAccumulator),
+        ("checkpointed", CheckpointedRollingHashAccumulator),
+    ]
+    for variant, cls in variants:
+
+        def add(cls: Any = cls) -> None:
+            accumulator = cls()
+            for tx_hash in hashes:
+                accumulator.add_transaction(tx_hash)
+
+        rows.append(_row("rolling", "add", size, variant, add, size, repeat))
+
+    # Every call deletes the middle transaction and appends it again, so the
+    # accumulator keeps its size.
+    states = []
+    for variant, cls in variants:
+        accumulator = cls()
+        for tx_hash in hashes:
+            accumulator.add_transaction(tx_hash)
+
+        def delete_middle(accumulator: Any = accumulator) -> None:
+            middle = len(accumulator.tx_hashes) // 2
+            tx_hash = accumulator.tx_hashes[middle]
+            accumulator.delete_transaction(accumulator.initial_count + middle + 1)
+            accumulator.add_transaction(tx_hash)
+
+        rows.append(
+            _row("rolling", "delete middle", size, variant, delete_middle, 1, repeat)
+        )
+        states.append(accumulator.to_bytes())
+    assert len(set(states)) == 1, "variants disagree on the state"
+    return rows
+
+
+def _sketch_rows(size: int, repeat: int) -> List[Dict[str, Any]]:
+    rows = []
+    hashes = _hashes(1000)
+    salt = os.urandom(16)
+    baseline = CountingBloomFilterAccumulator(size, salt=salt)
+    packed = PackedCountingBloomFilter(size, salt=salt)
+    for accumulator in (baseline, packed):
+        for tx_hash in hashes[::2]:
+            accumulator.add_transaction(tx_hash)
+    state = baseline.to_bytes()
+    assert packed.to_bytes() == state, "variants disagree on the state"
+    assert PackedCountingBloomFilter.from_bytes(state, size).counters == (
+        baseline.counters
+    )
+
+    for variant, accumulator in (("baseline", baseline), ("packed", packed)):
+
+        def add_delete(accumulator: Any = accumulator) -> None:
+            for tx_hash in hashes:
+                accumulator.add_transaction(tx_hash)
+            for tx_hash in hashes:
+                accumulator.delete_transaction(tx_hash)
+
+        rows.append(
+            _row("sketch", "add+delete", size, variant, add_delete, 1000, repeat)
+        )
+
+    round_trips: List[Any] = [
+        (
+            "baseline",
+            lambda: CountingBloomFilterAccumulator.from_bytes(
+                baseline.to_bytes(), size
+            ),
+        ),
+        (
+            "packed",
+            lambda: PackedCountingBloomFilter.from_bytes(packed.to_bytes(), size),
+        ),
+    ]
+    if HAVE_NUMPY:
+        assert numpy_to_bytes(baseline) == state
+        assert numpy_from_bytes(state, size).counters == baseline.counters
+        round_trips.append(
+            ("numpy", lambda: numpy_from_bytes(numpy_to_bytes(baseline), size))
+        )
+    for variant, round_trip in round_trips:
+        rows.append(
+            _row("sketch", "bytes round trip", size, variant, round_trip, 1, repeat)
+        )
+    return rows
+
+
+def run(
+    rolling_sizes: Sequence[int] = DEFAULT_ROLLING_SIZES,
+    sketch_sizes: Sequence[int] = DEFAULT_SKETCH_SIZES,
+    repeat: int = 5,
+) -> List[Dict[str, Any]]:
+    """
+    Operations per second and peak traced allocation of one call, per
+    operation, size and variant; "baseline" is the shipped class. Rolling
+    sizes are transactions in the accumulator, sketch sizes are counters.
+    The numpy variants run only when numpy is installed.
+    """
+    rows: List[Dict[str, Any]] = []
+    for size in rolling_sizes:
+        rows += _rolling_rows(size, repeat)
+    for size in sketch_sizes:
+        rows += _sketch_rows(size, repeat)
+    return rows
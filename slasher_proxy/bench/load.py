@@ -0,0 +1,133 @@
+"""Drives a running proxy with pre-signed transactions at a target rate."""
+
+from typing import Any, Dict, List, Optional, Sequence
+
+import asyncio
+import time
+
+import aiohttp
+
+DEFAULT_RATE = 100.0
+DEFAULT_COUNT = 1000
+DEFAULT_CONCURRENCY = 64
+DEFAULT_CHAIN_ID = 43112  # the C-Chain of a local Avalanche network
+PERCENTILES = (50, 90, 99)
+
+
+def presign(
+    count: int,
+    private_key: Optional[str] = None,
+    chain_id: int = DEFAULT_CHAIN_ID,
+    first_nonce: int = 0,
+) -> List[str]:
+    """
+    Sign ``count`` transfers with consecutive nonces ahead of the run, so
+    signing does not count against the sending rate. Without a key, one is
+    generated; the mock validator does not check balances.
+    """
+    from eth_account import Account
+
+    account = Account.from_key(private_key) if private_key else Account.create()
+    raw_txs = []
+    for nonce in range(first_nonce, first_nonce + count):
+        tx = {
+            "to": account.address,
+            "value": 1,
+            "gas": 21000,
+            "maxPriorityFeePerGas": 5 * 10**9,
+            "maxFeePerGas": 30 * 10**9,
+            "nonce": nonce,
+            "chainId": chain_id,
+            "type": 2,
+        }
+        signed = account.sign_transaction(tx)
+        raw_txs.append("0x" + bytes(signed.raw_transaction).hex())
+    return raw_txs
+
+
+def percentile(sorted_values: Sequence[float], p: float) -> float:
+    """Nearest-rank percentile of already sorted values."""
+    if not sorted_values:
+        return 0.0
+    rank = max(int(round(p / 100 * len(sorted_values))), 1)
+    return sorted_values[min(rank, len(sorted_values)) - 1]
+
+
+async def drive(
+    proxy_url: str,
+    raw_txs: Sequence[str],
+    rate: float = DEFAULT_RATE,
+    concurrency: int = DEFAULT_CONCURRENCY,
+) -> Dict[str, Any]:
+    """
+    Submit ``raw_txs`` to the proxy's /eth_sendRawTransaction, starting one
+    every 1/``rate`` seconds with at most ``concurrency`` in flight.
+
+    A request's latency runs from its scheduled start, not from when a
+    connection became free, so a proxy that falls behind shows up in the
+    latencies rather than as a lower sending rate.
+    """
+    url = proxy_url.rstrip("/") + "/eth_sendRawTransaction"
+    latencies: List[float] = []
+    errors = 0
+    slots = asyncio.Semaphore(concurrency)
+
+    async def send(session: aiohttp.ClientSession, n: int, scheduled: float) -> None:
+        nonlocal errors
+        payload = {
+            "jsonrpc": "2.0",
+            "id": n,
+            "method": "eth_sendRawTransaction",
+            "params": [raw_txs[n]],
+        }
+        try:
+            async with session.post(url, json=payload) as response:
+                reply = await response.json(content_type=None)
+                ok = response.status == 200 and "result" in reply
+        except (aiohttp.ClientError, ValueError):
+            ok = False
+        finally:
+            slots.release()
+        if ok:
+            latencies.append(time.perf_counter() - scheduled)
+        else:
+            errors += 1
+
+    connector = aiohttp.TCPConnector(limit=concurrency)
+    async with aiohttp.ClientSession(connector=connector) as session:
+        tasks = []
+        started = time.perf_counter()
+        for n in range(len(raw_txs)):
+            scheduled = started + n / rate
+            delay = scheduled - time.perf_counter()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            await slots.acquire()
+            tasks.append(asyncio.create_task(send(session, n, scheduled)))
+        await asyncio.gather(*tasks)
+        elapsed = time.perf_counter() - started
+
+    latencies.sort()
+    result: Dict[str, Any] = {
+        "sent": len(raw_txs),
+        "ok": len(latencies),
+        "errors": errors,
+        "target_per_s": rate,
+        "achieved_per_s": len(latencies) / elapsed if elapsed else 0.0,
+    }
+    for p in PERCENTILES:
+        result[f"p{p}_ms"] = percentile(latencies, p) * 1e3
+    result["max_ms"] = latencies[-1] * 1e3 if latencies else 0.0
+    return result
+
+
+def run(
+    proxy_url: str,
+    count: int = DEFAULT_COUNT,
+    rate: float = DEFAULT_RATE,
+    concurrency: int = DEFAULT_CONCURRENCY,
+    private_key: Optional[str] = None,
+    chain_id: int = DEFAULT_CHAIN_ID,
+) -> List[Dict[str, Any]]:
+    raw_txs = presign(count, private_key, chain_id)
+    return [asyncio.run(drive(proxy_url, raw_txs, rate, concurrency))]
@@ -0,0 +1,99 @@
+"""Cost of logging on the caller: disabled vs. INFO, direct vs. queued."""
+
+from typing import Any, Dict, List
+
+import logging
+import multiprocessing
+import os
+import tempfile
+import time
+
+from slasher_proxy.bench import storage
+
+DEFAULT_RECORDS = 100_000
+
+# name: (level, non_blocking, json_format)
+MODES = {
+    "disabled": (logging.WARNING, False, False),
+    "info, direct": (logging.INFO, False, False),
+    "info, queued": (logging.INFO, True, False),
+    "info, queued json": (logging.INFO, True, True),
+}
+
+
+SINKS = ("devnull", "file")
+
+
+def _configure(mode: str, sink_path: str) -> Any:
+    from slasher_proxy.common.log import configure_logging
+
+    level, non_blocking, json_format = MODES[mode]
+    sink = open(sink_path, "w")
+    configure_logging(
+        level,
+        json_format=json_format,
+        non_blocking=non_blocking,
+        # Large enough that no record is dropped during the run.
+        queue_size=DEFAULT_RECORDS * 2,
+        stream=sink,
+    )
+    return sink
+
+
+def _run_mode(
+    mode: str,
+    sink_path: str,
+    records: int,
+    dsn: str,
+    blocks: int,
+    txs_per_block: int,
+) -> Dict[str, Any]:
+    """Runs in a fresh process: the logging set-up and the database are global."""
+    from slasher_proxy.common.log import LOGGER, stop_logging_thread
+
+    sink = _configure(mode, sink_path)
+    started = time.perf_counter()
+    for i in range(records):
+        LOGGER.info("Block %s processed with %s transactions", i, txs_per_block)
+    record_seconds = time.perf_counter() - started
+    result = storage._run_workload(dsn, False, blocks, txs_per_block, 1)
+    stop_logging_thread()
+    sink.close()
+    return {
+        "us_per_record": record_seconds / records * 1e6,
+        "submissions_per_s": result["submissions_per_s"],
+        "blocks_per_s": result["blocks_per_s"],
+    }
+
+
+def run(
+    records: int = DEFAULT_RECORDS,
+    blocks: int = storage.DEFAULT_BLOCKS,
+    txs_per_block: int = storage.DEFAULT_TXS_PER_BLOCK,
+    sink: str = "file",
+) -> List[Dict[str, Any]]:
+    """
+    For each mode, the caller-side cost of ``records`` INFO records and the
+    throughput of the storage workload on a scratch sqlite file, as seen by
+    the thread doing the work. Records go to ``sink``: a scratch file, or
+    os.devnull to leave out the cost of the write itself.
+    """
+    context = multiprocessing.get_context("spawn")
+    rows = []
+    with tempfile.TemporaryDirectory() as tmp:
+        for n, mode in enumerate(MODES):
+            with context.Pool(1) as pool:
+                sink_path = os.devnull if sink == "devnull" else f"{tmp}/{n}.log"
+                result = pool.apply(
+                    _run_mode,
+                    (
+                        mode,
+                        sink_path,
+                        records,
+                        f"sqlite://{tmp}/{n}.db",
+                        blocks,
+                        txs_per_block,
+                    ),
+                )
+            rows.append({"logging": mode, **result})
+    return rows
@@ -0,0 +1,228 @@
+"""
+A stand-in for a validator running the modified Avalanche node, for load
+tests without a network: the proxy submits transactions to it and ingests
+the blocks it produces.
+"""
+
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+import asyncio
+import hashlib
+import json
+import random
+
+from aiohttp import WSMsgType, web
+
+from slasher_proxy.common.accumulator import RollingHashAccumulator
+from slasher_proxy.common.log import LOGGER
+
+# The node the proxy records submissions under, so blocks match them.
+DEFAULT_NODE_ID = "avalanche"
+DEFAULT_BLOCK_INTERVAL = 1.0
+DEFAULT_MAX_BLOCK_TXS = 10_000
+SUBSCRIPTION_ID = "0x1"
+
+
+class MockValidator:
+    """
+    Serves the JSON-RPC calls the proxy makes, on the paths of a real node:
+
+    * ``/ext/bc/C/rpc``: eth_sendRawTransaction, answered with the
+      ``txHash``/``commitment``/``txIndex`` result of the modified node,
+      eth_getBlockByNumber with transaction objects, and eth_blockNumber;
+      batch requests too.
+    * ``/ext/info``: info.getNodeID.
+    * ``/ext/bc/C/ws``: eth_subscribe to newHeads.
+
+    Transactions are not decoded: a transaction's hash is the SHA3-256 of its
+    raw bytes, and its sender and nonce are derived from that hash. Every
+    ``block_interval`` seconds the transactions received meanwhile go into a
+    block in submission order, except that ``omit_rate`` of them are never
+    included and ``reorder_rate`` of them are held back for a later block.
+    """
+
+    def __init__(
+        self,
+        node_id: str = DEFAULT_NODE_ID,
+        block_interval: float = DEFAULT_BLOCK_INTERVAL,
+        max_block_txs: int = DEFAULT_MAX_BLOCK_TXS,
+        omit_rate: float = 0.0,
+        reorder_rate: float = 0.0,
+        seed: Optional[int] = None,
+    ) -> None:
+        self.node_id = node_id
+        self.block_interval = block_interval
+        self.max_block_txs = max_block_txs
+        self.omit_rate = omit_rate
+        self.reorder_rate = reorder_rate
+        self._random = random.Random(seed)
+        self._accumulator = RollingHashAccumulator()
+        self._mempool: List[bytes] = []
+        self._held: List[bytes] = []
+        self._blocks: List[Dict[str, Any]] = []
+        self._subscribers: Set[web.WebSocketResponse] = set()
+        self._producer: Optional["asyncio.Task[None]"] = None
+        self.submitted = 0
+        self.omitted = 0
+        self.reordered = 0
+
+    @property
+    def height(self) -> int:
+        return len(self._blocks)
+
+    def app(self) -> web.Application:
+        app = web.Application()
+        app.router.add_post("/ext/bc/C/rpc", self._handle_rpc)
+        app.router.add_post("/ext/info", self._handle_rpc)
+        app.router.add_get("/ext/bc/C/ws", self._handle_websocket)
+        app.on_startup.append(self._start_producer)
+        app.on_cleanup.append(self._stop_producer)
+        return app
+
+    async def _start_producer(self, app: web.Application) -> None:
+        self._producer = asyncio.create_task(self._produce_blocks())
+
+    async def _stop_producer(self, app: web.Application) -> None:
+        if self._producer:
+            self._producer.cancel()
+            await asyncio.gather(self._producer, return_exceptions=True)
+        for websocket in list(self._subscribers):
+            await websocket.close()
+
+    async def _produce_blocks(self) -> None:
+        while True:
+            await asyncio.sleep(self.block_interval)
+            await self.produce_block()
+
+    async def produce_block(self) -> Dict[str, Any]:
+        """Seal a block from the transactions received so far and announce it."""
+        # Transactions held back by the previous block go first, unconditionally.
+        held, self._held = self._held, []
+        candidates, self._mempool = held + self._mempool, []
+        included: List[bytes] = []
+        for n, tx_hash in enumerate(candidates):
+            roll = 1.0 if n < len(held) else self._random.random()
+            if roll < self.omit_rate:
+                self.omitted += 1
+            elif roll < self.omit_rate + self.reorder_rate:
+                self._held.append(tx_hash)
+                self.reordered += 1
+            elif len(included) < self.max_block_txs:
+                included.append(tx_hash)
+            else:
+                self._mempool.append(tx_hash)
+        number = len(self._blocks) + 1
+        block = {
+            "number": hex(number),
+            "hash": "0x" + _digest(b"block%d" % number).hex(),
+            "transactions": [_transaction(tx_hash) for tx_hash in included],
+        }
+        self._blocks.append(block)
+        head = json.dumps(
+            {
+                "jsonrpc": "2.0",
+                "method": "eth_subscription",
+                "params": {
+                    "subscription": SUBSCRIPTION_ID,
+                    "result": {"number": block["number"], "hash": block["hash"]},
+                },
+            }
+        )
+        for websocket in list(self._subscribers):
+            try:
+                await websocket.send_str(head)
+            except ConnectionError:
+                self._subscribers.discard(websocket)
+        return block
+
+    def submit(self, raw: bytes) -> Tuple[bytes, int, bytes]:
+        """Accept a raw transaction: its hash, index and the new commitment."""
+        tx_hash = _digest(raw)
+        index = self._accumulator.add_transaction(tx_hash)
+        self._mempool.append(tx_hash)
+        self.submitted += 1
+        return tx_hash, index, self._accumulator.state
+
+    def _call(self, method: str, params: Any) -> Any:
+        if method == "eth_sendRawTransaction":
+            raw = params[0]
+            tx_hash, index, commitment = self.submit(
+                bytes.fromhex(raw[2:] if raw.startswith("0x") else raw)
+            )
+            return {
+                "txHash": "0x" + tx_hash.hex(),
+                "commitment": "0x" + commitment.hex(),
+                "txIndex": index,
+            }
+        if method == "eth_getBlockByNumber":
+            number = int(params[0], 16)
+            return self._blocks[number - 1] if 0 < number <= self.height else None
+        if method == "eth_blockNumber":
+            return hex(self.height)
+        if method == "info.getNodeID":
+            return {"nodeID": self.node_id}
+        raise KeyError(method)
+
+    def _reply(self, request: Dict[str, Any]) -> Dict[str, Any]:
+        reply: Dict[str, Any] = {"jsonrpc": "2.0", "id": request.get("id")}
+        try:
+            reply["result"] = self._call(request["method"], request.get("params"))
+        except KeyError:
+            reply["error"] = {"code": -32601, "message": "method not found"}
+        except (IndexError, TypeError, ValueError) as e:
+            reply["error"] = {"code": -32602, "message": f"invalid params: {e}"}
+        return reply
+
+    async def _handle_rpc(self, request: web.Request) -> web.Response:
+        body = await request.json()
+        if isinstance(body, list):
+            return web.json_response([self._reply(r) for r in body])
+        return web.json_response(self._reply(body))
+
+    async def _handle_websocket(self, request: web.Request) -> web.WebSocketResponse:
+        websocket = web.WebSocketResponse()
+        await websocket.prepare(request)
+        async for message in websocket:
+            if message.type != WSMsgType.TEXT:
+                continue
+            data = json.loads(message.data)
+            if data.get("method") == "eth_subscribe":
+                self._subscribers.add(websocket)
+                await websocket.send_json(
+                    {"jsonrpc": "2.0", "id": data.get("id"), "result": SUBSCRIPTION_ID}
+                )
+        self._subscribers.discard(websocket)
+        return websocket
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "height": self.height,
+            "submitted": self.submitted,
+            "omitted": self.omitted,
+            "reordered": self.reordered,
+            "pending": len(self._mempool) + len(self._held),
+        }
+
+
+def _digest(data: bytes) -> bytes:
+    return hashlib.sha3_256(data).digest()
+
+
+def _transaction(tx_hash: bytes) -> Dict[str, Any]:
+    return {
+        "hash": "0x" + tx_hash.hex(),
+        "from": "0x" + tx_hash[:20].hex(),
+        "nonce": hex(tx_hash[20]),
+    }
+
+
+def serve(host: str, port: int, validator: MockValidator) -> None:
+    """Run the mock validator until interrupted."""
+    LOGGER.info(
+        "Mock validator at http://%s:%s/ext/bc/C/rpc, ws://%s:%s/ext/bc/C/ws",
+        host,
+        port,
+        host,
+        port,
+    )
+    web.run_app(validator.app(), host=host, port=port, print=None)
@@ -0,0 +1,79 @@
+"""Streaming block extraction vs. json.loads + dict conversion."""
+
+from typing import Any, Dict, List
+
+import json
+import os
+
+from slasher_proxy.avalanche.block_parser import compact_block_from_json
+from slasher_proxy.avalanche.block_stream import extract_block
+from slasher_proxy.bench import measure
+
+DEFAULT_TX_COUNTS = (10, 100, 1000, 10000)
+
+
+def synthetic_block_response(tx_count: int, input_size: int = 256) -> bytes:
+    """A C-Chain style eth_getBlockByNumber reply with full transactions."""
+
+    def word() -> str:
+        return "0x" + os.urandom(32).hex()
+
+    block_hash = word()
+    txs = []
+    for i in range(tx_count):
+        txs.append(
+            {
+                "blockHash": block_hash,
+                "blockNumber": "0x10",
+                "from": "0x" + os.urandom(20).hex(),
+                "gas": "0x5208",
+                "gasPrice": "0x6fc23ac00",
+                "maxFeePerGas": "0x6fc23ac00",
+                "maxPriorityFeePerGas": "0x12a05f200",
+                "hash": word(),
+                "input": "0x" + os.urandom(input_size).hex(),
+                "nonce": hex(i),
+                "to": "0x" + os.urandom(20).hex(),
+                "transactionIndex": hex(i),
+                "value": "0x38d7ea4c68000",
+                "type": "0x2",
+                "accessList": [
+                    {"address": "0x" + os.urandom(20).hex(), "storageKeys": [word()]}
+                ],
+                "chainId": "0x192b",
+                "v": "0x1",
+                "r": word(),
+                "s": word(),
+                "yParity": "0x1",
+            }
+        )
+    block = {
+        "hash": block_hash,
+        "number": "0x10",
+        "parentHash": word(),
+        "stateRoot": word(),
+        "timestamp": "0x67dc5224",
+        "transactions": txs,
+    }
+    return json.dumps({"jsonrpc": "2.0", "id": 16, "result": block}).encode()
+
+
+def run(tx_counts: Any = DEFAULT_TX_COUNTS, repeat: int = 5) -> List[Dict[str, Any]]:
+    rows = []
+    for tx_count in tx_counts:
+        raw = synthetic_block_response(tx_count)
+        for name, func in (
+            ("json.loads", lambda: compact_block_from_json(json.loads(raw))),
+            ("streaming", lambda: extract_block(raw)),
+        ):
+            result = measure(func, repeat)
+            rows.append(
+                {
+                    "parser": name,
+                    "txs": tx_count,
+                    "payload_kb": len(raw) / 1024,
+                    "ms_per_block": result.seconds * 1000,
+                    "peak_kb": result.peak_bytes / 1024,
+                }
+            )
+    return rows
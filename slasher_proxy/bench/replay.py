@@ -0,0 +1,90 @@
+"""Replays a capture log (CAPTURE_PATH) through submission storage and verification."""
+
+from typing import Any, Dict, List, Optional
+
+import multiprocessing
+import tempfile
+import time
+
+from slasher_proxy.bench.load import percentile
+
+BENCH_NETWORK = "bench"
+
+
+def _replay(dsn: str, path: str, speed: float) -> Dict[str, Any]:
+    """
+    Runs in a fresh process, since the Pony database can be bound only once.
+
+    Each submission is stored and each block saved and verified with its
+    checkpoint, the way the proxy does once the validator has answered, so
+    no upstream is needed. On sqlite the writes go through the writer thread
+    as in the proxy.
+    """
+    from slasher_proxy.avalanche.block_checker import check_block
+    from slasher_proxy.avalanche.block_parser import save_block
+    from slasher_proxy.avalanche.capture import Submission, read_capture
+    from slasher_proxy.avalanche.proxy_router import store_submission
+    from slasher_proxy.common.checkpoint import verify_and_checkpoint
+    from slasher_proxy.common.database import is_sqlite_dsn, start_db
+    from slasher_proxy.common.sqlite_writer import SqliteWriter, call_directly
+
+    start_db(dsn, network_name=BENCH_NETWORK)
+    writer = SqliteWriter().start() if is_sqlite_dsn(dsn) else None
+    run_write = writer.call if writer else call_directly
+    submissions: List[float] = []
+    blocks: List[float] = []
+    max_lag = 0.0
+    first: Optional[float] = None
+    started = time.perf_counter()
+    for captured in read_capture(path):
+        if first is None:
+            first = captured.timestamp
+        if speed > 0:
+            due = started + (captured.timestamp - first) / speed
+            delay = due - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            else:
+                max_lag = max(max_lag, -delay)
+        event = captured.event
+        applied = time.perf_counter()
+        if isinstance(event, Submission):
+            run_write(store_submission, *event)
+            submissions.append(time.perf_counter() - applied)
+        else:
+            run_write(save_block, event.block, event.node_id)
+            run_write(verify_and_checkpoint, check_block, event.block.number)
+            blocks.append(time.perf_counter() - applied)
+    wall_seconds = time.perf_counter() - started
+    if writer:
+        writer.stop()
+    submissions.sort()
+    blocks.sort()
+    return {
+        "submissions": len(submissions),
+        "blocks": len(blocks),
+        "wall_s": wall_seconds,
+        "max_lag_s": max_lag,
+        "submit_p50_ms": percentile(submissions, 50) * 1e3,
+        "submit_p99_ms": percentile(submissions, 99) * 1e3,
+        "block_p50_ms": percentile(blocks, 50) * 1e3,
+        "block_p99_ms": percentile(blocks, 99) * 1e3,
+    }
+
+
+def run(
+    path: str, speed: float = 1.0, dsn: Optional[str] = None
+) -> List[Dict[str, Any]]:
+    """
+    Replay ``path`` at ``speed`` times the captured pace, or as fast as
+    possible when ``speed`` is 0, into a scratch sqlite file or into ``dsn``,
+    an empty scratch database. ``max_lag_s`` is how far the replay fell behind
+    the captured pace at worst.
+    """
+    context = multiprocessing.get_context("spawn")
+    with tempfile.TemporaryDirectory() as tmp:
+        with context.Pool(1) as pool:
+            result = pool.apply(
+                _replay, (dsn or f"sqlite://{tmp}/replay.db", path, speed)
+            )
+    return [{"speed": speed or "max", **result}]
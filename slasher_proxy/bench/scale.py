@@ -0,0 +1,306 @@
+"""
+Block ingestion and verification at scale: blocks of 100 to 10,000
+transactions against a backlog of a million or more pending commitments.
+"""
+
+from typing import Any, Dict, Iterator, List, NamedTuple, Optional, Sequence, Tuple
+
+import hashlib
+import json
+import multiprocessing
+import platform
+import random
+import sqlite3
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime
+
+DEFAULT_SIZES = (100, 1000, 10000)
+DEFAULT_COMMITMENTS = 1_000_000
+DEFAULT_NODES = 4
+DEFAULT_BLOCKS_PER_SIZE = 3
+DEFAULT_SEED = 1
+BENCH_NETWORK = "bench"
+
+# Share of a block's commitment range left out and filled with transactions
+# nobody committed to, and share replaced by a transaction with a new hash.
+OMITTED_SHARE = 0.05
+REPLACED_SHARE = 0.02
+# Share of a block made of transactions its node omitted in earlier blocks.
+REORDERED_SHARE = 0.02
+# Commitments beyond the scheduled blocks are assigned to nodes in runs.
+BACKLOG_RUN = 1000
+SEED_CHUNK_SIZE = 10_000
+
+
+class PlannedBlock(NamedTuple):
+    number: int
+    node: str
+    size: int
+    traced: bool
+    # (hash, from address, nonce) in block order
+    txs: List[Tuple[bytes, str, int]]
+
+
+def _hash(kind: bytes, n: int) -> bytes:
+    return hashlib.blake2b(b"%s:%d" % (kind, n), digest_size=32).digest()
+
+
+def _sender(n: int) -> str:
+    return "0x" + _hash(b"sender", n % 997)[:20].hex()
+
+
+class Workload:
+    """
+    The seeded rows and the blocks to ingest, derived from the arguments
+    alone so every backend and every run sees the same data.
+
+    Commitment indexes are global, as check_block() tracks them: each block
+    covers the next run of indexes, all committed by the node authoring the
+    block, and nodes take turns. Of a block's range, OMITTED_SHARE is left
+    out for transactions nobody committed to and REPLACED_SHARE is replaced
+    by transactions whose Transaction.replaces points at the committed one.
+    REORDERED_SHARE more transactions are ones the same node omitted in its
+    earlier blocks. The block order is shuffled.
+    """
+
+    def __init__(
+        self,
+        sizes: Sequence[int],
+        commitments: int,
+        nodes: int,
+        blocks_per_size: int,
+        seed: int,
+    ) -> None:
+        self.nodes = [f"node-{n}" for n in range(nodes)]
+        self.blocks: List[PlannedBlock] = []
+        # (index, node) of the commitments in scheduled ranges
+        self.owners: Dict[int, str] = {}
+        # (replacement hash, replaced hash)
+        self.replacements: List[Tuple[bytes, bytes]] = []
+        rng = random.Random(seed)
+        omitted: Dict[str, List[int]] = {node: [] for node in self.nodes}
+        next_index = 1
+        extra = 0
+        for size in sizes:
+            for n in range(blocks_per_size + 1):
+                number = len(self.blocks) + 1
+                node = self.nodes[(number - 1) % nodes]
+                reorders = omitted[node][: int(size * REORDERED_SHARE)]
+                del omitted[node][: len(reorders)]
+                span = size - len(reorders)
+                indexes = list(range(next_index, next_index + span))
+                next_index += span
+                for index in indexes:
+                    self.owners[index] = node
+                rng.shuffle(indexes)
+                left_out = indexes[: int(span * OMITTED_SHARE)]
+                replaced = indexes[
+                    len(left_out) : len(left_out) + int(span * REPLACED_SHARE)
+                ]
+                kept = indexes[len(left_out) + len(replaced) :]
+                omitted[node].extend(left_out)
+                txs = [(_hash(b"tx", i), _sender(i), i) for i in kept + reorders]
+                for index in left_out:
+                    extra += 1
+                    txs.append((_hash(b"extra", extra), _sender(index), index))
+                for index in replaced:
+                    extra += 1
+                    replacement = _hash(b"extra", extra)
+                    self.replacements.append((replacement, _hash(b"tx", index)))
+                    txs.append((replacement, _sender(index), index))
+                rng.shuffle(txs)
+                self.blocks.append(
+                    PlannedBlock(number, node, size, n == blocks_per_size, txs)
+                )
+        self.commitments = max(commitments, next_index - 1)
+
+    def owner(self, index: int) -> str:
+        node = self.owners.get(index)
+        if node is None:
+            node = self.nodes[(index // BACKLOG_RUN) % len(self.nodes)]
+        return node
+
+
+def _chunks(rows: Iterator[Tuple[Any, ...]]) -> Iterator[List[Tuple[Any, ...]]]:
+    chunk: List[Tuple[Any, ...]] = []
+    for row in rows:
+        chunk.append(row)
+        if len(chunk) == SEED_CHUNK_SIZE:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def _seed(workload: Workload) -> None:
+    """
+    Insert the pending commitments and their submitted transactions with the
+    driver's executemany(), bypassing Pony: a million entities would take
+    longer to build than the benchmark takes to run.
+    """
+    from pony.orm import db_session
+
+    from slasher_proxy.common import C_STATUS_PENDING, T_STATUS_SUBMITTED, db
+
+    mark = "?" if db.provider.paramstyle == "qmark" else "%s"
+    now = str(datetime.now())
+    commitment_sql = (
+        'INSERT INTO commitment (node, tx_hash, "index", status, created_at) '
+        f"VALUES ({mark}, {mark}, {mark}, {mark}, {mark})"
+    )
+    transaction_sql = (
+        'INSERT INTO "transaction" '
+        "(hash, status, created_at, from_address, nonce, replaces) "
+        f"VALUES ({mark}, {mark}, {mark}, {mark}, {mark}, {mark})"
+    )
+    indexes = range(1, workload.commitments + 1)
+    with db_session:
+        cursor = db.get_connection().cursor()
+        for chunk in _chunks(
+            (workload.owner(i), _hash(b"tx", i), i, C_STATUS_PENDING, now)
+            for i in indexes
+        ):
+            cursor.executemany(commitment_sql, chunk)
+        for chunk in _chunks(
+            (_hash(b"tx", i), T_STATUS_SUBMITTED, now, _sender(i), i, None)
+            for i in indexes
+        ):
+            cursor.executemany(transaction_sql, chunk)
+        cursor.executemany(
+            transaction_sql,
+            [
+                (replacement, T_STATUS_SUBMITTED, now, "0xreplacer", n, replaced)
+                for n, (replacement, replaced) in enumerate(workload.replacements)
+            ],
+        )
+        db.get_connection().commit()
+
+
+def _query_count() -> int:
+    from slasher_proxy.common import db
+
+    total = db.local_stats.get(None)
+    return total.db_count if total else 0
+
+
+def _run_backend(dsn: str, workload: Workload) -> List[Dict[str, Any]]:
+    """
+    Runs in a fresh process, since the Pony database can be bound only once.
+    Returns one row per block size with the mean time and query count of
+    save_block() and check_block(), from the untraced blocks, and the peak
+    traced memory of both on the traced one.
+    """
+    from pony.orm import db_session
+
+    from slasher_proxy.avalanche.block_checker import check_block
+    from slasher_proxy.avalanche.block_parser import save_block
+    from slasher_proxy.avalanche.block_stream import CompactBlock, CompactTransaction
+    from slasher_proxy.common.database import start_db
+    from slasher_proxy.common.model import Commitment
+    from slasher_proxy.common.tx_cache import KNOWN_TXS
+
+    start_db(dsn, network_name=BENCH_NETWORK)
+    with db_session:
+        if Commitment.select().exists():
+            raise ValueError("The benchmark needs an empty database")
+    started = time.perf_counter()
+    _seed(workload)
+    seed_seconds = time.perf_counter() - started
+    # The proxy has seen every seeded submission.
+    KNOWN_TXS.resize(workload.commitments + len(workload.replacements))
+    KNOWN_TXS.add_many(_hash(b"tx", i) for i in range(1, workload.commitments + 1))
+    KNOWN_TXS.add_many(replacement for replacement, _ in workload.replacements)
+
+    by_size: Dict[int, Dict[str, Any]] = {}
+    for planned in workload.blocks:
+        block = CompactBlock(
+            _hash(b"block", planned.number),
+            planned.number,
+            [
+                CompactTransaction(order, tx_hash, sender, nonce)
+                for order, (tx_hash, sender, nonce) in enumerate(planned.txs)
+            ],
+        )
+        row = by_size.setdefault(
+            planned.size,
+            {"blocks": 0, "save_s": 0.0, "check_s": 0.0, "save_q": 0, "check_q": 0},
+        )
+        if planned.traced:
+            tracemalloc.start()
+            try:
+                save_block(block, planned.node)
+                check_block(planned.number)
+                row["peak_kib"] = tracemalloc.get_traced_memory()[1] / 1024
+            finally:
+                tracemalloc.stop()
+            continue
+        queries = _query_count()
+        started = time.perf_counter()
+        save_block(block, planned.node)
+        saved = time.perf_counter()
+        save_queries = _query_count()
+        check_block(planned.number)
+        row["check_s"] += time.perf_counter() - saved
+        row["save_s"] += saved - started
+        row["check_q"] += _query_count() - save_queries
+        row["save_q"] += save_queries - queries
+        row["blocks"] += 1
+
+    return [
+        {
+            "txs_per_block": size,
+            "save_ms": row["save_s"] / row["blocks"] * 1e3,
+            "check_ms": row["check_s"] / row["blocks"] * 1e3,
+            "save_queries": row["save_q"] / row["blocks"],
+            "check_queries": row["check_q"] / row["blocks"],
+            "peak_kib": row["peak_kib"],
+            "seed_s": seed_seconds,
+        }
+        for size, row in by_size.items()
+    ]
+
+
+def run(
+    sizes: Sequence[int] = DEFAULT_SIZES,
+    commitments: int = DEFAULT_COMMITMENTS,
+    nodes: int = DEFAULT_NODES,
+    blocks_per_size: int = DEFAULT_BLOCKS_PER_SIZE,
+    postgres_dsn: Optional[str] = None,
+    output: Optional[str] = None,
+    seed: int = DEFAULT_SEED,
+) -> List[Dict[str, Any]]:
+    """
+    The workload on a scratch sqlite file and, when given, on ``postgres_dsn``,
+    which must be an empty scratch database. With ``output``, the rows are
+    also written there as JSON together with the parameters and platform.
+    """
+    workload = Workload(sizes, commitments, nodes, blocks_per_size, seed)
+    context = multiprocessing.get_context("spawn")
+    rows: List[Dict[str, Any]] = []
+    with tempfile.TemporaryDirectory() as tmp:
+        cases = [("sqlite", f"sqlite://{tmp}/scale.db")]
+        if postgres_dsn:
+            cases.append(("postgres", postgres_dsn))
+        for backend, dsn in cases:
+            with context.Pool(1) as pool:
+                results = pool.apply(_run_backend, (dsn, workload))
+            rows.extend({"backend": backend, **result} for result in results)
+    if output:
+        metadata = {
+            "benchmark": "scale",
+            "finished_at": datetime.now().isoformat(),
+            "python": sys.version.split()[0],
+            "platform": platform.platform(),
+            "sqlite": sqlite3.sqlite_version,
+            "sizes": list(sizes),
+            "commitments": workload.commitments,
+            "nodes": nodes,
+            "blocks_per_size": blocks_per_size,
+            "seed": seed,
+        }
+        with open(output, "w") as f:
+            json.dump({"metadata": metadata, "results": rows}, f, indent=2)
+    return rows
@@ -0,0 +1,105 @@
+"""Submission and block throughput of the embedded sqlite backend vs. Postgres."""
+
+from typing import Any, Callable, Dict, List, Optional
+
+import multiprocessing
+import os
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+DEFAULT_BLOCKS = 20
+DEFAULT_TXS_PER_BLOCK = 100
+DEFAULT_CONCURRENCY = 8
+BENCH_NODE_ID = "bench"
+BENCH_NETWORK = "bench"
+
+
+def _run_workload(
+    dsn: str, batched: bool, blocks: int, txs_per_block: int, concurrency: int
+) -> Dict[str, Any]:
+    """
+    Runs in a fresh process, since the Pony database can be bound only once:
+    ``concurrency`` threads record blocks * txs_per_block submissions the way
+    the proxy does, then the blocks including them are saved and verified.
+    """
+    from pony.orm import db_session
+
+    from slasher_proxy.avalanche.block_checker import check_block
+    from slasher_proxy.avalanche.block_parser import save_block
+    from slasher_proxy.avalanche.block_stream import CompactBlock, CompactTransaction
+    from slasher_proxy.avalanche.proxy_router import store_submission
+    from slasher_proxy.common import db
+    from slasher_proxy.common.database import start_db
+    from slasher_proxy.common.sqlite_writer import SqliteWriter
+
+    start_db(dsn, network_name=BENCH_NETWORK)
+    with db_session:
+        first_height = (db.select("SELECT MAX(number) FROM block")[0] or 0) + 1
+    node_id = f"{BENCH_NODE_ID}-{os.getpid()}"
+    total = blocks * txs_per_block
+    hashes = [os.urandom(32) for _ in range(total)]
+    writer = SqliteWriter().start() if batched else None
+
+    def run(func: Callable[..., Any], *args: Any) -> Any:
+        return writer.call(func, *args) if writer else func(*args)
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(concurrency) as pool:
+        list(
+            pool.map(
+                lambda i: run(store_submission, node_id, hashes[i], i, b"\x00" * 32),
+                range(total),
+            )
+        )
+    submit_seconds = time.perf_counter() - started
+
+    started = time.perf_counter()
+    for n in range(blocks):
+        height = first_height + n
+        txs = [
+            CompactTransaction(order, tx_hash, "0x" + tx_hash[:20].hex(), 0)
+            for order, tx_hash in enumerate(
+                hashes[n * txs_per_block : (n + 1) * txs_per_block]
+            )
+        ]
+        block = CompactBlock(os.urandom(32), height, txs)
+        run(save_block, block, node_id)
+        run(check_block, height)
+    block_seconds = time.perf_counter() - started
+    if writer:
+        writer.stop()
+    return {
+        "submissions_per_s": total / submit_seconds,
+        "blocks_per_s": blocks / block_seconds,
+        "mean_commit_batch": writer.stats()["mean_batch"] if writer else 1.0,
+    }
+
+
+def run(
+    blocks: int = DEFAULT_BLOCKS,
+    txs_per_block: int = DEFAULT_TXS_PER_BLOCK,
+    concurrency: int = DEFAULT_CONCURRENCY,
+    postgres_dsn: Optional[str] = None,
+) -> List[Dict[str, Any]]:
+    """
+    The same workload on a scratch sqlite file, with and without the writer
+    thread, and on ``postgres_dsn`` when given. The Postgres run adds rows to
+    that database, so point it at a scratch one.
+    """
+    context = multiprocessing.get_context("spawn")
+    rows = []
+    with tempfile.TemporaryDirectory() as tmp:
+        cases = [
+            ("sqlite", "writer thread", f"sqlite://{tmp}/batched.db", True),
+            ("sqlite", "commit per write", f"sqlite://{tmp}/direct.db", False),
+        ]
+        if postgres_dsn:
+            cases.append(("postgres", "commit per write", postgres_dsn, False))
+        for backend, mode, dsn, batched in cases:
+            with context.Pool(1) as pool:
+                result = pool.apply(
+                    _run_workload, (dsn, batched, blocks, txs_per_block, concurrency)
+                )
+            rows.append({"backend": backend, "mode": mode, **result})
+    return rows
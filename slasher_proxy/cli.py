@@ -1,12 +1,27 @@
-from typing import Any
+from typing import Any, Optional
+
+import os
+from importlib.util import find_spec
 
 import click
 import uvicorn
+from pydantic import ValidationError
 
 from slasher_proxy.asgi import create_slasher_app
-from slasher_proxy.common import db
+from slasher_proxy.bench import accumulator as accumulator_bench
+from slasher_proxy.bench import format_table
+from slasher_proxy.bench import load as load_bench
+from slasher_proxy.bench import log as log_bench
+from slasher_proxy.bench import mock_node
+from slasher_proxy.bench import parser as parser_bench
+from slasher_proxy.bench import replay as replay_bench
+from slasher_proxy.bench import scale as scale_bench
+from slasher_proxy.bench import storage as storage_bench
+from slasher_proxy.common.database import start_db
 from slasher_proxy.common.log import LOGGER
-from slasher_proxy.common.settings import get_settings
+from slasher_proxy.common.retention import run_retention
+from slasher_proxy.common.settings import ENV_FILE_VARIABLE, get_settings
+from slasher_proxy.common.upgrade import CURRENT_DB_VERSION
 
 
 @click.group()
@@ -20,7 +35,14 @@ from slasher_proxy.common.settings import get_settings
 @click.pass_context
 def cli(ctx: Any, env_file: str) -> None:
     ctx.ensure_object(dict)
-    settings = get_settings(env_file)
+    ctx.obj["env_file"] = env_file
+    try:
+        settings = get_settings(env_file)
+    except ValidationError:
+        # Commands such as the benchmarks work without a configured proxy;
+        # the ones that need settings will fail on their own get_settings().
+        get_settings.cache_clear()
+        return
     level = settings.log_level or 20
     if isinstance(level, str):
         try:
@@ -36,13 +58,295 @@ def cli(ctx: Any, env_file: str) -> None:
 def avalanche(ctx: Any) -> None:
     settings = get_settings()
     LOGGER.info("Starting Avalanche RPC Proxy...")
-    app = create_slasher_app()
-    uvicorn.run(app, host=settings.host, port=settings.port)
+    # uvicorn picks uvloop and httptools by itself when they are installed.
+    loop, http = "auto", "auto"
+    if settings.fast_loop:
+        missing = [m for m in ("uvloop", "httptools") if not find_spec(m)]
+        if missing:
+            raise click.ClickException(f"FAST_LOOP needs {', '.join(missing)}")
+        loop, http = "uvloop", "httptools"
+    if settings.workers == 1:
+        app = create_slasher_app()
+        uvicorn.run(app, host=settings.host, port=settings.port, loop=loop, http=http)
+        return
+    # Migrate once here, rather than in every worker at the same time.
+    start_db(settings.dsn, network_name=settings.network_name)
+    # Workers are separate processes that build the app themselves.
+    if ctx.obj["env_file"]:
+        os.environ[ENV_FILE_VARIABLE] = ctx.obj["env_file"]
+    uvicorn.run(
+        "slasher_proxy.asgi:create_worker_app",
+        factory=True,
+        workers=settings.workers,
+        host=settings.host,
+        port=settings.port,
+        loop=loop,
+        http=http,
+    )
 
 
 @cli.command()
 @click.pass_context
 def upgrade(ctx: Any) -> None:
-    db.bind(provider="postgres", **dict(ctx.obj.settings.postgres_connection))
-    # upgrade_from_v1(db)
-    # upgrade_from_v2(db)
+    """Migrate the database schema to the version this proxy expects."""
+    settings = get_settings()
+    # start_db() runs the pending migrations before it returns.
+    start_db(settings.dsn, network_name=settings.network_name)
+    LOGGER.info("Database schema is at version %s", CURRENT_DB_VERSION)
+
+
+@cli.command()
+@click.option(
+    "--keep-blocks",
+    type=int,
+    default=None,
+    help="Blocks to keep unarchived [default: RETENTION_BLOCKS]",
+)
+@click.option("--batch-size", type=int, default=None, help="Rows per transaction")
+@click.pass_context
+def retention(ctx: Any, keep_blocks: Optional[int], batch_size: Optional[int]) -> None:
+    """Archive resolved commitments and prune old block-transaction links."""
+    settings = get_settings()
+    keep_blocks = keep_blocks or settings.retention_blocks
+    if not keep_blocks:
+        raise click.UsageError("Set --keep-blocks or RETENTION_BLOCKS")
+    start_db(settings.dsn, network_name=settings.network_name)
+    result = run_retention(keep_blocks, batch_size or settings.retention_batch_size)
+    click.echo(f"Archived {result['archived']}, pruned {result['pruned']}")
+
+
+@cli.group()
+def bench() -> None:
+    """Benchmarks that run locally, without a node or Postgres."""
+
+
+@bench.command("parser")
+@click.option(
+    "--txs",
+    "tx_counts",
+    multiple=True,
+    type=int,
+    default=parser_bench.DEFAULT_TX_COUNTS,
+    show_default=True,
+    help="Transactions per synthetic block (repeatable)",
+)
+@click.option("--repeat", default=5, show_default=True, help="Runs per case")
+def bench_parser(tx_counts: Any, repeat: int) -> None:
+    """Streaming block extraction vs. json.loads: time and peak memory."""
+    click.echo(format_table(parser_bench.run(tx_counts, repeat)))
+
+
+@bench.command("accumulator")
+@click.option(
+    "--rolling-size",
+    "rolling_sizes",
+    multiple=True,
+    type=int,
+    default=accumulator_bench.DEFAULT_ROLLING_SIZES,
+    show_default=True,
+    help="Transactions in the rolling accumulator (repeatable)",
+)
+@click.option(
+    "--sketch-size",
+    "sketch_sizes",
+    multiple=True,
+    type=int,
+    default=accumulator_bench.DEFAULT_SKETCH_SIZES,
+    show_default=True,
+    help="Counters in the counting Bloom filter (repeatable)",
+)
+@click.option("--repeat", default=5, show_default=True, help="Runs per case")
+def bench_accumulator(rolling_sizes: Any, sketch_sizes: Any, repeat: int) -> None:
+    """Accumulator and sketch operations: ops/s and peak allocation."""
+    click.echo(format_table(accumulator_bench.run(rolling_sizes, sketch_sizes, repeat)))
+    if not accumulator_bench.HAVE_NUMPY:
+        click.echo("numpy is not installed: its variants were skipped")
+
+
+@bench.command("storage")
+@click.option("--blocks", default=storage_bench.DEFAULT_BLOCKS, show_default=True)
+@click.option(
+    "--txs-per-block", default=storage_bench.DEFAULT_TXS_PER_BLOCK, show_default=True
+)
+@click.option(
+    "--concurrency",
+    default=storage_bench.DEFAULT_CONCURRENCY,
+    show_default=True,
+    help="Threads recording submissions",
+)
+@click.option(
+    "--postgres-dsn",
+    default=None,
+    help="Scratch Postgres database to run the same workload on",
+)
+def bench_storage(
+    blocks: int, txs_per_block: int, concurrency: int, postgres_dsn: Optional[str]
+) -> None:
+    """Submission and block throughput: embedded sqlite vs. Postgres."""
+    click.echo(
+        format_table(
+            storage_bench.run(blocks, txs_per_block, concurrency, postgres_dsn)
+        )
+    )
+
+
+@bench.command("logging")
+@click.option("--records", default=log_bench.DEFAULT_RECORDS, show_default=True)
+@click.option("--blocks", default=storage_bench.DEFAULT_BLOCKS, show_default=True)
+@click.option(
+    "--txs-per-block", default=storage_bench.DEFAULT_TXS_PER_BLOCK, show_default=True
+)
+@click.option(
+    "--sink", type=click.Choice(log_bench.SINKS), default="file", show_default=True
+)
+def bench_logging(records: int, blocks: int, txs_per_block: int, sink: str) -> None:
+    """Throughput with logging at INFO vs. disabled, direct vs. queued."""
+    click.echo(format_table(log_bench.run(records, blocks, txs_per_block, sink)))
+
+
+@bench.command("scale")
+@click.option(
+    "--txs",
+    "sizes",
+    multiple=True,
+    type=int,
+    default=scale_bench.DEFAULT_SIZES,
+    show_default=True,
+    help="Transactions per synthetic block (repeatable)",
+)
+@click.option(
+    "--commitments",
+    default=scale_bench.DEFAULT_COMMITMENTS,
+    show_default=True,
+    help="Pending commitments seeded before the first block",
+)
+@click.option("--nodes", default=scale_bench.DEFAULT_NODES, show_default=True)
+@click.option(
+    "--blocks-per-size",
+    type=click.IntRange(min=1),
+    default=scale_bench.DEFAULT_BLOCKS_PER_SIZE,
+    show_default=True,
+)
+@click.option(
+    "--postgres-dsn",
+    default=None,
+    help="Empty scratch Postgres database to run the same workload on",
+)
+@click.option(
+    "--output",
+    type=click.Path(dir_okay=False),
+    default=None,
+    help="Also write the results and run parameters to this JSON file",
+)
+def bench_scale(
+    sizes: Any,
+    commitments: int,
+    nodes: int,
+    blocks_per_size: int,
+    postgres_dsn: Optional[str],
+    output: Optional[str],
+) -> None:
+    """Block save and verification against a large pending backlog."""
+    rows = scale_bench.run(
+        sizes, commitments, nodes, blocks_per_size, postgres_dsn, output
+    )
+    click.echo(format_table(rows))
+
+
+@bench.command("replay")
+@click.argument("capture", type=click.Path(exists=True, dir_okay=False))
+@click.option(
+    "--speed",
+    default=1.0,
+    show_default=True,
+    help="Multiple of the captured pace; 0 replays as fast as possible",
+)
+@click.option(
+    "--dsn",
+    default=None,
+    help="Empty scratch database to replay into instead of a sqlite file",
+)
+def bench_replay(capture: str, speed: float, dsn: Optional[str]) -> None:
+    """Replay a CAPTURE_PATH log through submission storage and verification."""
+    click.echo(format_table(replay_bench.run(capture, speed, dsn)))
+
+
+@bench.command("mock-node")
+@click.option("--host", default="127.0.0.1", show_default=True)
+@click.option("--port", default=9650, show_default=True)
+@click.option(
+    "--block-interval",
+    default=mock_node.DEFAULT_BLOCK_INTERVAL,
+    show_default=True,
+    help="Seconds between blocks",
+)
+@click.option(
+    "--max-block-txs", default=mock_node.DEFAULT_MAX_BLOCK_TXS, show_default=True
+)
+@click.option(
+    "--omit-rate",
+    default=0.0,
+    show_default=True,
+    help="Share of transactions never included in a block",
+)
+@click.option(
+    "--reorder-rate",
+    default=0.0,
+    show_default=True,
+    help="Share of transactions held back for a later block",
+)
+@click.option("--seed", type=int, default=None)
+def bench_mock_node(
+    host: str,
+    port: int,
+    block_interval: float,
+    max_block_txs: int,
+    omit_rate: float,
+    reorder_rate: float,
+    seed: Optional[int],
+) -> None:
+    """Serve a mock validator for the proxy to submit to and ingest from."""
+    mock_node.serve(
+        host,
+        port,
+        mock_node.MockValidator(
+            block_interval=block_interval,
+            max_block_txs=max_block_txs,
+            omit_rate=omit_rate,
+            reorder_rate=reorder_rate,
+            seed=seed,
+        ),
+    )
+
+
+@bench.command("load")
+@click.option("--proxy-url", default="http://127.0.0.1:5500", show_default=True)
+@click.option("--count", default=load_bench.DEFAULT_COUNT, show_default=True)
+@click.option(
+    "--rate",
+    default=load_bench.DEFAULT_RATE,
+    show_default=True,
+    help="Transactions started per second",
+)
+@click.option(
+    "--concurrency",
+    default=load_bench.DEFAULT_CONCURRENCY,
+    show_default=True,
+    help="Requests in flight at most",
+)
+@click.option("--private-key", envvar="PRIVATE_KEY", default=None)
+@click.option("--chain-id", default=load_bench.DEFAULT_CHAIN_ID, show_default=True)
+def bench_load(
+    proxy_url: str,
+    count: int,
+    rate: float,
+    concurrency: int,
+    private_key: Optional[str],
+    chain_id: int,
+) -> None:
+    """Submission latency and throughput of a running proxy."""
+    click.echo(
+        format_table(
+            load_bench.run(proxy_url, count, rate, concurrency, private_key, chain_id)
+        )
+    )
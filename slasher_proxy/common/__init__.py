@@ -3,6 +3,8 @@ from pony import orm
 T_STATUS_SUBMITTED = 0
 T_STATUS_IN_BLOCK = 1
 T_STATUS_ERROR = 2
+# Submitted but not in a block by its deadline (see common.deadlines).
+T_STATUS_EXPIRED = 3
 
 C_STATUS_PENDING = 0
 C_STATUS_OMITTED = 1
@@ -11,5 +13,8 @@ C_STATUS_FULFILLED = 2
 C_STATUS_REVOKED = 3
 C_STATUS_UNEXPECTED = 4
 
+# Sender recorded for submitted transactions until they are seen in a block.
+UNKNOWN_SENDER = "unknown"
+
 # PonyORM set up
 db = orm.Database()
@@ -0,0 +1,157 @@
+from types import TracebackType
+from typing import Any, AsyncIterator, Dict, List, Optional, Type
+
+import time
+from contextlib import asynccontextmanager
+
+import asyncpg
+from asyncpg.prepared_stmt import PreparedStatement
+
+from slasher_proxy.common.log import LOGGER
+from slasher_proxy.common.metrics import DB_COMMIT_SECONDS
+
+DEFAULT_POOL_MIN_SIZE: int = 2
+DEFAULT_POOL_MAX_SIZE: int = 10
+DEFAULT_STATEMENT_CACHE_SIZE: int = 100
+
+_COMMIT_SECONDS = DB_COMMIT_SECONDS.labels("asyncpg")
+
+
+class PreparingConnection(asyncpg.Connection):
+    """
+    A connection that keeps the statements of the hot-path queries prepared.
+
+    asyncpg already caches statements it prepares implicitly; the explicit
+    per-connection map is there so hits and misses can be counted.
+    """
+
+    def __init__(self, *args: Any, **kwargs: Any) -> None:
+        super().__init__(*args, **kwargs)
+        self.prepared_statements: Dict[str, PreparedStatement] = {}
+
+
+# What pool.acquire() hands out: a proxy to a PreparingConnection.
+Connection = Any
+
+
+class AsyncDatabase:
+    """
+    asyncpg connection pool for the hot paths: recording submissions, bulk
+    block ingestion and block verification (see avalanche.async_ops).
+
+    Pony keeps owning the schema, which it creates in start_db(), so the SQL
+    here targets the tables and columns Pony generates for common.model.
+    """
+
+    def __init__(
+        self,
+        dsn: str,
+        min_size: int = DEFAULT_POOL_MIN_SIZE,
+        max_size: int = DEFAULT_POOL_MAX_SIZE,
+        statement_cache_size: int = DEFAULT_STATEMENT_CACHE_SIZE,
+    ) -> None:
+        self.dsn = dsn
+        self.min_size = min_size
+        self.max_size = max(max_size, min_size)
+        self.statement_cache_size = statement_cache_size
+        self.pool: Optional[asyncpg.Pool] = None
+        self.statement_hits = 0
+        self.statement_misses = 0
+
+    async def start(self) -> "AsyncDatabase":
+        self.pool = await asyncpg.create_pool(
+            self.dsn,
+            min_size=self.min_size,
+            max_size=self.max_size,
+            statement_cache_size=self.statement_cache_size,
+            connection_class=PreparingConnection,
+        )
+        LOGGER.info(
+            "Async database pool started (%s..%s connections)",
+            self.min_size,
+            self.max_size,
+        )
+        return self
+
+    async def close(self) -> None:
+        if self.pool is not None:
+            await self.pool.close()
+            self.pool = None
+
+    async def __aenter__(self) -> "AsyncDatabase":
+        return await self.start()
+
+    async def __aexit__(
+        self,
+        exc_type: Optional[Type[BaseException]],
+        exc: Optional[BaseException],
+        tb: Optional[TracebackType],
+    ) -> None:
+        await self.close()
+
+    @asynccontextmanager
+    async def transaction(self) -> AsyncIterator[Connection]:
+        """A pooled connection inside a transaction, committed on success."""
+        if self.pool is None:
+            raise RuntimeError("The async database pool is not started")
+        async with self.pool.acquire() as conn:
+            transaction = conn.transaction()
+            await transaction.start()
+            try:
+                yield conn
+            except BaseException:
+                await transaction.rollback()
+                raise
+            started = time.perf_counter()
+            await transaction.commit()
+            _COMMIT_SECONDS.observe(time.perf_counter() - started)
+
+    async def prepare(self, conn: Connection, query: str) -> PreparedStatement:
+        prepared = conn.prepared_statements
+        statement = prepared.get(query)
+        if statement is None:
+            self.statement_misses += 1
+            if len(prepared) >= self.statement_cache_size:
+                prepared.pop(next(iter(prepared)))
+            statement = prepared[query] = await conn.prepare(query)
+        else:
+            self.statement_hits += 1
+        return statement
+
+    async def fetch(self, conn: Connection, query: str, *args: Any) -> List[Any]:
+        if not self.statement_cache_size:
+            # Caching disabled, e.g. behind a transaction-pooling pgbouncer.
+            return list(await conn.fetch(query, *args))
+        return list(await (await self.prepare(conn, query)).fetch(*args))
+
+    async def fetchrow(self, conn: Connection, query: str, *args: Any) -> Any:
+        rows = await self.fetch(conn, query, *args)
+        return rows[0] if rows else None
+
+    async def execute(self, conn: Connection, query: str, *args: Any) -> None:
+        await self.fetch(conn, query, *args)
+
+    def stats(self) -> Dict[str, int]:
+        pool = self.pool
+        return {
+            "pool_min_size": self.min_size,
+            "pool_max_size": self.max_size,
+            "pool_size": pool.get_size() if pool is not None else 0,
+            "pool_idle": pool.get_idle_size() if pool is not None else 0,
+            "statement_cache_size": self.statement_cache_size,
+            "statement_hits": self.statement_hits,
+            "statement_misses": self.statement_misses,
+        }
+
+
+# Set by the app lifespan when async_db_enabled is on.
+async_db_instance: Optional[AsyncDatabase] = None
+
+
+def get_async_db() -> Optional[AsyncDatabase]:
+    return async_db_instance
+
+
+def set_async_db(new_db: Optional[AsyncDatabase]) -> None:
+    global async_db_instance
+    async_db_instance = new_db
@@ -0,0 +1,31 @@
+import random
+
+
+class Backoff:
+    """
+    Exponential backoff with full jitter: the n-th delay is drawn uniformly
+    from [0, min(cap, base * factor**n)], so reconnecting clients spread out
+    instead of retrying in lockstep.
+    """
+
+    def __init__(self, base: float = 0.5, cap: float = 60.0, factor: float = 2.0):
+        self.base = base
+        self.cap = cap
+        self.factor = factor
+        self.attempt = 0
+        self._capped = False
+
+    def next_delay(self) -> float:
+        # Once the cap is reached the power is no longer computed, so a long
+        # outage cannot overflow it.
+        if self._capped:
+            ceiling = self.cap
+        else:
+            ceiling = min(self.cap, self.base * self.factor**self.attempt)
+            self._capped = ceiling >= self.cap
+        self.attempt += 1
+        return random.uniform(0, ceiling)
+
+    def reset(self) -> None:
+        self.attempt = 0
+        self._capped = False
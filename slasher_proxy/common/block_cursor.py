@@ -0,0 +1,173 @@
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+from pony.orm import db_session
+
+from slasher_proxy.common.backoff import Backoff
+from slasher_proxy.common.checkpoint import (
+    get_last_processed_block,
+    verify_and_checkpoint,
+)
+from slasher_proxy.common.log import LOGGER
+from slasher_proxy.common.model import Block
+from slasher_proxy.common.pipeline import StageMetrics
+from slasher_proxy.common.sqlite_writer import call_directly
+
+DEFAULT_POLL_BATCH_SIZE: int = 100
+DEFAULT_MIN_POLL_INTERVAL: float = 0.2
+DEFAULT_MAX_POLL_INTERVAL: float = 5.0
+
+
+@db_session
+def blocks_after(height: Optional[int], limit: int) -> List[Tuple[int, datetime]]:
+    """Numbers and insert times of up to ``limit`` blocks above ``height``."""
+    if height is None:
+        query = Block.select()
+    else:
+        query = Block.select(lambda b: b.number > height)
+    return [(b.number, b.created_at) for b in query.order_by(Block.number)[:limit]]
+
+
+class BlockCursor:
+    """
+    Verifies blocks by polling the ``Block`` table past a high-water mark.
+
+    Unlike LISTEN/NOTIFY this needs no trigger and loses nothing while the
+    proxy is down: the mark is the checkpointed last processed block, and each
+    poll reads up to ``batch_size`` blocks above it, so catching up costs one
+    query per batch rather than one event per block. A full batch is followed
+    by another poll right away; otherwise the interval doubles from
+    ``min_interval`` up to ``max_interval`` while no blocks arrive.
+
+    Blocks are verified strictly one after another. When the next expected
+    height is missing but higher ones exist, the cursor waits for it, as
+    skipping it would lose its verification for good. With ``gap_timeout``
+    it is skipped with a warning after that many seconds instead.
+
+    Each block is verified and checkpointed by ``run_write``, by default a
+    direct call; on sqlite it is the writer thread's ``call``.
+    """
+
+    def __init__(
+        self,
+        verify_func: Callable[[int], Any],
+        batch_size: int = DEFAULT_POLL_BATCH_SIZE,
+        min_interval: float = DEFAULT_MIN_POLL_INTERVAL,
+        max_interval: float = DEFAULT_MAX_POLL_INTERVAL,
+        gap_timeout: Optional[float] = None,
+        backoff: Optional[Backoff] = None,
+        run_write: Optional[Callable[..., Any]] = None,
+    ) -> None:
+        self.verify_func = verify_func
+        self.run_write = run_write or call_directly
+        self.batch_size = max(batch_size, 1)
+        self.min_interval = min_interval
+        self.max_interval = max(max_interval, min_interval)
+        self.gap_timeout = gap_timeout
+        self.backoff = backoff or Backoff()
+        self.executor = ThreadPoolExecutor(1, thread_name_prefix="block-cursor")
+        self.last_processed: Optional[int] = None
+        # Highest block seen in the table so far.
+        self.head_height: Optional[int] = None
+        self.interval = min_interval
+        self.polls = 0
+        self.skipped = 0
+        self.metrics = StageMetrics()
+        self._gap_since: Optional[float] = None
+
+    def poll(self) -> int:
+        """Verify the blocks found above the mark. Returns how many were read."""
+        self.polls += 1
+        rows = self.fetch_blocks()
+        if rows and (self.head_height is None or rows[-1][0] > self.head_height):
+            self.head_height = rows[-1][0]
+        for number, created_at in rows:
+            if self.last_processed is not None and number > self.last_processed + 1:
+                if not self._gap_expired(number):
+                    break
+            self._gap_since = None
+            started = time.monotonic()
+            if not self.verify(number):
+                break
+            self.last_processed = number
+            lag = (datetime.now() - created_at).total_seconds()
+            self.metrics.observe(max(lag, 0.0), time.monotonic() - started)
+        return len(rows)
+
+    def fetch_blocks(self) -> List[Tuple[int, datetime]]:
+        rows: List[Tuple[int, datetime]] = blocks_after(
+            self.last_processed, self.batch_size
+        )
+        return rows
+
+    def verify(self, number: int) -> bool:
+        """Verify and checkpoint a block; False stops the poll before it."""
+        self.run_write(verify_and_checkpoint, self.verify_func, number)
+        return True
+
+    def _gap_expired(self, number: int) -> bool:
+        assert self.last_processed is not None
+        now = time.monotonic()
+        if self._gap_since is None:
+            self._gap_since = now
+            LOGGER.warning("Waiting for missing block %s", self.last_processed + 1)
+        if self.gap_timeout is None or now - self._gap_since < self.gap_timeout:
+            return False
+        missing = number - self.last_processed - 1
+        LOGGER.warning(
+            "Skipping %s missing block(s) after %s", missing, self.last_processed
+        )
+        self.skipped += missing
+        return True
+
+    def next_interval(self, found: int) -> float:
+        if found >= self.batch_size and self._gap_since is None:
+            self.interval = self.min_interval
+            return 0.0
+        if found:
+            self.interval = self.min_interval
+        else:
+            self.interval = min(self.interval * 2, self.max_interval)
+        return self.interval
+
+    async def run(self) -> None:
+        loop = asyncio.get_running_loop()
+        self.last_processed = await loop.run_in_executor(
+            self.executor, get_last_processed_block
+        )
+        LOGGER.info("Polling for blocks after %s", self.last_processed)
+        while True:
+            try:
+                found = await loop.run_in_executor(self.executor, self.poll)
+            except Exception as e:
+                self.metrics.errors += 1
+                delay = self.backoff.next_delay()
+                LOGGER.error(f"Polling for blocks failed: {e}")
+                LOGGER.info("Retrying in %.1f seconds...", delay)
+                await asyncio.sleep(delay)
+                continue
+            self.backoff.reset()
+            await self.wait(self.next_interval(found))
+
+    async def wait(self, delay: float) -> None:
+        await asyncio.sleep(delay)
+
+    def snapshot(self) -> Dict[str, float]:
+        return {
+            "last_processed": (
+                self.last_processed if self.last_processed is not None else -1
+            ),
+            "polls": self.polls,
+            "interval": self.interval,
+            "skipped": self.skipped,
+            "processed": self.metrics.processed,
+            "errors": self.metrics.errors,
+            "throughput": self.metrics.throughput,
+            "busy_seconds": self.metrics.busy_seconds,
+            "last_lag": self.metrics.last_lag,
+            "max_lag": self.metrics.max_lag,
+        }
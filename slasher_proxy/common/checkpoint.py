@@ -0,0 +1,35 @@
+from typing import Any, Callable, Optional
+
+from pony.orm import db_session
+
+from slasher_proxy.common.model import AuxiliaryData
+
+LAST_PROCESSED_BLOCK_KEY = "lastProcessedBlock"
+
+
+@db_session
+def get_last_processed_block() -> Optional[int]:
+    """Height of the last block that was both persisted and verified."""
+    entry = AuxiliaryData.get(key=LAST_PROCESSED_BLOCK_KEY)
+    if entry is None or entry.value is None:
+        return None
+    return int(entry.value)
+
+
+@db_session
+def set_last_processed_block(height: int) -> None:
+    entry = AuxiliaryData.get(key=LAST_PROCESSED_BLOCK_KEY)
+    if entry is None:
+        AuxiliaryData(key=LAST_PROCESSED_BLOCK_KEY, value=str(height))
+    elif int(entry.value or 0) < height:
+        entry.value = str(height)
+
+
+def verify_and_checkpoint(verify_func: Callable[[int], Any], height: int) -> None:
+    """
+    Verify block ``height`` and make it the last processed block in one
+    transaction, so a block is never verified twice or skipped on resume.
+    """
+    with db_session:
+        verify_func(height)
+        set_last_processed_block(height)
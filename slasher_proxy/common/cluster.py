@@ -0,0 +1,243 @@
+"""
+Cluster mode: proxy replicas behind a load balancer sharing one Postgres.
+
+Replicas find each other through session-level advisory locks, which the
+server drops with a replica's session. The oldest live one verifies the
+stored blocks, and the next oldest takes over when it leaves. Messages on
+one NOTIFY channel tell the other replicas about stored transactions and
+membership changes.
+"""
+
+from typing import Any, Callable, List, Optional, Tuple
+
+import asyncio
+import random
+from datetime import datetime
+
+import asyncpg
+from pony.orm import TransactionIntegrityError
+
+from slasher_proxy.common.block_cursor import BlockCursor
+from slasher_proxy.common.checkpoint import get_last_processed_block
+from slasher_proxy.common.leader import advisory_lock_key
+from slasher_proxy.common.log import LOGGER
+from slasher_proxy.common.postgres_notify import create_notification_listener
+from slasher_proxy.common.tx_cache import KNOWN_TXS, KnownTxCache
+
+DEFAULT_CLUSTER_CHANNEL = "slasher_cluster"
+DEFAULT_MEMBERSHIP_INTERVAL: float = 5.0
+# NOTIFY payloads: "tx:<hash hex>" for a transaction stored by a replica.
+KNOWN_TX_PREFIX = "tx:"
+MEMBERS_CHANGED = "members"
+
+# Advisory locks keyed by (namespace, member id), held by the live members,
+# oldest session first. The replicas share a role, so each sees the others'
+# backend_start.
+SELECT_MEMBERS = """
+SELECT l.objid::bigint FROM pg_locks l JOIN pg_stat_activity a ON a.pid = l.pid
+WHERE l.locktype = 'advisory' AND l.granted AND l.objsubid = 2 AND l.classid = $1
+AND l.database = (SELECT oid FROM pg_database WHERE datname = current_database())
+ORDER BY a.backend_start, l.objid
+"""
+
+
+def known_tx_message(tx_hash: bytes) -> str:
+    return KNOWN_TX_PREFIX + tx_hash.hex()
+
+
+def cluster_namespace(name: str) -> int:
+    """The first key of the members' two-key advisory locks: a positive int4."""
+    return advisory_lock_key(name) & 0x7FFFFFFF
+
+
+class ClusterMembership:
+    """
+    This replica's membership: an advisory lock on a connection of its own,
+    under a random member id. The live members are the holders of such
+    locks, so a replica that dies or loses its connection leaves at once.
+    """
+
+    def __init__(self, dsn: str, name: str) -> None:
+        self.dsn = dsn
+        self.namespace = cluster_namespace(name)
+        self.member_id = 0
+        self._conn: Optional[asyncpg.Connection] = None
+
+    @property
+    def joined(self) -> bool:
+        return self._conn is not None and not self._conn.is_closed()
+
+    async def join(self) -> None:
+        conn = await asyncpg.connect(self.dsn)
+        while True:
+            member_id = random.SystemRandom().randrange(1, 2**31)
+            if await conn.fetchval(
+                "SELECT pg_try_advisory_lock($1, $2)", self.namespace, member_id
+            ):
+                break
+        self._conn, self.member_id = conn, member_id
+        LOGGER.info("Joined the cluster as member %s", member_id)
+
+    async def members(self) -> List[int]:
+        assert self._conn is not None
+        rows = await self._conn.fetch(SELECT_MEMBERS, self.namespace)
+        return [row[0] for row in rows]
+
+    async def notify(self, channel: str, message: str) -> None:
+        assert self._conn is not None
+        await self._conn.execute("SELECT pg_notify($1, $2)", channel, message)
+
+    async def leave(self) -> None:
+        if self._conn is not None:
+            conn, self._conn = self._conn, None
+            # Closing the session releases the lock.
+            try:
+                await conn.close()
+            except (OSError, asyncpg.PostgresError, asyncpg.InterfaceError):
+                conn.terminate()
+
+
+class ClusterBlockCursor(BlockCursor):
+    """
+    A BlockCursor that only polls while ``is_verifier`` says this replica is
+    the cluster's verifier.
+
+    Verification cannot be split by node: each block's index range continues
+    from the state the block before it left, whichever node produced it, so
+    the blocks of all nodes form one chain verified in height order, and
+    replicas owning different nodes would only hand it to each other block
+    by block. One replica verifies all of them instead, and the next one
+    continues from the shared checkpoint, re-read on every poll. Should the
+    two briefly verify the same block during a takeover, the BlockState row
+    it creates lets only one of them commit.
+    """
+
+    def __init__(
+        self,
+        verify_func: Callable[[int], Any],
+        is_verifier: Callable[[], bool],
+        **kwargs: Any,
+    ) -> None:
+        super().__init__(verify_func, **kwargs)
+        self.is_verifier = is_verifier
+        self._wakeup = asyncio.Event()
+
+    def fetch_blocks(self) -> List[Tuple[int, datetime]]:
+        if not self.is_verifier():
+            return []
+        self.last_processed = get_last_processed_block()
+        return super().fetch_blocks()
+
+    def verify(self, number: int) -> bool:
+        try:
+            return super().verify(number)
+        except TransactionIntegrityError:
+            LOGGER.info("Block %s was verified by another replica", number)
+            return False
+
+    def wake(self) -> None:
+        self._wakeup.set()
+
+    async def wait(self, delay: float) -> None:
+        try:
+            await asyncio.wait_for(self._wakeup.wait(), delay)
+        except asyncio.TimeoutError:
+            pass
+        self._wakeup.clear()
+
+
+class ClusterCoordinator:
+    """
+    Runs this replica's part of the cluster: its membership, the NOTIFY
+    listener and the ClusterBlockCursor, which verifies while this replica
+    is the oldest member.
+
+    The members are re-read every ``membership_interval`` seconds, and at once
+    when a replica announces it joined or left; a verifier that died is
+    replaced at the next re-read. A replica that loses its connection to the
+    database does not verify until it has joined again, as the newest member.
+    """
+
+    def __init__(
+        self,
+        dsn: str,
+        name: str,
+        verify_func: Callable[[int], Any],
+        channel: str = DEFAULT_CLUSTER_CHANNEL,
+        membership_interval: float = DEFAULT_MEMBERSHIP_INTERVAL,
+        known_txs: KnownTxCache = KNOWN_TXS,
+        **cursor_kwargs: Any,
+    ) -> None:
+        self.dsn = dsn
+        self.channel = channel
+        self.membership_interval = membership_interval
+        self.known_txs = known_txs
+        self.membership = ClusterMembership(dsn, name)
+        self.members: List[int] = []
+        self.cursor = ClusterBlockCursor(verify_func, self.is_verifier, **cursor_kwargs)
+        self._members_changed = asyncio.Event()
+
+    def is_verifier(self) -> bool:
+        return bool(self.members) and self.members[0] == self.membership.member_id
+
+    def handle_message(self, payload: Optional[str]) -> None:
+        """The NOTIFY callback."""
+        if payload is None:
+            return
+        if payload.startswith(KNOWN_TX_PREFIX):
+            try:
+                self.known_txs.add(bytes.fromhex(payload[len(KNOWN_TX_PREFIX) :]))
+            except ValueError:
+                LOGGER.warning("Ignoring malformed cluster message %r", payload)
+        elif payload == MEMBERS_CHANGED:
+            self._members_changed.set()
+
+    async def run(self) -> None:
+        try:
+            await asyncio.gather(
+                create_notification_listener(
+                    self.dsn, self.channel, self.handle_message
+                ),
+                self._watch_members(),
+                self.cursor.run(),
+            )
+        finally:
+            await self.leave()
+
+    async def leave(self) -> None:
+        if self.membership.joined:
+            try:
+                await self.membership.notify(self.channel, MEMBERS_CHANGED)
+            except (OSError, asyncpg.PostgresError, asyncpg.InterfaceError):
+                pass
+            await self.membership.leave()
+        self.members = []
+
+    async def _watch_members(self) -> None:
+        while True:
+            try:
+                if not self.membership.joined:
+                    self.members = []
+                    await self.membership.join()
+                    await self.membership.notify(self.channel, MEMBERS_CHANGED)
+                members = await self.membership.members()
+            except (OSError, asyncpg.PostgresError, asyncpg.InterfaceError) as e:
+                LOGGER.warning("Cluster membership check failed: %s", e)
+                self.members = []
+                await self.membership.leave()
+            else:
+                if members != self.members:
+                    LOGGER.info(
+                        "Cluster members: %s; member %s verifies blocks",
+                        members,
+                        members[0] if members else None,
+                    )
+                    self.members = members
+                    self.cursor.wake()
+            try:
+                await asyncio.wait_for(
+                    self._members_changed.wait(), self.membership_interval
+                )
+            except asyncio.TimeoutError:
+                pass
+            self._members_changed.clear()
@@ -1,13 +1,25 @@
-from typing import Any, Optional, Type, TypeVar, cast
+from typing import Any, Optional, Type, TypeVar, Union, cast
 
-from pydantic import PostgresDsn
+import time
+from urllib.parse import urlparse
+
+from pony import orm
+from pydantic import AnyUrl, PostgresDsn
 
 from slasher_proxy.common import db
 from slasher_proxy.common.log import LOGGER
+from slasher_proxy.common.metrics import DB_COMMIT_SECONDS
 from slasher_proxy.common.upgrade import check_db_version
 
 T = TypeVar("T", bound=db.Entity)
 
+Dsn = Union[str, AnyUrl, PostgresDsn]
+
+DEFAULT_SQLITE_MMAP_SIZE: int = 256 * 1024 * 1024
+DEFAULT_SQLITE_CACHE_SIZE_KIB: int = 64 * 1024
+# Lets a write wait for another process holding the lock, e.g. the block writer.
+SQLITE_BUSY_TIMEOUT_MS: int = 5000
+
 
 class GetOrInsertMixin:
     @classmethod
@@ -16,8 +28,68 @@ class GetOrInsertMixin:
         return cast(T, cls.get(**kwargs) or cls(**kwargs))
 
 
-def start_db(dsn: PostgresDsn, network_name: Optional[str] = None) -> None:
-    db.bind(provider="postgres", dsn=str(dsn))
+def is_sqlite_dsn(dsn: Dsn) -> bool:
+    return str(dsn).startswith("sqlite:")
+
+
+def sqlite_filename(dsn: Dsn) -> str:
+    """The database file of sqlite:///path/to/file (an absolute path)."""
+    return urlparse(str(dsn)).path or ":memory:"
+
+
+def configure_sqlite(
+    database: orm.Database,
+    mmap_size: int = DEFAULT_SQLITE_MMAP_SIZE,
+    cache_size_kib: int = DEFAULT_SQLITE_CACHE_SIZE_KIB,
+) -> None:
+    """
+    Set up every connection ``database`` opens to sqlite for a single-node
+    deployment: WAL, so readers never block the writer, and
+    synchronous=NORMAL, which in WAL mode only fsyncs at checkpoints; a crash
+    may lose the last commits but never corrupts the file. Must be called
+    before the database is bound.
+    """
+
+    @database.on_connect(provider="sqlite")
+    def set_pragmas(_: orm.Database, connection: Any) -> None:
+        cursor = connection.cursor()
+        cursor.execute("PRAGMA journal_mode = WAL")
+        cursor.execute("PRAGMA synchronous = NORMAL")
+        cursor.execute(f"PRAGMA mmap_size = {int(mmap_size)}")
+        # Negative values are in KiB rather than pages.
+        cursor.execute(f"PRAGMA cache_size = {-int(cache_size_kib)}")
+        cursor.execute(f"PRAGMA busy_timeout = {SQLITE_BUSY_TIMEOUT_MS}")
+        cursor.execute("PRAGMA temp_store = MEMORY")
+
+
+def instrument_commits(database: orm.Database) -> None:
+    """Time every commit ``database`` makes, whichever code opened the session."""
+    provider = database.provider
+    commit = provider.commit
+    observe = DB_COMMIT_SECONDS.labels("pony").observe
+
+    def timed_commit(connection: Any, cache: Any = None) -> None:
+        started = time.perf_counter()
+        try:
+            commit(connection, cache)
+        finally:
+            observe(time.perf_counter() - started)
+
+    provider.commit = timed_commit
+
+
+def start_db(
+    dsn: Dsn,
+    network_name: Optional[str] = None,
+    sqlite_mmap_size: int = DEFAULT_SQLITE_MMAP_SIZE,
+    sqlite_cache_size_kib: int = DEFAULT_SQLITE_CACHE_SIZE_KIB,
+) -> None:
+    if is_sqlite_dsn(dsn):
+        configure_sqlite(db, sqlite_mmap_size, sqlite_cache_size_kib)
+        db.bind(provider="sqlite", filename=sqlite_filename(dsn), create_db=True)
+    else:
+        db.bind(provider="postgres", dsn=str(dsn))
+    instrument_commits(db)
     db.generate_mapping(create_tables=True)
     check_db_version(network_name)
     LOGGER.info("database is successfully started up")
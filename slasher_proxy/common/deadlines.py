@@ -0,0 +1,234 @@
+"""
+Deadlines for pending commitments. check_block only marks a commitment
+OMITTED once a later block's index range covers it, so one that never fits a
+range would stay PENDING forever, and so would its transaction.
+"""
+
+from typing import Any, Callable, Dict, Hashable, List, Optional, Sequence, Tuple
+
+import asyncio
+import math
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+from pony.orm import db_session
+
+from slasher_proxy.common import (
+    C_STATUS_OMITTED,
+    C_STATUS_PENDING,
+    T_STATUS_EXPIRED,
+    T_STATUS_SUBMITTED,
+    db,
+)
+from slasher_proxy.common.checkpoint import get_last_processed_block
+from slasher_proxy.common.log import LOGGER
+from slasher_proxy.common.metrics import record_transitions
+from slasher_proxy.common.model import Block, Commitment, Transaction
+from slasher_proxy.common.sqlite_writer import call_directly
+from slasher_proxy.common.timing_wheel import TimingWheel
+
+DEFAULT_DEADLINE_INTERVAL: float = 1.0
+DEFAULT_DEADLINE_BATCH_SIZE: int = 1000
+# Ids below the highest one read that are read again, for commitments whose
+# insert committed after a higher id's did.
+DEFAULT_REREAD_IDS: int = 1000
+# Hashes per IN list, below sqlite's limit of bound parameters.
+_CHUNK: int = 500
+
+
+@db_session
+def pending_commitments_after(
+    after_id: int, limit: int
+) -> List[Tuple[int, str, bytes, datetime]]:
+    """Ids, nodes, hashes and insert times of pending commitments above ``after_id``."""
+    query = Commitment.select(
+        lambda c: c.id > after_id and c.status == C_STATUS_PENDING
+    ).order_by(Commitment.id)
+    return [(c.id, c.node, c.tx_hash, c.created_at) for c in query[:limit]]
+
+
+@db_session
+def block_time(height: int) -> Optional[datetime]:
+    """When block ``height`` was stored, if it still is."""
+    block = Block.get(number=height)
+    return block.created_at if block else None
+
+
+@db_session
+def expire_overdue(
+    commitments: Sequence[Tuple[str, bytes]], transactions: Sequence[bytes]
+) -> Dict[str, int]:
+    """
+    Mark the given commitments OMITTED and the given transactions EXPIRED,
+    those still pending and submitted. The omissions are added to each
+    node's censored_count; returns them per node.
+    """
+    by_node: Dict[str, List[bytes]] = {}
+    for node, tx_hash in commitments:
+        by_node.setdefault(node, []).append(tx_hash)
+    expired: Dict[str, int] = {}
+    for node, hashes in by_node.items():
+        for start in range(0, len(hashes), _CHUNK):
+            chunk = hashes[start : start + _CHUNK]
+            for c in Commitment.select(
+                lambda c: c.node == node
+                and c.tx_hash in chunk
+                and c.status == C_STATUS_PENDING
+            ):
+                c.status = C_STATUS_OMITTED
+                expired[node] = expired.get(node, 0) + 1
+    for start in range(0, len(transactions), _CHUNK):
+        chunk = list(transactions[start : start + _CHUNK])
+        for t in Transaction.select(
+            lambda t: t.hash in chunk and t.status == T_STATUS_SUBMITTED
+        ):
+            t.status = T_STATUS_EXPIRED
+    for node, count in expired.items():
+        # The submission created the row; one statement, as the workers
+        # counting submissions update it concurrently.
+        db.execute(
+            "UPDATE NodeStats SET censored_count = censored_count + $count "
+            "WHERE node = $node",
+            {"count": count, "node": node},
+        )
+    return expired
+
+
+class DeadlineScheduler:
+    """
+    Marks commitments still pending ``expiry_blocks`` blocks after they were
+    found, or ``expiry_seconds`` after they were submitted, OMITTED, and
+    counts them as censored. A submitted transaction not in a block by its
+    time deadline is marked EXPIRED.
+
+    Each poll reads the pending commitments added since the last one, by id,
+    into two timing wheels, one ticking with the verified height and one
+    with the clock in whole seconds, and advances both, so an expiry costs
+    O(1) amortized rather than a scan of the pending rows. The first poll
+    after the first verified block reads the commitments left pending
+    before a restart; their block deadlines count from the height at that
+    poll.
+
+    The clock wheel only moves up to the time the last verified block was
+    stored, so a verifier lagging behind does not expire commitments that
+    the blocks it has yet to check would fulfill.
+
+    Commitments resolved before their deadline are not removed from the
+    wheels: the update only matches rows still pending.
+    """
+
+    def __init__(
+        self,
+        expiry_blocks: Optional[int] = None,
+        expiry_seconds: Optional[float] = None,
+        interval: float = DEFAULT_DEADLINE_INTERVAL,
+        batch_size: int = DEFAULT_DEADLINE_BATCH_SIZE,
+        reread_ids: int = DEFAULT_REREAD_IDS,
+        run_write: Callable[..., Any] = call_directly,
+    ) -> None:
+        self.expiry_blocks = expiry_blocks
+        self.expiry_seconds = expiry_seconds
+        self.interval = interval
+        self.batch_size = max(batch_size, 1)
+        self.reread_ids = reread_ids
+        self.run_write = run_write
+        self.executor = ThreadPoolExecutor(1, thread_name_prefix="deadlines")
+        # Keys are (node, tx hash) for commitments and the tx hash for
+        # transactions, which only have a time deadline.
+        self.blocks: TimingWheel[Hashable] = TimingWheel()
+        self.clock: TimingWheel[Hashable] = TimingWheel()
+        self.last_id = 0
+        self._verified_height: Optional[int] = None
+        self._verified_time: Optional[float] = None
+        self.expired_commitments = 0
+        self.expired_transactions = 0
+
+    @property
+    def tracked(self) -> int:
+        return len(self.blocks) + len(self.clock)
+
+    def track(
+        self, node: str, tx_hash: bytes, height: Optional[int], created_at: datetime
+    ) -> None:
+        key = (node, tx_hash)
+        if key in self.blocks or key in self.clock:
+            return
+        if self.expiry_blocks is not None and height is not None:
+            self.blocks.add(key, height + self.expiry_blocks)
+        if self.expiry_seconds is not None:
+            deadline = math.ceil(created_at.timestamp() + self.expiry_seconds)
+            self.clock.add(key, deadline)
+            if tx_hash not in self.clock:
+                self.clock.add(tx_hash, deadline)
+
+    def poll(self, now: Optional[float] = None) -> int:
+        """Expire what is due, then read new commitments. Returns the expired."""
+        height = get_last_processed_block()
+        if height is None:
+            # Deadlines count from the first verified block.
+            return 0
+        if height != self._verified_height:
+            verified_at = block_time(height)
+            if verified_at is not None:
+                self._verified_time = verified_at.timestamp()
+            self._verified_height = height
+        now = time.time() if now is None else now
+        due = self.blocks.advance(height)
+        if self._verified_time is not None:
+            due += self.clock.advance(int(min(now, self._verified_time)))
+        expired = self._expire(due)
+        if self.expiry_seconds is not None and self._verified_time is None:
+            # The clock wheel starts at the first verified block's time.
+            return expired
+        after_id = max(self.last_id - self.reread_ids, 0)
+        while True:
+            rows = pending_commitments_after(after_id, self.batch_size)
+            for _, node, tx_hash, created_at in rows:
+                self.track(node, tx_hash, height, created_at)
+            if rows:
+                after_id = rows[-1][0]
+                self.last_id = max(self.last_id, after_id)
+            if len(rows) < self.batch_size:
+                return expired
+
+    def _expire(self, due: List[Hashable]) -> int:
+        commitments: Dict[Tuple[str, bytes], None] = {}
+        transactions: List[bytes] = []
+        for key in due:
+            if isinstance(key, tuple):
+                commitments[key] = None
+                # Due in both wheels; the other one need not report it.
+                self.blocks.discard(key)
+                self.clock.discard(key)
+            elif isinstance(key, bytes):
+                transactions.append(key)
+        if not commitments and not transactions:
+            return 0
+        expired: Dict[str, int] = self.run_write(
+            expire_overdue, list(commitments), transactions
+        )
+        for node, count in expired.items():
+            record_transitions(node, {"expired": count})
+        count = sum(expired.values())
+        self.expired_commitments += count
+        self.expired_transactions += len(transactions)
+        if count:
+            LOGGER.info("Marked %s overdue commitment(s) omitted", count)
+        return count
+
+    async def run(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            try:
+                await loop.run_in_executor(self.executor, self.poll)
+            except Exception as e:
+                LOGGER.error(f"Expiring overdue commitments failed: {e}")
+            await asyncio.sleep(self.interval)
+
+    def snapshot(self) -> Dict[str, float]:
+        return {
+            "tracked": self.tracked,
+            "expired_commitments": self.expired_commitments,
+            "expired_transactions": self.expired_transactions,
+        }
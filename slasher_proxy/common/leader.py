@@ -0,0 +1,162 @@
+"""
+Leader election between the proxy's worker processes, so exactly one of them
+runs block ingestion and verification while all of them serve requests.
+"""
+
+from typing import Awaitable, Callable, Optional
+
+import asyncio
+import fcntl
+import hashlib
+import os
+from abc import ABC, abstractmethod
+
+import asyncpg
+
+from slasher_proxy.common.backoff import Backoff
+from slasher_proxy.common.log import LOGGER
+
+DEFAULT_ELECTION_INTERVAL: float = 5.0
+
+
+class LeaderLock(ABC):
+    """A lock held by at most one process and released when that process dies."""
+
+    @abstractmethod
+    async def try_acquire(self) -> bool:
+        """Take the lock if it is free; never waits for it."""
+
+    @abstractmethod
+    async def is_held(self) -> bool:
+        """Whether the lock taken by try_acquire() is still ours."""
+
+    @abstractmethod
+    async def release(self) -> None:
+        """Give the lock up, if held."""
+
+
+def advisory_lock_key(name: str) -> int:
+    """A stable signed 64-bit key for pg_try_advisory_lock()."""
+    digest = hashlib.blake2b(name.encode(), digest_size=8).digest()
+    return int.from_bytes(digest, "big", signed=True)
+
+
+class AdvisoryLock(LeaderLock):
+    """
+    A Postgres session-level advisory lock on a connection of its own. The
+    server drops the lock with the session, so a leader that dies or loses
+    its connection frees it for the others.
+    """
+
+    def __init__(self, dsn: str, name: str) -> None:
+        self.dsn = dsn
+        self.key = advisory_lock_key(name)
+        self._conn: Optional[asyncpg.Connection] = None
+
+    async def try_acquire(self) -> bool:
+        if self._conn is None or self._conn.is_closed():
+            self._conn = await asyncpg.connect(self.dsn)
+        acquired = await self._conn.fetchval(
+            "SELECT pg_try_advisory_lock($1)", self.key
+        )
+        return bool(acquired)
+
+    async def is_held(self) -> bool:
+        if self._conn is None or self._conn.is_closed():
+            return False
+        try:
+            await self._conn.fetchval("SELECT 1")
+        except (OSError, asyncpg.PostgresError, asyncpg.InterfaceError):
+            return False
+        return True
+
+    async def release(self) -> None:
+        if self._conn is not None:
+            conn, self._conn = self._conn, None
+            # Closing the session releases the lock.
+            await conn.close()
+
+
+class FileLock(LeaderLock):
+    """An exclusive flock() on ``path``, which the kernel drops with the process."""
+
+    def __init__(self, path: str) -> None:
+        self.path = path
+        self._fd: Optional[int] = None
+
+    async def try_acquire(self) -> bool:
+        fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            os.close(fd)
+            return False
+        self._fd = fd
+        return True
+
+    async def is_held(self) -> bool:
+        return self._fd is not None
+
+    async def release(self) -> None:
+        if self._fd is not None:
+            fd, self._fd = self._fd, None
+            os.close(fd)
+
+
+async def _step_down(
+    lock: LeaderLock, on_deposed: Callable[[], Awaitable[None]]
+) -> None:
+    try:
+        await on_deposed()
+    except Exception as e:
+        LOGGER.error(f"Stopping block processing failed: {e}")
+    finally:
+        await lock.release()
+
+
+async def campaign(
+    lock: LeaderLock,
+    on_elected: Callable[[], Awaitable[None]],
+    on_deposed: Callable[[], Awaitable[None]],
+    interval: float = DEFAULT_ELECTION_INTERVAL,
+    backoff: Optional[Backoff] = None,
+) -> None:
+    """
+    Try to take ``lock`` every ``interval`` seconds. Once taken, call
+    ``on_elected`` and check the lock at the same interval; if it is lost,
+    call ``on_deposed`` and go back to trying. If ``on_elected`` fails, the
+    lock is released after ``on_deposed`` cleans up, and taken again after
+    a backoff. Runs until cancelled, and calls ``on_deposed`` and releases
+    the lock on the way out if leading.
+    """
+    backoff = backoff or Backoff()
+    leading = False
+    try:
+        while True:
+            if leading:
+                if not await lock.is_held():
+                    LOGGER.warning("Lost leadership; stopping block processing")
+                    leading = False
+                    await _step_down(lock, on_deposed)
+            else:
+                try:
+                    leading = await lock.try_acquire()
+                except (OSError, asyncpg.PostgresError, asyncpg.InterfaceError) as e:
+                    LOGGER.warning("Leader election failed: %s", e)
+                if leading:
+                    LOGGER.info("Elected leader; starting block processing")
+                    try:
+                        await on_elected()
+                        backoff.reset()
+                    except Exception as e:
+                        LOGGER.error(f"Starting block processing failed: {e}")
+                        leading = False
+                        await _step_down(lock, on_deposed)
+                        delay = backoff.next_delay()
+                        LOGGER.info("Retrying in %.1f seconds...", delay)
+                        await asyncio.sleep(delay)
+            await asyncio.sleep(interval)
+    finally:
+        if leading:
+            await on_deposed()
+        await lock.release()
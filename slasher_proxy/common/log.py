@@ -1,12 +1,29 @@
+from typing import Any, Dict, List, Optional, TextIO
+
+import atexit
+import json
 import logging
+import queue
+import threading
+import time
 from logging import Logger
+from logging.handlers import QueueHandler, QueueListener
+
+LOG_FORMAT = "%(levelname)s | %(asctime)s | %(name)s | %(message)s"
+LOG_DATE_FORMAT = "%Y-%m-%d %H:%M:%S"
+DEFAULT_LOG_QUEUE_SIZE: int = 10_000
+
+
+# Root handlers installed by this module; configure_logging() replaces only
+# these, never handlers added by the process embedding the proxy.
+_handlers: List[logging.Handler] = []
 
 
 def setup_logging() -> Logger:
-    logging.basicConfig(
-        format="%(levelname)s | %(asctime)s | %(name)s | %(message)s",
-        datefmt="%Y-%m-%d %H:%M:%S",
-    )
+    root = logging.getLogger()
+    existing = root.handlers[:]
+    logging.basicConfig(format=LOG_FORMAT, datefmt=LOG_DATE_FORMAT)
+    _handlers.extend(h for h in root.handlers if h not in existing)
 
     # Adjust log levels for specific loggers if needed
     # logging.getLogger("uvicorn").setLevel(logging_level)
@@ -16,3 +33,143 @@ def setup_logging() -> Logger:
 
 
 LOGGER: Logger = setup_logging()
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line, for log shippers."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry: Dict[str, Any] = {
+            "time": self.formatTime(record, LOG_DATE_FORMAT),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+            "thread": record.threadName,
+        }
+        if record.exc_info:
+            entry["exception"] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+
+class NonBlockingQueueHandler(QueueHandler):
+    """
+    Hands records to a background writer. The calling thread only merges the
+    message with its arguments; timestamps, JSON and the write itself happen
+    on the writer thread. When ``maxsize`` records are waiting, further ones
+    are dropped and counted rather than making the caller wait.
+    """
+
+    def __init__(self, maxsize: int = DEFAULT_LOG_QUEUE_SIZE) -> None:
+        # SimpleQueue takes no Python-level lock; the bound is checked here.
+        self.pending: "queue.SimpleQueue[logging.LogRecord]" = queue.SimpleQueue()
+        super().__init__(self.pending)
+        self.maxsize = maxsize
+        self.dropped = 0
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # Arguments may change after the call returns, so merge them now. The
+        # record is not copied: the merged message reads the same everywhere.
+        record.msg = record.getMessage()
+        record.args = None
+        return record
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        if self.pending.qsize() >= self.maxsize:
+            self.dropped += 1
+            return
+        self.pending.put_nowait(record)
+
+
+_listener: Optional[QueueListener] = None
+
+
+def stop_logging_thread() -> None:
+    """Write out the queued records and stop the background writer."""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
+
+def configure_logging(
+    level: int = logging.INFO,
+    json_format: bool = False,
+    non_blocking: bool = True,
+    queue_size: int = DEFAULT_LOG_QUEUE_SIZE,
+    stream: Optional[TextIO] = None,
+) -> List[logging.Handler]:
+    """
+    Replace the root handler installed by this module with one writing to
+    ``stream`` (stderr by default), as plain text or JSON, and with
+    ``non_blocking`` behind a queue drained by a background thread. Handlers
+    added by others are kept. Returns the root handlers.
+    """
+    stop_logging_thread()
+    output = logging.StreamHandler(stream)
+    output.setFormatter(
+        JsonFormatter()
+        if json_format
+        else logging.Formatter(LOG_FORMAT, LOG_DATE_FORMAT)
+    )
+    handler: logging.Handler = output
+    if non_blocking:
+        global _listener
+        handler = NonBlockingQueueHandler(queue_size)
+        _listener = QueueListener(handler.queue, output)
+        _listener.start()
+    root = logging.getLogger()
+    for old in _handlers:
+        root.removeHandler(old)
+    _handlers[:] = [handler]
+    root.addHandler(handler)
+    LOGGER.setLevel(level)
+    return root.handlers
+
+
+atexit.register(stop_logging_thread)
+
+
+class RateLimitedLog:
+    """
+    A log call for messages that can repeat per transaction: at most ``rate``
+    records per second are emitted, with bursts of up to ``burst``. The next
+    emitted record says how many were suppressed in between.
+
+    ``log = RateLimitedLog(LOGGER, logging.INFO, rate=10)`` and then
+    ``log("Commitment %s reordered.", index)``.
+    """
+
+    def __init__(
+        self,
+        logger: Logger,
+        level: int,
+        rate: float = 10.0,
+        burst: Optional[int] = None,
+    ) -> None:
+        self.logger = logger
+        self.level = level
+        self.rate = rate
+        self.burst = burst if burst is not None else max(int(rate), 1)
+        self.tokens = float(self.burst)
+        self.suppressed = 0
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def __call__(self, msg: str, *args: Any) -> None:
+        if not self.logger.isEnabledFor(self.level):
+            return
+        with self._lock:
+            now = time.monotonic()
+            self.tokens = min(
+                self.burst, self.tokens + (now - self._updated) * self.rate
+            )
+            self._updated = now
+            if self.tokens < 1:
+                self.suppressed += 1
+                return
+            self.tokens -= 1
+            suppressed, self.suppressed = self.suppressed, 0
+        if suppressed:
+            msg += " (%s similar messages suppressed)"
+            args = (*args, suppressed)
+        self.logger.log(self.level, msg, *args, stacklevel=2)
@@ -0,0 +1,265 @@
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+import math
+from abc import ABC, abstractmethod
+from bisect import bisect_left
+
+from fastapi import APIRouter
+from fastapi.responses import PlainTextResponse
+
+# Prometheus text exposition without the client library. Observations are
+# meant to stay on the hot paths, so they are a list index and two additions
+# without a lock: under the GIL a concurrent update can at worst be lost,
+# which does not matter for monitoring. Code that observes a metric with
+# fixed labels keeps the child returned by labels() instead of looking it up
+# on every call.
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+LATENCY_BUCKETS: Tuple[float, ...] = (
+    0.0005,
+    0.001,
+    0.0025,
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1.0,
+    2.5,
+    5.0,
+    10.0,
+)
+SIZE_BUCKETS: Tuple[float, ...] = (0, 1, 10, 50, 100, 250, 500, 1000, 2500, 5000, 10000)
+
+LabelValues = Tuple[str, ...]
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str]) -> str:
+    if not names:
+        return ""
+    pairs = ",".join(
+        '{}="{}"'.format(
+            name,
+            str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n"),
+        )
+        for name, value in zip(names, values)
+    )
+    return "{" + pairs + "}"
+
+
+def _format_value(value: float) -> str:
+    if value == math.inf:
+        return "+Inf"
+    if value == int(value):
+        return str(int(value))
+    return repr(value)
+
+
+class Metric(ABC):
+    type_name = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+
+    @abstractmethod
+    def samples(self) -> List[Tuple[str, str, float]]:
+        """(name suffix, formatted labels, value) of every sample."""
+
+    def render(self) -> List[str]:
+        lines = [
+            f"# HELP {self.name} {self.documentation}",
+            f"# TYPE {self.name} {self.type_name}",
+        ]
+        for suffix, labels, value in self.samples():
+            lines.append(f"{self.name}{suffix}{labels} {_format_value(value)}")
+        return lines
+
+
+class _CounterChild:
+    __slots__ = ("value",)
+
+    def __init__(self) -> None:
+        self.value = 0.0
+
+    def inc(self, amount: float = 1.0) -> None:
+        self.value += amount
+
+
+class Counter(Metric):
+    type_name = "counter"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, documentation, labelnames)
+        self._children: Dict[LabelValues, _CounterChild] = {}
+
+    def labels(self, *values: str) -> _CounterChild:
+        child = self._children.get(values)
+        if child is None:
+            child = self._children.setdefault(values, _CounterChild())
+        return child
+
+    def inc(self, amount: float = 1.0) -> None:
+        self.labels().inc(amount)
+
+    def samples(self) -> List[Tuple[str, str, float]]:
+        return [
+            ("_total", _format_labels(self.labelnames, values), child.value)
+            for values, child in list(self._children.items())
+        ]
+
+
+class _HistogramChild:
+    __slots__ = ("bounds", "counts", "sum")
+
+    def __init__(self, bounds: Tuple[float, ...]) -> None:
+        self.bounds = bounds
+        # One count per bucket plus the +Inf bucket, not cumulative.
+        self.counts = [0] * (len(bounds) + 1)
+        self.sum = 0.0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect_left(self.bounds, value)] += 1
+        self.sum += value
+
+
+class Histogram(Metric):
+    type_name = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Sequence[str] = (),
+        buckets: Sequence[float] = LATENCY_BUCKETS,
+    ):
+        super().__init__(name, documentation, labelnames)
+        self.bounds = tuple(sorted(float(b) for b in buckets if b != math.inf))
+        self._children: Dict[LabelValues, _HistogramChild] = {}
+
+    def labels(self, *values: str) -> _HistogramChild:
+        child = self._children.get(values)
+        if child is None:
+            child = self._children.setdefault(values, _HistogramChild(self.bounds))
+        return child
+
+    def observe(self, value: float) -> None:
+        self.labels().observe(value)
+
+    def samples(self) -> List[Tuple[str, str, float]]:
+        result: List[Tuple[str, str, float]] = []
+        names = self.labelnames + ("le",)
+        for values, child in list(self._children.items()):
+            cumulative = 0
+            for bound, count in zip(self.bounds + (math.inf,), list(child.counts)):
+                cumulative += count
+                labels = _format_labels(names, values + (_format_value(bound),))
+                result.append(("_bucket", labels, cumulative))
+            labels = _format_labels(self.labelnames, values)
+            result.append(("_count", labels, cumulative))
+            result.append(("_sum", labels, child.sum))
+        return result
+
+
+class CallbackGauge(Metric):
+    """A gauge read when scraped: ``func`` returns the value per label values."""
+
+    type_name = "gauge"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Sequence[str],
+        func: Callable[[], Dict[LabelValues, float]],
+    ):
+        super().__init__(name, documentation, labelnames)
+        self.func = func
+
+    def samples(self) -> List[Tuple[str, str, float]]:
+        return [
+            ("", _format_labels(self.labelnames, values), value)
+            for values, value in self.func().items()
+        ]
+
+
+class Registry:
+    def __init__(self) -> None:
+        self._metrics: Dict[str, Metric] = {}
+
+    def register(self, metric: Metric) -> Metric:
+        """Add ``metric``, replacing a previous one of the same name."""
+        self._metrics[metric.name] = metric
+        return metric
+
+    def unregister(self, name: str) -> None:
+        self._metrics.pop(name, None)
+
+    def get(self, name: str) -> Optional[Metric]:
+        return self._metrics.get(name)
+
+    def render(self) -> str:
+        lines: List[str] = []
+        for metric in list(self._metrics.values()):
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+UPSTREAM_REQUEST_SECONDS = Histogram(
+    "slasher_upstream_request_seconds",
+    "Latency of requests forwarded to the validator, per JSON-RPC method.",
+    ["method"],
+)
+DB_COMMIT_SECONDS = Histogram(
+    "slasher_db_commit_seconds",
+    "Time spent committing database transactions.",
+    ["database"],
+)
+CHECK_BLOCK_SECONDS = Histogram(
+    "slasher_check_block_seconds", "Duration of the verification of one block."
+)
+BLOCK_TRANSACTIONS = Histogram(
+    "slasher_block_transactions",
+    "Transactions per verified block.",
+    buckets=SIZE_BUCKETS,
+)
+NOTIFIED_BLOCK_SECONDS = Histogram(
+    "slasher_notified_block_seconds",
+    "Time from a block's first NOTIFY to its verification.",
+)
+COMMITMENT_TRANSITIONS = Counter(
+    "slasher_commitment_transitions",
+    "Commitments that changed status during block verification.",
+    ["node", "status"],
+)
+
+for _metric in (
+    UPSTREAM_REQUEST_SECONDS,
+    DB_COMMIT_SECONDS,
+    CHECK_BLOCK_SECONDS,
+    BLOCK_TRANSACTIONS,
+    NOTIFIED_BLOCK_SECONDS,
+    COMMITMENT_TRANSITIONS,
+):
+    REGISTRY.register(_metric)
+
+
+def record_transitions(node: str, transitions: Dict[str, int]) -> None:
+    """Count the status changes of one verified block: status name -> count."""
+    for status, count in transitions.items():
+        if count:
+            COMMITMENT_TRANSITIONS.labels(node, status).inc(count)
+
+
+router = APIRouter()
+
+
+@router.get("/metrics")
+def metrics() -> PlainTextResponse:
+    return PlainTextResponse(REGISTRY.render(), media_type=CONTENT_TYPE)
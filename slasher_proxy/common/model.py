@@ -71,6 +71,26 @@ class NodeStats(Entity):  # type: ignore
     last_updated: datetime = Required(datetime, default=lambda: datetime.utcnow())
 
 
+class CommitmentArchive(Entity):  # type: ignore
+    """Resolved commitments moved out of Commitment by the retention job."""
+
+    node: str = Required(str)
+    tx_hash: bytes = Required(bytes)
+    index: int = Required(int)
+    status: int = Required(int)
+    created_at: datetime = Required(datetime)
+    archived_at: datetime = Required(datetime, default=lambda: datetime.now())
+
+
+class CommitmentSummary(Entity):  # type: ignore
+    """Per-node count of archived commitments by final status."""
+
+    node: str = Required(str)
+    status: int = Required(int)
+    count: int = Required(int, default=0)
+    PrimaryKey(node, status)
+
+
 def init_db(
     provider: str = "sqlite",
     filename: str = ":memory:",
@@ -0,0 +1,129 @@
+from typing import Any, Awaitable, Callable, Dict, Generic, Optional, TypeVar, Union
+
+import asyncio
+import time
+from concurrent.futures import Executor
+
+from slasher_proxy.common.log import LOGGER
+
+T = TypeVar("T")
+
+DEFAULT_QUEUE_SIZE: int = 64
+
+
+class StageMetrics:
+    """Counters describing one pipeline stage."""
+
+    def __init__(self) -> None:
+        self.started_at: float = time.monotonic()
+        self.processed: int = 0
+        self.errors: int = 0
+        self.busy_seconds: float = 0.0
+        # Time the last item spent waiting in the stage queue.
+        self.last_lag: float = 0.0
+        self.max_lag: float = 0.0
+
+    @property
+    def throughput(self) -> float:
+        """Items processed per second since the stage was created."""
+        elapsed = time.monotonic() - self.started_at
+        return self.processed / elapsed if elapsed > 0 else 0.0
+
+    def observe(self, lag: float, busy: float) -> None:
+        self.processed += 1
+        self.busy_seconds += busy
+        self.last_lag = lag
+        self.max_lag = max(self.max_lag, lag)
+
+
+class Stage(Generic[T]):
+    """
+    A pipeline stage: a bounded asyncio queue drained by a single worker.
+
+    ``handler`` is either a coroutine function or, when ``blocking`` is set, a
+    plain function that is run in ``executor`` so it never holds the event loop.
+    Results other than None are put into the ``downstream`` stage. Because the
+    downstream queue is bounded, a slow stage makes ``put`` wait, which is how
+    backpressure travels back towards the source.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        handler: Union[Callable[[T], Awaitable[Any]], Callable[[T], Any]],
+        downstream: "Optional[Stage[Any]]" = None,
+        maxsize: int = DEFAULT_QUEUE_SIZE,
+        blocking: bool = False,
+        executor: Optional[Executor] = None,
+    ) -> None:
+        self.name = name
+        self.handler = handler
+        self.downstream = downstream
+        self.blocking = blocking
+        self.executor = executor
+        self.queue: "asyncio.Queue[tuple[float, T]]" = asyncio.Queue(maxsize)
+        self.metrics = StageMetrics()
+
+    @property
+    def depth(self) -> int:
+        return self.queue.qsize()
+
+    async def put(self, item: T) -> None:
+        await self.queue.put((time.monotonic(), item))
+
+    def put_nowait(self, item: T) -> bool:
+        """Enqueue without waiting. Returns False if the queue is full."""
+        try:
+            self.queue.put_nowait((time.monotonic(), item))
+        except asyncio.QueueFull:
+            return False
+        return True
+
+    async def _handle(self, item: T) -> Any:
+        if self.blocking:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self.executor, self.handler, item)
+        return await self.handler(item)
+
+    async def run(self) -> None:
+        while True:
+            enqueued_at, item = await self.queue.get()
+            started = time.monotonic()
+            try:
+                result = await self._handle(item)
+                self.metrics.observe(started - enqueued_at, time.monotonic() - started)
+                if self.downstream is not None and result is not None:
+                    await self.downstream.put(result)
+            except Exception:
+                self.metrics.errors += 1
+                raise
+            finally:
+                self.queue.task_done()
+
+    def snapshot(self) -> Dict[str, float]:
+        return {
+            "depth": self.depth,
+            "processed": self.metrics.processed,
+            "errors": self.metrics.errors,
+            "throughput": self.metrics.throughput,
+            "busy_seconds": self.metrics.busy_seconds,
+            "last_lag": self.metrics.last_lag,
+            "max_lag": self.metrics.max_lag,
+        }
+
+
+async def run_stages(*stages: "Stage[Any]") -> None:
+    """
+    Run the workers of all stages until one of them fails, then cancel the rest
+    and re-raise the failure.
+    """
+    tasks = [asyncio.create_task(stage.run(), name=stage.name) for stage in stages]
+    try:
+        done, _ = await asyncio.wait(tasks, return_when=asyncio.FIRST_EXCEPTION)
+        for task in done:
+            task.result()
+    finally:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        LOGGER.debug("Stopped pipeline stages: %s", [s.name for s in stages])
@@ -1,8 +1,234 @@
-from typing import Any, Callable, Coroutine
+from typing import Any, Callable, Coroutine, Dict, List, Optional, Tuple
+
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
 
 import asyncpg_listen
 
+from slasher_proxy.common.backoff import Backoff
+from slasher_proxy.common.block_cursor import blocks_after
+from slasher_proxy.common.checkpoint import (
+    get_last_processed_block,
+    verify_and_checkpoint,
+)
 from slasher_proxy.common.log import LOGGER
+from slasher_proxy.common.metrics import NOTIFIED_BLOCK_SECONDS
+from slasher_proxy.common.pipeline import StageMetrics
+
+# How often a consumer held at a missing height looks for it in the Block table.
+GAP_RECHECK_INTERVAL: float = 1.0
+# Stored blocks picked up per look at the Block table.
+BACKFILL_BATCH_SIZE: int = 1000
+
+
+def parse_block_height(payload: Optional[str]) -> Optional[int]:
+    """Block height carried by a NOTIFY payload, decimal or 0x-prefixed hex."""
+    if payload is None:
+        return None
+    text = payload.strip()
+    try:
+        height = int(text, 16) if text.lower().startswith("0x") else int(text)
+    except ValueError:
+        return None
+    return height if height >= 0 else None
+
+
+def coalesce_heights(heights: List[int]) -> List[Tuple[int, int]]:
+    """Group sorted, distinct heights into inclusive ranges of consecutive ones."""
+    ranges: List[Tuple[int, int]] = []
+    for height in heights:
+        if ranges and ranges[-1][1] == height - 1:
+            ranges[-1] = (ranges[-1][0], height)
+        else:
+            ranges.append((height, height))
+    return ranges
+
+
+class BlockNotificationConsumer:
+    """
+    Verifies blocks announced over Postgres NOTIFY without blocking the loop.
+
+    ``submit`` is the NOTIFY callback: it only parses the payload and records
+    the height, so a burst of notifications costs a few dict operations. The
+    ``run`` task drains everything recorded so far, coalesces it into ranges
+    of consecutive heights and verifies them in a single-thread executor.
+    Heights at or below the last verified block, and heights already waiting,
+    are dropped as duplicates.
+
+    Blocks are verified strictly one after another, starting right after the
+    last verified height, which is stored in the database. When the next
+    height has not been notified, e.g. it was stored while the proxy was down
+    or its NOTIFY was lost, it is looked up in the Block table; stored blocks
+    are verified as if they had been notified. A height that is not stored
+    either is waited for, or with ``gap_timeout`` skipped with a warning after
+    that many seconds, as BlockCursor does. A failed range is retried after a
+    backoff delay, starting from its first unverified height.
+    """
+
+    def __init__(
+        self,
+        verify_func: Callable[[int], Any],
+        executor: Optional[ThreadPoolExecutor] = None,
+        backoff: Optional[Backoff] = None,
+        gap_timeout: Optional[float] = None,
+    ) -> None:
+        self.verify_func = verify_func
+        self.executor = executor or ThreadPoolExecutor(
+            1, thread_name_prefix="notify-verify"
+        )
+        self.backoff = backoff or Backoff()
+        self.gap_timeout = gap_timeout
+        self.last_verified: Optional[int] = None
+        # Highest height announced so far.
+        self.head_height: Optional[int] = None
+        self.received = 0
+        self.duplicates = 0
+        self.invalid = 0
+        self.backfilled = 0
+        self.skipped = 0
+        self.metrics = StageMetrics()
+        # height -> monotonic time its first notification arrived
+        self._pending: Dict[int, float] = {}
+        self._wakeup = asyncio.Event()
+        self._gap_since: Optional[float] = None
+
+    @property
+    def backlog(self) -> int:
+        return len(self._pending)
+
+    def submit(self, payload: Optional[str]) -> None:
+        self.received += 1
+        height = parse_block_height(payload)
+        if height is None:
+            self.invalid += 1
+            LOGGER.warning("Ignoring NOTIFY payload %r: not a block height", payload)
+            return
+        if height in self._pending or (
+            self.last_verified is not None and height <= self.last_verified
+        ):
+            self.duplicates += 1
+            return
+        self._pending[height] = time.monotonic()
+        if self.head_height is None or height > self.head_height:
+            self.head_height = height
+        self._wakeup.set()
+
+    def _verify_range(self, first: int, last: int) -> None:
+        for height in range(first, last + 1):
+            verify_and_checkpoint(self.verify_func, height)
+            self.last_verified = height
+
+    def _complete(self, first: int, last: int, started: float) -> None:
+        """Record latency for the heights of first..last that were verified."""
+        finished = time.monotonic()
+        if self.last_verified is None or self.last_verified < first:
+            return
+        last = min(last, self.last_verified)
+        busy = (finished - started) / (last - first + 1)
+        for height in range(first, last + 1):
+            lag = finished - self._pending.pop(height)
+            self.metrics.observe(lag, busy)
+            NOTIFIED_BLOCK_SECONDS.observe(lag)
+
+    def _backfill(self, before: int) -> None:
+        """Queue the stored blocks between the last verified one and ``before``."""
+        now = time.monotonic()
+        for number, _ in blocks_after(self.last_verified, BACKFILL_BATCH_SIZE):
+            if number >= before:
+                break
+            if number not in self._pending:
+                self._pending[number] = now
+                self.backfilled += 1
+
+    def _gap_expired(self, number: int) -> bool:
+        assert self.last_verified is not None
+        now = time.monotonic()
+        if self._gap_since is None:
+            self._gap_since = now
+            LOGGER.warning("Waiting for missing block %s", self.last_verified + 1)
+        if self.gap_timeout is None or now - self._gap_since < self.gap_timeout:
+            return False
+        missing = number - self.last_verified - 1
+        LOGGER.warning(
+            "Skipping %s missing block(s) after %s", missing, self.last_verified
+        )
+        self.skipped += missing
+        return True
+
+    async def _next_range(self) -> Optional[Tuple[int, int]]:
+        """
+        The consecutive heights to verify next, or None while the height after
+        the last verified one is missing and still waited for.
+        """
+        first = min(self._pending)
+        if self.last_verified is not None and first > self.last_verified + 1:
+            loop = asyncio.get_running_loop()
+            await loop.run_in_executor(self.executor, self._backfill, first)
+            first = min(self._pending)
+            if first > self.last_verified + 1 and not self._gap_expired(first):
+                return None
+        self._gap_since = None
+        return coalesce_heights(sorted(self._pending))[0]
+
+    async def run(self) -> None:
+        loop = asyncio.get_running_loop()
+        if self.last_verified is None:
+            self.last_verified = await loop.run_in_executor(
+                self.executor, get_last_processed_block
+            )
+        while True:
+            if self._gap_since is None:
+                await self._wakeup.wait()
+            else:
+                # Held at a gap: look for the missing block again now and then.
+                recheck = GAP_RECHECK_INTERVAL
+                if self.gap_timeout is not None:
+                    recheck = min(recheck, self.gap_timeout)
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), recheck)
+                except asyncio.TimeoutError:
+                    pass
+            self._wakeup.clear()
+            while self._pending:
+                next_range = await self._next_range()
+                if next_range is None:
+                    break
+                first, last = next_range
+                started = time.monotonic()
+                try:
+                    await loop.run_in_executor(
+                        self.executor, self._verify_range, first, last
+                    )
+                except Exception as e:
+                    self.metrics.errors += 1
+                    self._complete(first, last, started)
+                    delay = self.backoff.next_delay()
+                    LOGGER.error(f"Verification of notified blocks failed: {e}")
+                    LOGGER.info("Retrying in %.1f seconds...", delay)
+                    await asyncio.sleep(delay)
+                    self._wakeup.set()
+                    break
+                self._complete(first, last, started)
+                self.backoff.reset()
+                LOGGER.debug("Verified notified blocks %s..%s", first, last)
+
+    def snapshot(self) -> Dict[str, float]:
+        """Backlog and per-notification latency, in the shape of Stage.snapshot."""
+        return {
+            "depth": self.backlog,
+            "received": self.received,
+            "duplicates": self.duplicates,
+            "invalid": self.invalid,
+            "backfilled": self.backfilled,
+            "skipped": self.skipped,
+            "processed": self.metrics.processed,
+            "errors": self.metrics.errors,
+            "throughput": self.metrics.throughput,
+            "busy_seconds": self.metrics.busy_seconds,
+            "last_lag": self.metrics.last_lag,
+            "max_lag": self.metrics.max_lag,
+        }
 
 
 def create_notification_listener(
@@ -26,3 +252,13 @@ def create_notification_listener(
         policy=asyncpg_listen.ListenPolicy.ALL,
         notification_timeout=3600,
     )
+
+
+async def consume_block_notifications(
+    postgres_url: str, channel_name: str, consumer: BlockNotificationConsumer
+) -> None:
+    """Run the NOTIFY listener feeding ``consumer`` together with its worker."""
+    await asyncio.gather(
+        create_notification_listener(postgres_url, channel_name, consumer.submit),
+        consumer.run(),
+    )
@@ -0,0 +1,91 @@
+from types import FrameType
+from typing import Annotated, Dict, List, Optional
+
+import asyncio
+import hmac
+import sys
+import threading
+import time
+from collections import Counter
+
+from fastapi import APIRouter, Depends, Header, HTTPException, Query
+from fastapi.responses import PlainTextResponse
+
+from slasher_proxy.common.settings import SlasherRpcProxySettings, get_settings
+
+DEFAULT_SAMPLE_INTERVAL: float = 0.005
+MAX_PROFILE_SECONDS: float = 60.0
+
+# One profile at a time: concurrent samplers would only slow the process down.
+_profile_lock = asyncio.Lock()
+
+
+def _frame_name(frame: FrameType) -> str:
+    code = frame.f_code
+    module = frame.f_globals.get("__name__", "?")
+    return f"{module}:{getattr(code, 'co_qualname', code.co_name)}"
+
+
+def _stack(frame: Optional[FrameType]) -> List[str]:
+    names = []
+    while frame is not None:
+        names.append(_frame_name(frame))
+        frame = frame.f_back
+    names.reverse()
+    return names
+
+
+def sample_stacks(
+    seconds: float, interval: float = DEFAULT_SAMPLE_INTERVAL
+) -> Dict[str, int]:
+    """
+    Sample the stacks of every other thread of the process every ``interval``
+    seconds for ``seconds``. Returns how often each stack was seen, keyed by
+    "thread;outermost;...;innermost" as flamegraph.pl and speedscope expect.
+    """
+    me = threading.get_ident()
+    counts: Dict[str, int] = Counter()
+    deadline = time.monotonic() + seconds
+    while time.monotonic() < deadline:
+        names = {t.ident: t.name for t in threading.enumerate()}
+        for ident, frame in sys._current_frames().items():
+            if ident == me:
+                continue
+            thread = names.get(ident, str(ident)).replace(";", ":")
+            counts[";".join([thread, *_stack(frame)])] += 1
+        time.sleep(interval)
+    return counts
+
+
+def collapse(counts: Dict[str, int]) -> str:
+    """The collapsed-stack text of sample_stacks() counts, busiest first."""
+    lines = [
+        f"{stack} {count}"
+        for stack, count in sorted(counts.items(), key=lambda item: -item[1])
+    ]
+    return "\n".join(lines) + "\n"
+
+
+router = APIRouter()
+
+
+@router.get("/admin/profile")
+async def profile(
+    settings: Annotated[SlasherRpcProxySettings, Depends(get_settings)],
+    seconds: float = Query(5.0, gt=0, le=MAX_PROFILE_SECONDS),
+    interval: float = Query(DEFAULT_SAMPLE_INTERVAL, ge=0.001, le=1.0),
+    x_admin_token: Annotated[Optional[str], Header()] = None,
+) -> PlainTextResponse:
+    """Sample the live process and return its stacks in collapsed format."""
+    if not settings.admin_token:
+        raise HTTPException(status_code=404, detail="Not Found")
+    if not hmac.compare_digest(x_admin_token or "", settings.admin_token):
+        raise HTTPException(status_code=403, detail="Invalid admin token")
+    if _profile_lock.locked():
+        raise HTTPException(status_code=409, detail="A profile is already running")
+    async with _profile_lock:
+        loop = asyncio.get_running_loop()
+        # The sampler runs in a thread, so the event loop keeps serving (and
+        # shows up in the samples) while it runs.
+        counts = await loop.run_in_executor(None, sample_stacks, seconds, interval)
+    return PlainTextResponse(collapse(counts))
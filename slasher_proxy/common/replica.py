@@ -0,0 +1,155 @@
+from typing import Any, Callable, Dict, Optional, Tuple, TypeVar
+
+import threading
+import time
+
+from pony import orm
+from pony.orm import db_session
+
+from slasher_proxy.common import db
+from slasher_proxy.common.checkpoint import LAST_PROCESSED_BLOCK_KEY
+from slasher_proxy.common.database import is_sqlite_dsn, sqlite_filename
+from slasher_proxy.common.log import LOGGER
+
+T = TypeVar("T")
+
+DEFAULT_MAX_LAG_BLOCKS: int = 10
+DEFAULT_LAG_CHECK_INTERVAL: float = 5.0
+
+# Works unchanged on Postgres and sqlite, which ignores identifier case.
+_LAST_PROCESSED_SQL = "SELECT value FROM auxiliarydata WHERE key = $key"
+
+
+def bind_database(dsn: str) -> orm.Database:
+    """
+    A Pony database without entities, for raw SQL reads from ``dsn``: a
+    postgresql:// URL or sqlite:///path/to/file.
+    """
+    database = orm.Database()
+    if is_sqlite_dsn(dsn):
+        database.bind(provider="sqlite", filename=sqlite_filename(dsn))
+    else:
+        database.bind(provider="postgres", dsn=dsn)
+    database.generate_mapping(create_tables=False)
+    return database
+
+
+def _last_processed(database: orm.Database) -> Optional[int]:
+    rows = database.select(_LAST_PROCESSED_SQL, {"key": LAST_PROCESSED_BLOCK_KEY})
+    return int(rows[0]) if rows and rows[0] else None
+
+
+class ReadRouter:
+    """
+    Sends read-only queries to a replica while it keeps up with the primary.
+
+    Lag is measured in blocks: the last processed block recorded on the
+    primary minus the one visible on the replica, which works for any
+    replication setup and for sqlite. It is re-checked at most every
+    ``check_interval`` seconds. When it exceeds ``max_lag_blocks``, or the
+    replica fails, reads go to the primary until the next successful check.
+    """
+
+    def __init__(
+        self,
+        primary: orm.Database = db,
+        replica: Optional[orm.Database] = None,
+        max_lag_blocks: int = DEFAULT_MAX_LAG_BLOCKS,
+        check_interval: float = DEFAULT_LAG_CHECK_INTERVAL,
+    ) -> None:
+        self.primary = primary
+        self.replica = replica
+        self.max_lag_blocks = max_lag_blocks
+        self.check_interval = check_interval
+        self.lag_blocks: Optional[int] = None
+        self.replica_healthy = replica is not None
+        self.replica_reads = 0
+        self.primary_reads = 0
+        self.fallbacks = 0
+        self._checked_at = float("-inf")
+        self._lock = threading.Lock()
+
+    def check_lag(self) -> Optional[int]:
+        """Measure the replica lag now and update whether it is usable."""
+        if self.replica is None:
+            return None
+        try:
+            with db_session:
+                replica_height = _last_processed(self.replica)
+            with db_session:
+                primary_height = _last_processed(self.primary)
+        except Exception as e:
+            LOGGER.warning(f"Replica lag check failed: {e}")
+            self.replica_healthy = False
+            self.lag_blocks = None
+            return None
+        self.lag_blocks = (primary_height or 0) - (replica_height or 0)
+        healthy = self.lag_blocks <= self.max_lag_blocks
+        if healthy != self.replica_healthy:
+            LOGGER.warning(
+                "Replica %s, lag %s blocks",
+                "back in use" if healthy else "bypassed",
+                self.lag_blocks,
+            )
+        self.replica_healthy = healthy
+        return self.lag_blocks
+
+    def _maybe_check(self) -> None:
+        now = time.monotonic()
+        with self._lock:
+            if now - self._checked_at < self.check_interval:
+                return
+            self._checked_at = now
+        self.check_lag()
+
+    def database(self) -> Tuple[orm.Database, str]:
+        """The database reads should use now, with its name."""
+        if self.replica is not None:
+            self._maybe_check()
+            if self.replica_healthy:
+                return self.replica, "replica"
+        return self.primary, "primary"
+
+    def read(self, query: Callable[[orm.Database], T]) -> Tuple[T, str]:
+        """
+        Run ``query`` against the database reads should use, in a db_session,
+        retrying on the primary if the replica fails. Returns the result and
+        "replica" or "primary".
+        """
+        database, source = self.database()
+        if database is self.replica:
+            try:
+                with db_session:
+                    result = query(database)
+                self.replica_reads += 1
+                return result, source
+            except Exception as e:
+                LOGGER.warning(f"Replica read failed, using the primary: {e}")
+                self.replica_healthy = False
+                self.fallbacks += 1
+        with db_session:
+            result = query(self.primary)
+        self.primary_reads += 1
+        return result, "primary"
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "replica_configured": self.replica is not None,
+            "replica_healthy": self.replica_healthy,
+            "lag_blocks": self.lag_blocks,
+            "replica_reads": self.replica_reads,
+            "primary_reads": self.primary_reads,
+            "fallbacks": self.fallbacks,
+        }
+
+
+read_router_instance: ReadRouter = ReadRouter()
+
+
+def get_read_router() -> ReadRouter:
+    return read_router_instance
+
+
+def set_read_router(router: ReadRouter) -> None:
+    global read_router_instance
+    read_router_instance = router
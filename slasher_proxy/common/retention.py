@@ -0,0 +1,167 @@
+from typing import Any, Callable, Dict, Optional, Tuple
+
+import asyncio
+from datetime import datetime
+
+from pony.orm import db_session, desc
+
+from slasher_proxy.common import (
+    C_STATUS_FULFILLED,
+    C_STATUS_REORDERED,
+    C_STATUS_REVOKED,
+    C_STATUS_UNEXPECTED,
+)
+from slasher_proxy.common.checkpoint import get_last_processed_block
+from slasher_proxy.common.log import LOGGER
+from slasher_proxy.common.model import (
+    Block,
+    BlockTransaction,
+    Commitment,
+    CommitmentArchive,
+    CommitmentSummary,
+)
+from slasher_proxy.common.sqlite_writer import call_directly
+
+# Statuses check_block never changes again. OMITTED is not final: the
+# transaction may still show up later and become REORDERED.
+RESOLVED_STATUSES = (
+    C_STATUS_FULFILLED,
+    C_STATUS_REORDERED,
+    C_STATUS_REVOKED,
+    C_STATUS_UNEXPECTED,
+)
+DEFAULT_RETENTION_BATCH_SIZE: int = 500
+
+
+@db_session
+def retention_cutoff(keep_blocks: int) -> Optional[Tuple[int, datetime]]:
+    """
+    The newest block that is at least ``keep_blocks`` below the last processed
+    one, with its insert time, or None while there is no such block.
+    """
+    last_processed = get_last_processed_block()
+    if last_processed is None:
+        return None
+    height = last_processed - keep_blocks
+    block = (
+        Block.select(lambda b: b.number <= height).order_by(desc(Block.number)).first()
+    )
+    return (block.number, block.created_at) if block else None
+
+
+@db_session
+def archive_commitments(
+    cutoff_time: datetime, batch_size: int, after_id: int = 0
+) -> Tuple[int, int]:
+    """
+    Move one batch of resolved commitments created before ``cutoff_time``
+    into CommitmentArchive and add them to the per-node summaries. Only ids
+    above ``after_id`` are considered; returns the number archived and the
+    last archived id, where the next batch continues.
+    """
+    # Scanning from the last batch's id keeps the pending and omitted rows
+    # at the start of the table from being read again for every batch.
+    batch = Commitment.select(
+        lambda c: c.id > after_id
+        and c.status in RESOLVED_STATUSES
+        and c.created_at < cutoff_time
+    ).order_by(Commitment.id)[:batch_size]
+    counts: Dict[Tuple[str, int], int] = {}
+    for c in batch:
+        CommitmentArchive(
+            node=c.node,
+            tx_hash=c.tx_hash,
+            index=c.index,
+            status=c.status,
+            created_at=c.created_at,
+        )
+        counts[(c.node, c.status)] = counts.get((c.node, c.status), 0) + 1
+        c.delete()
+    for (node, status), count in counts.items():
+        summary = CommitmentSummary.get(node=node, status=status)
+        if summary is None:
+            CommitmentSummary(node=node, status=status, count=count)
+        else:
+            summary.count += count
+    return len(batch), batch[-1].id if batch else after_id
+
+
+@db_session
+def prune_block_transactions(cutoff_height: int, batch_size: int) -> int:
+    """
+    Drop one batch of block-transaction links of blocks at or below
+    ``cutoff_height``; check_block has verified them already. The blocks and
+    transactions stay, as they back resuming and replacement lookups.
+    """
+    batch = BlockTransaction.select(lambda bt: bt.block.number <= cutoff_height)[
+        :batch_size
+    ]
+    for bt in batch:
+        bt.delete()
+    return len(batch)
+
+
+def run_retention(
+    keep_blocks: int,
+    batch_size: int = DEFAULT_RETENTION_BATCH_SIZE,
+    max_batches: Optional[int] = None,
+    run_write: Callable[..., Any] = call_directly,
+) -> Dict[str, int]:
+    """
+    Archive everything older than ``keep_blocks`` blocks, one short transaction
+    per batch so no lock is held for long. Stops after ``max_batches`` batches
+    of each kind when given. Batches are written through ``run_write``, the
+    writer thread's ``call`` on sqlite.
+    """
+    result = {"archived": 0, "pruned": 0}
+    cutoff = retention_cutoff(keep_blocks)
+    if cutoff is None:
+        return result
+    cutoff_height, cutoff_time = cutoff
+    last_id = 0
+
+    def archive() -> int:
+        nonlocal last_id
+        done: int
+        done, last_id = run_write(archive_commitments, cutoff_time, batch_size, last_id)
+        return done
+
+    for key, step in (
+        ("archived", archive),
+        (
+            "pruned",
+            lambda: run_write(prune_block_transactions, cutoff_height, batch_size),
+        ),
+    ):
+        batches = 0
+        while max_batches is None or batches < max_batches:
+            done = step()
+            result[key] += done
+            batches += 1
+            if done < batch_size:
+                break
+    LOGGER.info(
+        "Retention up to block %s: archived %s commitments, pruned %s links",
+        cutoff_height,
+        result["archived"],
+        result["pruned"],
+    )
+    return result
+
+
+async def retention_loop(
+    keep_blocks: int,
+    interval: float,
+    batch_size: int,
+    max_batches: int,
+    run_write: Callable[..., Any] = call_directly,
+) -> None:
+    """Run retention every ``interval`` seconds, off the event loop."""
+    while True:
+        try:
+            await asyncio.to_thread(
+                run_retention, keep_blocks, batch_size, max_batches, run_write
+            )
+        except Exception as e:
+            LOGGER.error(f"Retention run failed: {e}")
+        await asyncio.sleep(interval)
@@ -1,9 +1,16 @@
-from typing import Any, Optional
+from typing import Annotated, Any, Dict, Optional, Union
 
 import logging
 from functools import lru_cache
 
-from pydantic import Field, PostgresDsn, field_validator
+from pydantic import (
+    AnyUrl,
+    Field,
+    PostgresDsn,
+    UrlConstraints,
+    field_validator,
+    model_validator,
+)
 from pydantic_settings import BaseSettings, SettingsConfigDict
 
 VALID_LOG_LEVELS = {
@@ -17,6 +24,9 @@ VALID_LOG_LEVELS = {
     )
 }
 
+# sqlite:///absolute/path/to/file.db
+SqliteDsn = Annotated[AnyUrl, UrlConstraints(allowed_schemes=["sqlite"])]
+
 
 # Pydantic will try to load .env file if it exists. Alternatively, you can manually
 # load environment variables from the filename of your choice (if you use cli mode of
@@ -28,11 +38,101 @@ VALID_LOG_LEVELS = {
 class SlasherRpcProxySettings(BaseSettings):
     port: int = 5500
     host: str = "0.0.0.0"
+    # Worker processes serving requests; with more than one, a leader elected
+    # through the database runs block ingestion and verification.
+    workers: int = Field(default=1, ge=1)
+    leader_election_interval: float = Field(default=5.0, gt=0)
+    # Postgres only: replicas sharing the database elect one to verify blocks
+    # and tell each other about stored transactions over NOTIFY.
+    cluster_mode: bool = Field(default=False)
+    cluster_channel: str = Field(default="slasher_cluster")
+    # How often each replica checks which replicas are alive.
+    cluster_membership_interval: float = Field(default=5.0, gt=0)
+    # Require uvloop and httptools rather than taking them only if installed.
+    fast_loop: bool = Field(default=False)
     log_level: Optional[str] = Field(default="INFO")
-    dsn: PostgresDsn
+    # One JSON object per log line instead of plain text.
+    log_json: bool = Field(default=False)
+    # Write log records from a background thread; the caller only queues them.
+    log_non_blocking: bool = Field(default=True)
+    # Records waiting for the writer; further ones are dropped.
+    log_queue_size: int = Field(default=10_000, ge=1)
+    # Postgres, or an embedded sqlite file for a single-node deployment.
+    dsn: Union[PostgresDsn, SqliteDsn]
     blocks_channel: Optional[str] = Field(None)
     blocks_websocket_url: Optional[str] = Field(None)
+    # JSON-RPC endpoint used to fetch full blocks announced over the websocket.
+    # Defaults to the C-Chain RPC of the node behind blocks_websocket_url.
+    blocks_rpc_url: Optional[str] = Field(default=None)
+    blocks_prefetch: int = Field(default=8, ge=1)
+    # Heights per JSON-RPC batch request when backfilling missed blocks.
+    blocks_batch_size: int = Field(default=20, ge=1)
+    # Extract only the needed block fields from raw response bytes.
+    blocks_streaming_parser: bool = Field(default=False)
+    node_id_ttl: float = Field(default=3600.0, gt=0)
+    reconnect_backoff_base: float = Field(default=0.5, gt=0)
+    reconnect_backoff_max: float = Field(default=60.0, gt=0)
+    # Poll the Block table for new blocks instead of LISTEN or the websocket.
+    blocks_polling: bool = Field(default=False)
+    blocks_poll_batch_size: int = Field(default=100, ge=1)
+    blocks_poll_min_interval: float = Field(default=0.2, gt=0)
+    blocks_poll_max_interval: float = Field(default=5.0, gt=0)
+    # Skip a missing block after waiting this many seconds for it; unset waits.
+    blocks_gap_skip_seconds: Optional[float] = Field(default=None, ge=0)
+    # Capacity of each bounded queue between block ingestion stages.
+    pipeline_queue_size: int = Field(default=64, ge=1)
+    # Recently seen transaction hashes kept to skip lookups during ingestion.
+    known_tx_cache_size: int = Field(default=100_000, ge=1)
+    # asyncpg pool for submissions, block ingestion and verification.
+    async_db_enabled: bool = Field(default=False)
+    async_db_pool_min_size: int = Field(default=2, ge=1)
+    async_db_pool_max_size: int = Field(default=10, ge=1)
+    # Prepared statements kept per connection; 0 disables them (pgbouncer).
+    async_db_statement_cache_size: int = Field(default=100, ge=0)
+    # Archive resolved commitments older than this many blocks; unset disables.
+    retention_blocks: Optional[int] = Field(default=None, ge=1)
+    retention_interval: float = Field(default=600.0, gt=0)
+    retention_batch_size: int = Field(default=500, ge=1)
+    # Batches of each kind per scheduled run, to bound the work per run.
+    retention_max_batches: int = Field(default=100, ge=1)
+    # Mark commitments still pending this many blocks after they were seen,
+    # or this many seconds after they were submitted, omitted; unset disables.
+    deadline_blocks: Optional[int] = Field(default=None, ge=1)
+    deadline_seconds: Optional[float] = Field(default=None, gt=0)
+    deadline_interval: float = Field(default=1.0, gt=0)
+    # Read-only APIs use this database while it is at most
+    # replica_max_lag_blocks behind the primary (postgresql:// or sqlite:///).
+    replica_dsn: Optional[str] = Field(default=None)
+    replica_max_lag_blocks: int = Field(default=10, ge=0)
+    replica_lag_check_interval: float = Field(default=5.0, gt=0)
+    # sqlite only: memory-mapped I/O and page cache sizes, and how many queued
+    # writes the writer thread commits together.
+    sqlite_mmap_size: int = Field(default=256 * 1024 * 1024, ge=0)
+    sqlite_cache_size_kib: int = Field(default=64 * 1024, ge=0)
+    sqlite_write_batch_size: int = Field(default=256, ge=1)
+    # Return per-stage request timings in a Server-Timing header.
+    server_timing: bool = Field(default=False)
+    # Log the stage timings of requests slower than this many seconds.
+    slow_request_seconds: Optional[float] = Field(default=None, gt=0)
+    # Append the submissions and blocks ingested to this file for replay.
+    capture_path: Optional[str] = Field(default=None)
+    # Answer submissions once they are fsynced to this journal, and store them
+    # in the database from it in the background.
+    journal_path: Optional[str] = Field(default=None)
+    # Most records made durable by one fsync.
+    journal_group_commit_size: int = Field(default=256, ge=1)
+    # Submitted transactions indexed by sender and nonce to find replacements;
+    # 0 disables.
+    replacement_index_size: int = Field(default=0, ge=0)
+    # Enables the /admin endpoints for requests carrying it in X-Admin-Token.
+    admin_token: Optional[str] = Field(default=None)
     rpc_url: str = Field()
+    # Send each submission to all of these validators, node id -> RPC URL,
+    # instead of rpc_url, recording the commitment of each that accepts it.
+    fanout_validators: Dict[str, str] = Field(default={})
+    # Validators that must accept and be recorded before the client is
+    # answered; the other responses are recorded in the background.
+    fanout_quorum: int = Field(default=1, ge=1)
     network_name: Optional[str] = Field("avalanche")
 
     @field_validator("log_level")
@@ -60,9 +160,62 @@ class SlasherRpcProxySettings(BaseSettings):
             )
         return v
 
+    @field_validator("blocks_polling")
+    def validate_polling(cls, v: bool, info: Any) -> bool:
+        values = info.data
+        if v and (
+            values.get("blocks_channel") is not None
+            or values.get("blocks_websocket_url") is not None
+        ):
+            raise ValueError(
+                "blocks_polling cannot be combined with blocks_channel "
+                "or blocks_websocket_url"
+            )
+        return v
+
+    @model_validator(mode="after")
+    def validate_journal(self) -> "SlasherRpcProxySettings":
+        if self.journal_path and self.workers > 1:
+            raise ValueError("journal_path needs a single worker, which owns the file")
+        return self
+
+    @model_validator(mode="after")
+    def validate_replacements(self) -> "SlasherRpcProxySettings":
+        if self.replacement_index_size and (self.workers > 1 or self.cluster_mode):
+            # Blocks are ingested by one process, which sees only the
+            # submissions it answered.
+            raise ValueError(
+                "replacement_index_size needs a single worker outside cluster_mode"
+            )
+        return self
+
+    @model_validator(mode="after")
+    def validate_fanout(self) -> "SlasherRpcProxySettings":
+        if self.fanout_validators and self.fanout_quorum > len(self.fanout_validators):
+            raise ValueError("fanout_quorum exceeds the number of fanout_validators")
+        return self
+
+    @model_validator(mode="after")
+    def validate_sqlite(self) -> "SlasherRpcProxySettings":
+        if not str(self.dsn).startswith("sqlite:"):
+            return self
+        if self.blocks_channel is not None:
+            raise ValueError("blocks_channel needs Postgres; sqlite uses polling")
+        if self.async_db_enabled:
+            raise ValueError("async_db_enabled needs Postgres")
+        if self.cluster_mode:
+            raise ValueError("cluster_mode needs Postgres")
+        if self.blocks_websocket_url is None:
+            # There is no NOTIFY: new blocks are found by polling the table.
+            self.blocks_polling = True
+        return self
+
     model_config = SettingsConfigDict(env_file=".env", env_file_encoding="utf-8")
 
 
+# The --env-file of the CLI, for the worker processes it starts.
+ENV_FILE_VARIABLE = "SLASHER_ENV_FILE"
+
 # The rest of the file remains unchanged
 settings_instance: Optional[SlasherRpcProxySettings] = None
 
@@ -0,0 +1,154 @@
+from typing import Any, Callable, Dict, List, NamedTuple, Optional, Tuple
+
+import asyncio
+import queue
+import threading
+from concurrent.futures import Future
+
+from pony.orm import db_session
+
+from slasher_proxy.common.log import LOGGER
+
+DEFAULT_WRITE_BATCH_SIZE: int = 256
+
+
+class _Write(NamedTuple):
+    func: Callable[..., Any]
+    args: Tuple[Any, ...]
+    future: "Future[Any]"
+
+
+class SqliteWriter:
+    """
+    Runs database writes on one thread and commits them in batches.
+
+    sqlite allows a single writer at a time and, even in WAL mode, every
+    commit costs a write to the log. Writes queued while a commit is in
+    progress are therefore run together in the next db_session, up to
+    ``batch_size`` of them, so a burst of submissions costs one commit rather
+    than one each. Nothing waits for a batch to fill: an idle writer commits a
+    lone write right away.
+
+    Each write opens its own db_session, which the batch's session contains.
+    If a batch fails, it is rolled back and its writes are run again one by
+    one outside it, so their sessions commit, or roll back and retry, by
+    themselves, and only the write that raised sees the error.
+    """
+
+    def __init__(self, batch_size: int = DEFAULT_WRITE_BATCH_SIZE) -> None:
+        self.batch_size = max(batch_size, 1)
+        self.queue: "queue.Queue[Optional[_Write]]" = queue.Queue()
+        self.thread: Optional[threading.Thread] = None
+        self.writes = 0
+        self.batches = 0
+        self.largest_batch = 0
+        self.errors = 0
+
+    def start(self) -> "SqliteWriter":
+        if self.thread is None:
+            self.thread = threading.Thread(
+                target=self._run, name="sqlite-writer", daemon=True
+            )
+            self.thread.start()
+        return self
+
+    def stop(self, timeout: Optional[float] = None) -> None:
+        """Commit the writes already queued, then stop the thread."""
+        if self.thread is not None:
+            self.queue.put(None)
+            self.thread.join(timeout)
+            self.thread = None
+
+    def submit(self, func: Callable[..., Any], *args: Any) -> "Future[Any]":
+        """Queue ``func(*args)``; the future resolves once it is committed."""
+        if self.thread is None:
+            raise RuntimeError("The sqlite writer is not started")
+        future: "Future[Any]" = Future()
+        self.queue.put(_Write(func, args, future))
+        return future
+
+    def call(self, func: Callable[..., Any], *args: Any) -> Any:
+        """Run ``func(*args)`` on the writer and wait for it to be committed."""
+        return self.submit(func, *args).result()
+
+    async def run(self, func: Callable[..., Any], *args: Any) -> Any:
+        """Like call(), without holding the event loop."""
+        return await asyncio.wrap_future(self.submit(func, *args))
+
+    def _run(self) -> None:
+        while True:
+            item = self.queue.get()
+            if item is None:
+                return
+            batch = [item]
+            stopping = False
+            while len(batch) < self.batch_size:
+                try:
+                    item = self.queue.get_nowait()
+                except queue.Empty:
+                    break
+                if item is None:
+                    stopping = True
+                    break
+                batch.append(item)
+            self._commit(batch)
+            if stopping:
+                return
+
+    def _commit(self, batch: List[_Write]) -> None:
+        try:
+            with db_session:
+                results = [write.func(*write.args) for write in batch]
+        except Exception as e:
+            LOGGER.warning(
+                "Batch of %s writes failed, retrying one by one: %s", len(batch), e
+            )
+            for write in batch:
+                self._commit_alone(write)
+            return
+        self.writes += len(batch)
+        self.batches += 1
+        self.largest_batch = max(self.largest_batch, len(batch))
+        for write, result in zip(batch, results):
+            write.future.set_result(result)
+
+    def _commit_alone(self, write: _Write) -> None:
+        # Outside the batch's session, a write that retries after an
+        # integrity error, like store_submission(), does so in a new one.
+        try:
+            result = write.func(*write.args)
+        except Exception as e:
+            self.errors += 1
+            write.future.set_exception(e)
+            return
+        self.writes += 1
+        self.batches += 1
+        write.future.set_result(result)
+
+    def stats(self) -> Dict[str, float]:
+        return {
+            "writes": self.writes,
+            "batches": self.batches,
+            "mean_batch": self.writes / self.batches if self.batches else 0.0,
+            "largest_batch": self.largest_batch,
+            "errors": self.errors,
+            "queued": self.queue.qsize(),
+        }
+
+
+def call_directly(func: Callable[..., Any], *args: Any) -> Any:
+    """SqliteWriter.call() for databases that need no writer thread."""
+    return func(*args)
+
+
+# Set by the app lifespan when the database is sqlite.
+sqlite_writer_instance: Optional[SqliteWriter] = None
+
+
+def get_sqlite_writer() -> Optional[SqliteWriter]:
+    return sqlite_writer_instance
+
+
+def set_sqlite_writer(writer: Optional[SqliteWriter]) -> None:
+    global sqlite_writer_instance
+    sqlite_writer_instance = writer
@@ -0,0 +1,108 @@
+from types import TracebackType
+from typing import Awaitable, Callable, Dict, Optional, Type
+
+import time
+from contextvars import ContextVar
+
+from fastapi import Request
+from starlette.responses import Response
+
+from slasher_proxy.common.log import LOGGER
+
+# Stages a request handler reports; any other name works as well.
+PARSE = "parse"
+UPSTREAM = "upstream"
+DB = "db"
+SERIALIZE = "serialize"
+
+Middleware = Callable[
+    [Request, Callable[[Request], Awaitable[Response]]], Awaitable[Response]
+]
+
+
+class RequestTimings:
+    """Seconds spent in each stage of one request, in the order first entered."""
+
+    __slots__ = ("stages",)
+
+    def __init__(self) -> None:
+        self.stages: Dict[str, float] = {}
+
+    def add(self, name: str, seconds: float) -> None:
+        self.stages[name] = self.stages.get(name, 0.0) + seconds
+
+    def server_timing(self, total: float) -> str:
+        """The Server-Timing header value, durations in milliseconds."""
+        entries = [
+            f"{name};dur={seconds * 1000:.3f}" for name, seconds in self.stages.items()
+        ]
+        entries.append(f"total;dur={total * 1000:.3f}")
+        return ", ".join(entries)
+
+
+# Set by the middleware for the duration of a request. Handlers running in
+# the threadpool see it too, since the context is copied there.
+current_timings: ContextVar[Optional[RequestTimings]] = ContextVar(
+    "current_timings", default=None
+)
+
+
+class stage:
+    """
+    ``with stage(DB): ...`` adds the time of the block to the current
+    request's timings; outside a request it only reads the clock twice.
+    """
+
+    __slots__ = ("name", "started")
+
+    def __init__(self, name: str) -> None:
+        self.name = name
+        self.started = 0.0
+
+    def __enter__(self) -> "stage":
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(
+        self,
+        exc_type: Optional[Type[BaseException]],
+        exc: Optional[BaseException],
+        tb: Optional[TracebackType],
+    ) -> None:
+        timings = current_timings.get()
+        if timings is not None:
+            timings.add(self.name, time.perf_counter() - self.started)
+
+
+def stage_timing_middleware(
+    server_timing: bool = False, slow_request_seconds: Optional[float] = None
+) -> Middleware:
+    """
+    Middleware that collects the stage timings of each request. With
+    ``server_timing`` they are returned in a Server-Timing header; requests
+    slower than ``slow_request_seconds`` are logged with their breakdown.
+    """
+
+    async def middleware(
+        request: Request, call_next: Callable[[Request], Awaitable[Response]]
+    ) -> Response:
+        timings = RequestTimings()
+        token = current_timings.set(timings)
+        started = time.perf_counter()
+        try:
+            response = await call_next(request)
+        finally:
+            current_timings.reset(token)
+        total = time.perf_counter() - started
+        if server_timing:
+            response.headers["Server-Timing"] = timings.server_timing(total)
+        if slow_request_seconds is not None and total >= slow_request_seconds:
+            LOGGER.warning(
+                "Slow request %s %s: %s",
+                request.method,
+                request.url.path,
+                timings.server_timing(total),
+            )
+        return response
+
+    return middleware
@@ -0,0 +1,104 @@
+from typing import Dict, Generic, Hashable, List, Tuple, TypeVar
+
+K = TypeVar("K", bound=Hashable)
+
+DEFAULT_SLOT_BITS: int = 6
+DEFAULT_LEVELS: int = 4
+
+
+class TimingWheel(Generic[K]):
+    """
+    A hierarchical timing wheel of keys with integer deadlines ("ticks"),
+    e.g. block heights or whole seconds.
+
+    Level ``n`` has ``2**slot_bits`` slots of ``2**(slot_bits * n)`` ticks each.
+    A key is put in the lowest level whose span covers its deadline, so
+    adding is O(1). Whenever a level wraps, the next slot of the level above
+    is moved down, which happens to a key at most once per level: advancing
+    costs O(1) amortized per key plus one step per tick. Deadlines past the
+    top level wait in an overflow list, re-examined when the top level wraps.
+
+    Keys are removed lazily: discard() and a new add() of the same key only
+    update the deadline map, and slot entries that no longer match it are
+    dropped when reached.
+    """
+
+    def __init__(
+        self,
+        now: int = 0,
+        slot_bits: int = DEFAULT_SLOT_BITS,
+        levels: int = DEFAULT_LEVELS,
+    ) -> None:
+        self.now = now
+        self.slot_bits = slot_bits
+        self.levels = levels
+        self._mask = (1 << slot_bits) - 1
+        self._slots: List[List[List[Tuple[K, int]]]] = [
+            [[] for _ in range(1 << slot_bits)] for _ in range(levels)
+        ]
+        self._overflow: List[Tuple[K, int]] = []
+        self._deadlines: Dict[K, int] = {}
+
+    def __len__(self) -> int:
+        return len(self._deadlines)
+
+    def __contains__(self, key: K) -> bool:
+        return key in self._deadlines
+
+    def add(self, key: K, deadline: int) -> None:
+        """Schedule ``key``; a deadline not after ``now`` expires on the next advance."""
+        deadline = max(deadline, self.now + 1)
+        self._deadlines[key] = deadline
+        self._place(key, deadline)
+
+    def discard(self, key: K) -> None:
+        self._deadlines.pop(key, None)
+
+    def _place(self, key: K, deadline: int) -> None:
+        delta = deadline - self.now
+        for level in range(self.levels):
+            if delta < 1 << (self.slot_bits * (level + 1)):
+                index = (deadline >> (self.slot_bits * level)) & self._mask
+                self._slots[level][index].append((key, deadline))
+                return
+        self._overflow.append((key, deadline))
+
+    def advance(self, now: int) -> List[K]:
+        """Move to tick ``now`` and return the keys whose deadline has come."""
+        expired: List[K] = []
+        if not self._deadlines:
+            # Nothing live is left to find; only stale entries would be.
+            self._clear()
+            self.now = max(self.now, now)
+            return expired
+        while self.now < now:
+            self.now += 1
+            self._cascade()
+            slot = self._slots[0][self.now & self._mask]
+            entries, slot[:] = slot[:], []
+            for key, deadline in entries:
+                if self._deadlines.get(key) == deadline:
+                    del self._deadlines[key]
+                    expired.append(key)
+        return expired
+
+    def _cascade(self) -> None:
+        for level in range(1, self.levels + 1):
+            if self.now & ((1 << (self.slot_bits * level)) - 1):
+                return
+            if level == self.levels:
+                entries, self._overflow = self._overflow, []
+            else:
+                slot = self._slots[level][
+                    (self.now >> (self.slot_bits * level)) & self._mask
+                ]
+                entries, slot[:] = slot[:], []
+            for key, deadline in entries:
+                if self._deadlines.get(key) == deadline:
+                    self._place(key, deadline)
+
+    def _clear(self) -> None:
+        for level in self._slots:
+            for slot in level:
+                slot.clear()
+        self._overflow.clear()
@@ -0,0 +1,169 @@
+from typing import Dict, Iterable, Optional
+
+import hashlib
+import math
+import threading
+from collections import OrderedDict
+
+from pony.orm import db_session, desc
+
+from slasher_proxy.common import T_STATUS_SUBMITTED
+from slasher_proxy.common.log import LOGGER
+from slasher_proxy.common.model import Transaction
+
+DEFAULT_CACHE_SIZE: int = 100_000
+DEFAULT_FALSE_POSITIVE_RATE: float = 0.01
+
+
+class BloomFilter:
+    """A plain bit-array Bloom filter with double hashing."""
+
+    def __init__(
+        self, capacity: int, false_positive_rate: float = DEFAULT_FALSE_POSITIVE_RATE
+    ) -> None:
+        capacity = max(capacity, 1)
+        self.num_bits: int = max(
+            8, int(-capacity * math.log(false_positive_rate) / math.log(2) ** 2)
+        )
+        self.num_hashes: int = max(1, round(self.num_bits / capacity * math.log(2)))
+        self.bits = bytearray((self.num_bits + 7) // 8)
+
+    def _indexes(self, key: bytes) -> Iterable[int]:
+        digest = hashlib.blake2b(key, digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], "big")
+        h2 = int.from_bytes(digest[8:], "big") | 1
+        for i in range(self.num_hashes):
+            yield (h1 + i * h2) % self.num_bits
+
+    def add(self, key: bytes) -> None:
+        for index in self._indexes(key):
+            self.bits[index >> 3] |= 1 << (index & 7)
+
+    def __contains__(self, key: bytes) -> bool:
+        return all(self.bits[i >> 3] & (1 << (i & 7)) for i in self._indexes(key))
+
+    def clear(self) -> None:
+        self.bits = bytearray(len(self.bits))
+
+
+class KnownTxCache:
+    """
+    Bounded, thread-safe set of transaction hashes known to be stored in the
+    database: an LRU map for positive answers, fronted by a Bloom filter for
+    cheap negative ones.
+
+    ``lookup`` returns True when the hash is cached, False when the Bloom
+    filter has never seen it, and None when it cannot tell (a Bloom false
+    positive or an entry evicted from the LRU). The filter covers every hash
+    added since it was last rebuilt; it is rebuilt from the LRU contents once
+    that span reaches twice the capacity, which bounds its false positive rate.
+
+    A negative answer only holds if every stored hash was added, so
+    ``trust_negatives`` is turned off where other processes store
+    transactions without telling this one, and lookup then answers None.
+    """
+
+    def __init__(
+        self,
+        capacity: int = DEFAULT_CACHE_SIZE,
+        false_positive_rate: float = DEFAULT_FALSE_POSITIVE_RATE,
+    ) -> None:
+        self.capacity = capacity
+        self.false_positive_rate = false_positive_rate
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[bytes, None]" = OrderedDict()
+        self._bloom = BloomFilter(2 * capacity, false_positive_rate)
+        self._bloom_count = 0
+        self.trust_negatives = True
+        self.hits = 0
+        self.misses = 0
+        self.negatives = 0
+
+    def resize(self, capacity: int) -> None:
+        with self._lock:
+            self.capacity = capacity
+            while len(self._entries) > capacity:
+                self._entries.popitem(last=False)
+            self._rebuild_bloom()
+
+    def _rebuild_bloom(self) -> None:
+        self._bloom = BloomFilter(2 * self.capacity, self.false_positive_rate)
+        for key in self._entries:
+            self._bloom.add(key)
+        self._bloom_count = len(self._entries)
+
+    def add(self, tx_hash: bytes) -> None:
+        with self._lock:
+            self._add(tx_hash)
+
+    def add_many(self, tx_hashes: Iterable[bytes]) -> None:
+        with self._lock:
+            for tx_hash in tx_hashes:
+                self._add(tx_hash)
+
+    def _add(self, tx_hash: bytes) -> None:
+        if tx_hash in self._entries:
+            self._entries.move_to_end(tx_hash)
+            return
+        self._entries[tx_hash] = None
+        if len(self._entries) > self.capacity:
+            self._entries.popitem(last=False)
+        if self._bloom_count >= 2 * self.capacity:
+            self._rebuild_bloom()
+        self._bloom.add(tx_hash)
+        self._bloom_count += 1
+
+    def lookup(self, tx_hash: bytes) -> Optional[bool]:
+        with self._lock:
+            if tx_hash not in self._bloom:
+                if not self.trust_negatives:
+                    self.misses += 1
+                    return None
+                self.negatives += 1
+                return False
+            if tx_hash in self._entries:
+                self._entries.move_to_end(tx_hash)
+                self.hits += 1
+                return True
+            self.misses += 1
+            return None
+
+    def discard(self, tx_hash: bytes) -> None:
+        """Forget a hash, e.g. after the transaction that stored it rolled back."""
+        with self._lock:
+            self._entries.pop(tx_hash, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._rebuild_bloom()
+            self.hits = self.misses = self.negatives = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "size": len(self._entries),
+            "capacity": self.capacity,
+            "hits": self.hits,
+            "misses": self.misses,
+            "negatives": self.negatives,
+        }
+
+
+# Process-wide cache shared by the submission path and block ingestion.
+KNOWN_TXS = KnownTxCache()
+
+
+@db_session
+def warm_known_tx_cache(cache: KnownTxCache = KNOWN_TXS) -> None:
+    """
+    Seed the cache with the transactions still waiting for a block, so the
+    Bloom filter's negative answers hold for them after a restart.
+    """
+    recent = Transaction.select(lambda t: t.status == T_STATUS_SUBMITTED)
+    newest = recent.order_by(desc(Transaction.created_at))[: cache.capacity]
+    hashes = [t.hash for t in newest]
+    cache.add_many(reversed(hashes))
+    LOGGER.info("Warmed known transaction cache with %s hashes", len(hashes))
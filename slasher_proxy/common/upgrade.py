@@ -1,29 +1,213 @@
+from typing import List, Optional, Sequence
+
+from abc import ABC, abstractmethod
+
 from pony.orm import db_session
 
+from slasher_proxy.common import C_STATUS_PENDING, db
 from slasher_proxy.common.log import LOGGER
 from slasher_proxy.common.model import AuxiliaryData
 
 DB_VERSION_KEY = "dbVersion"
-CURRENT_DB_VERSION = "20"
+# Version of the schema Pony's generate_mapping() creates on a new database.
+BASE_DB_VERSION = "20"
+CURRENT_DB_VERSION = "21"
 NETWORK_NAME_KEY = "network"
+# Steps of the migration in progress that already completed: "<version>:<n>".
+MIGRATION_PROGRESS_KEY = "dbMigrationProgress"
+
+
+class MigrationStep(ABC):
+    """One idempotent unit of a migration, re-run from scratch if interrupted."""
+
+    name: str = ""
+
+    def transactional(self, provider: str) -> bool:
+        """Whether the step may run inside a transaction."""
+        return True
+
+    @abstractmethod
+    def statements(self, provider: str) -> List[str]:
+        """The SQL to run for ``provider`` ("postgres" or "sqlite")."""
+
+    def prepare(self, provider: str) -> None:
+        """Clean up after an interrupted run of this step."""
+
+
+class Sql(MigrationStep):
+    def __init__(
+        self, name: str, postgres: Sequence[str], sqlite: Optional[Sequence[str]] = None
+    ) -> None:
+        self.name = name
+        self.postgres = list(postgres)
+        self.sqlite = list(sqlite if sqlite is not None else postgres)
+
+    def statements(self, provider: str) -> List[str]:
+        return self.postgres if provider == "postgres" else self.sqlite
+
+
+class CreateIndex(MigrationStep):
+    """
+    Builds an index without blocking writes: CREATE INDEX CONCURRENTLY on
+    Postgres, outside a transaction. An interrupted concurrent build leaves an
+    INVALID index behind, which is dropped before the step is retried.
+    """
+
+    def __init__(
+        self, name: str, table: str, columns: str, where: Optional[str] = None
+    ) -> None:
+        self.name = name
+        self.table = table
+        self.columns = columns
+        self.where = where
+
+    def transactional(self, provider: str) -> bool:
+        return provider != "postgres"
+
+    def statements(self, provider: str) -> List[str]:
+        concurrently = " CONCURRENTLY" if provider == "postgres" else ""
+        sql = (
+            f"CREATE INDEX{concurrently} IF NOT EXISTS {self.name} "
+            f"ON {self.table} ({self.columns})"
+        )
+        if self.where:
+            sql += f" WHERE {self.where}"
+        return [sql]
+
+    def prepare(self, provider: str) -> None:
+        if provider != "postgres":
+            return
+        with db_session:
+            invalid = db.select(
+                "SELECT 1 FROM pg_index i JOIN pg_class c ON c.oid = i.indexrelid "
+                "WHERE c.relname = $name AND NOT i.indisvalid",
+                {"name": self.name},
+            )
+        if invalid:
+            LOGGER.warning(
+                "Dropping invalid index %s left by a failed build", self.name
+            )
+            _execute_autocommit(f"DROP INDEX CONCURRENTLY IF EXISTS {self.name}")
+
+
+class Migration:
+    def __init__(self, version: int, description: str, steps: List[MigrationStep]):
+        self.version = version
+        self.description = description
+        self.steps = steps
+
+
+# Ordered by version; each one upgrades the database from version - 1.
+MIGRATIONS: List[Migration] = [
+    Migration(
+        21,
+        "Indexes for check_block's pending range scan and replacement lookups",
+        [
+            CreateIndex(
+                "idx_commitment__pending_node_index",
+                "commitment",
+                'node, "index"',
+                where=f"status = {C_STATUS_PENDING}",
+            ),
+            CreateIndex(
+                "idx_transaction__from_address_nonce",
+                '"transaction"',
+                "from_address, nonce",
+            ),
+        ],
+    ),
+]
+
+
+def _execute_autocommit(sql: str) -> None:
+    """Run a statement that Postgres refuses to run in a transaction block."""
+    connection, _ = db.provider.connect()
+    try:
+        connection.autocommit = True
+        connection.cursor().execute(sql)
+    finally:
+        connection.autocommit = False
+        db.provider.release(connection)
+
+
+def _run_step(step: MigrationStep) -> None:
+    provider = db.provider_name
+    step.prepare(provider)
+    if step.transactional(provider):
+        with db_session:
+            for sql in step.statements(provider):
+                db.execute(sql)
+    else:
+        for sql in step.statements(provider):
+            _execute_autocommit(sql)
 
 
-def upgrade_db(version: int) -> None:
-    # TBD
-    LOGGER.error("Upgrade not implemented, exiting.")
-    exit(1)
+@db_session
+def _get_value(key: str) -> Optional[str]:
+    entry = AuxiliaryData.get(key=key)
+    return entry.value if entry else None
 
 
 @db_session
-def check_db_version(network_name: str) -> None:
-    v = AuxiliaryData.get(key=DB_VERSION_KEY)
-    version = v.value if v else None
-    if version is None:
-        # New DB, add current version
-        AuxiliaryData(key=DB_VERSION_KEY, value=CURRENT_DB_VERSION)
-        AuxiliaryData(key=NETWORK_NAME_KEY, value=network_name)
+def _set_value(key: str, value: str) -> None:
+    entry = AuxiliaryData.get(key=key)
+    if entry is None:
+        AuxiliaryData(key=key, value=value)
     else:
-        if (
+        entry.value = value
+
+
+def _completed_steps(version: int) -> int:
+    progress = _get_value(MIGRATION_PROGRESS_KEY)
+    if not progress:
+        return 0
+    progress_version, steps = progress.split(":")
+    return int(steps) if int(progress_version) == version else 0
+
+
+def upgrade_db(version: int, target: int = int(CURRENT_DB_VERSION)) -> int:
+    """
+    Apply the migrations after ``version`` up to ``target`` and return the
+    version reached. Progress is recorded after every step, so a run that is
+    interrupted resumes with the step that did not complete.
+    """
+    if version > target:
+        raise RuntimeError(
+            f"Database version {version} is newer than this proxy ({target})"
+        )
+    for migration in MIGRATIONS:
+        if not version < migration.version <= target:
+            continue
+        if migration.version != version + 1:
+            raise RuntimeError(f"No migration from database version {version}")
+        done = _completed_steps(migration.version)
+        LOGGER.info(
+            "Migrating database to version %s: %s",
+            migration.version,
+            migration.description,
+        )
+        for number, step in enumerate(migration.steps[done:], start=done + 1):
+            LOGGER.info("Migration %s, step %s", migration.version, step.name)
+            _run_step(step)
+            _set_value(MIGRATION_PROGRESS_KEY, f"{migration.version}:{number}")
+        _set_value(DB_VERSION_KEY, str(migration.version))
+        _set_value(MIGRATION_PROGRESS_KEY, "")
+        version = migration.version
+    if version != target:
+        raise RuntimeError(f"No migration to database version {target}")
+    return version
+
+
+def check_db_version(network_name: Optional[str]) -> None:
+    with db_session:
+        v = AuxiliaryData.get(key=DB_VERSION_KEY)
+        version = v.value if v else None
+        if version is None:
+            # New DB: Pony created the base schema, migrations add the rest
+            AuxiliaryData(key=DB_VERSION_KEY, value=BASE_DB_VERSION)
+            AuxiliaryData(key=NETWORK_NAME_KEY, value=network_name)
+            version = BASE_DB_VERSION
+        elif (
             name_in_db := AuxiliaryData.get(key=NETWORK_NAME_KEY).value
         ) != network_name:
             LOGGER.error(
@@ -32,10 +216,12 @@ def check_db_version(network_name: str) -> None:
                 name_in_db,
             )
             exit(1)
-        if version != CURRENT_DB_VERSION:
-            LOGGER.warn(
-                "DB version mismatch. Expected: %s, Actual: %s. Starting migration",
-                CURRENT_DB_VERSION,
-                version,
-            )
-            upgrade_db(version)
+    if version != CURRENT_DB_VERSION:
+        LOGGER.warning(
+            "DB version mismatch. Expected: %s, Actual: %s. Starting migration",
+            CURRENT_DB_VERSION,
+            version,
+        )
+        # Outside the session: concurrent index builds need their own
+        # autocommit use of the connection.
+        upgrade_db(int(version))
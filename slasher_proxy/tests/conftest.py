@@ -10,10 +10,13 @@ from slasher_proxy.common.model import (
     BlockState,
     BlockTransaction,
     Commitment,
+    CommitmentArchive,
+    CommitmentSummary,
     NodeStats,
     Transaction,
     init_db,
 )
+from slasher_proxy.common.tx_cache import KNOWN_TXS
 
 
 # Initialize the in-memory database and create all tables once per test session.
@@ -22,7 +25,7 @@ def initialize_database() -> None:  # type: ignore
     # Use shared in-memory DB so all threads and the app see the same instance.
     init_db(
         provider="sqlite",
-        filename=":memory:",
+        filename=":sharedmemory:",
         create_db=True,
         create_tables=True,
     )
@@ -45,7 +48,10 @@ def clear_database() -> Generator[None, None, None]:
         Transaction.select().delete(bulk=True)
         AuxiliaryData.select().delete(bulk=True)
         NodeStats.select().delete(bulk=True)
+        CommitmentArchive.select().delete(bulk=True)
+        CommitmentSummary.select().delete(bulk=True)
         commit()
+    KNOWN_TXS.clear()
     yield
     # After each test, clear again.
     with db_session:
@@ -56,4 +62,6 @@ def clear_database() -> Generator[None, None, None]:
         Transaction.select().delete(bulk=True)
         AuxiliaryData.select().delete(bulk=True)
         NodeStats.select().delete(bulk=True)
+        CommitmentArchive.select().delete(bulk=True)
+        CommitmentSummary.select().delete(bulk=True)
         commit()
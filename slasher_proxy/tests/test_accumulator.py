@@ -1,5 +1,6 @@
 import hashlib
 
+from slasher_proxy.bench.accumulator import CheckpointedRollingHashAccumulator
 from slasher_proxy.common.accumulator import RollingHashAccumulator
 
 
@@ -69,3 +70,16 @@ def test_repeated_transactions() -> None:
     assert acc1.to_bytes() != acc2.to_bytes()
     assert acc1.total_count == 1
     assert acc2.total_count == 1
+
+
+def test_checkpointed_variant_matches_on_delete() -> None:
+    """The benchmarked checkpointed accumulator keeps the baseline's state."""
+    baseline = RollingHashAccumulator(initial_count=5)
+    checkpointed = CheckpointedRollingHashAccumulator(initial_count=5)
+    for n in range(10):
+        baseline.add_transaction(b"tx%d" % n)
+        checkpointed.add_transaction(b"tx%d" % n)
+    for global_index in (11, 6, 13):
+        baseline.delete_transaction(global_index)
+        checkpointed.delete_transaction(global_index)
+        assert checkpointed.to_bytes() == baseline.to_bytes()
@@ -0,0 +1,128 @@
+from typing import Any, Callable, Dict, List, Tuple
+
+import pytest
+from pony.orm import db_session
+
+from slasher_proxy.avalanche.block_checker import check_block
+from slasher_proxy.common import (
+    C_STATUS_FULFILLED,
+    C_STATUS_REORDERED,
+    C_STATUS_REVOKED,
+    C_STATUS_UNEXPECTED,
+    T_STATUS_IN_BLOCK,
+    T_STATUS_SUBMITTED,
+)
+from slasher_proxy.common.async_db import AsyncDatabase
+from slasher_proxy.common.model import (
+    Block,
+    BlockState,
+    BlockTransaction,
+    Commitment,
+    Transaction,
+)
+
+
+class FakeStatement:
+    def __init__(self, query: str) -> None:
+        self.query = query
+
+    async def fetch(self, *args: Any) -> List[Any]:
+        return [(self.query, args)]
+
+
+class FakeConnection:
+    def __init__(self) -> None:
+        self.prepared_statements: Dict[str, Any] = {}
+        self.prepare_calls = 0
+
+    async def prepare(self, query: str) -> FakeStatement:
+        self.prepare_calls += 1
+        return FakeStatement(query)
+
+    async def fetch(self, query: str, *args: Any) -> List[Any]:
+        return [("unprepared", args)]
+
+
+@pytest.mark.asyncio
+async def test_statements_are_prepared_once_per_connection() -> None:
+    adb = AsyncDatabase("postgresql://unused", statement_cache_size=2)
+    conn = FakeConnection()
+    assert await adb.fetch(conn, "SELECT 1", 5) == [("SELECT 1", (5,))]
+    await adb.execute(conn, "SELECT 1")
+    await adb.fetchrow(conn, "SELECT 2")
+    await adb.fetchrow(conn, "SELECT 3")  # evicts SELECT 1
+    assert list(conn.prepared_statements) == ["SELECT 2", "SELECT 3"]
+    assert conn.prepare_calls == 3
+    stats = adb.stats()
+    assert (stats["statement_hits"], stats["statement_misses"]) == (1, 3)
+    assert stats["pool_size"] == 0
+
+
+@pytest.mark.asyncio
+async def test_statement_cache_can_be_disabled() -> None:
+    adb = AsyncDatabase("postgresql://unused", statement_cache_size=0)
+    conn = FakeConnection()
+    assert await adb.fetch(conn, "SELECT 1") == [("unprepared", ())]
+    assert conn.prepare_calls == 0
+
+
+@db_session
+def _add_block(number: int, txs: List[bytes], replaces: Dict[bytes, bytes]) -> None:
+    block = Block(number=number, hash=b"block%d" % number, node_id="node")
+    for order, tx_hash in enumerate(txs, start=1):
+        tx = Transaction.get(hash=tx_hash) or Transaction(
+            hash=tx_hash, from_address="0xa", nonce=0, replaces=replaces.get(tx_hash)
+        )
+        BlockTransaction(block=block, transaction=tx, order=order)
+
+
+@db_session
+def _add_commitments(first_index: int, txs: List[bytes]) -> None:
+    for index, tx_hash in enumerate(txs, start=first_index):
+        if not Transaction.get(hash=tx_hash):
+            Transaction(hash=tx_hash, from_address="0xa", nonce=0)
+        Commitment(node="node", tx_hash=tx_hash, index=index)
+
+
+@db_session
+def _outcome() -> Tuple[List[Tuple[bytes, int, int]], List[Tuple[int, int, int]]]:
+    comms = sorted((c.tx_hash, c.index, c.status) for c in Commitment.select())
+    states = sorted(
+        (s.block_number, s.offset_index, s.shift_index) for s in BlockState.select()
+    )
+    return comms, states
+
+
+def _run_scenario(checker: Callable[[int], None]) -> Any:
+    _add_commitments(1, [b"a", b"b", b"old"])
+    _add_block(1, [b"a", b"new"], {b"new": b"old"})
+    checker(1)
+    _add_commitments(4, [b"c", b"d", b"e"])
+    _add_block(2, [b"d", b"x"], {})
+    checker(2)
+    _add_block(3, [b"b", b"c", b"e"], {})
+    checker(3)
+    return _outcome()
+
+
+def test_check_block_applies_the_plan() -> None:
+    comms, states = _run_scenario(check_block)
+    assert comms == [
+        (b"a", 1, C_STATUS_FULFILLED),
+        (b"b", 2, C_STATUS_REORDERED),
+        (b"c", 4, C_STATUS_FULFILLED),
+        (b"d", 5, C_STATUS_FULFILLED),
+        (b"e", 6, C_STATUS_FULFILLED),
+        (b"new", 3, C_STATUS_UNEXPECTED),
+        (b"old", 3, C_STATUS_REVOKED),
+        (b"x", 3, C_STATUS_UNEXPECTED),
+    ]
+    assert states == [(1, 2, 0), (2, 4, 1), (3, 5, 1)]
+    with db_session:
+        statuses = {t.hash: t.status for t in Transaction.select()}
+    assert statuses == {
+        **dict.fromkeys(
+            [b"a", b"b", b"c", b"d", b"e", b"new", b"x"], T_STATUS_IN_BLOCK
+        ),
+        b"old": T_STATUS_SUBMITTED,
+    }
@@ -0,0 +1,191 @@
+"""
+The asyncpg operations run against a real Postgres and compared with the Pony
+path. Opt-in: set SLASHER_TEST_POSTGRES_DSN to a scratch database, whose
+tables are emptied by the test.
+"""
+
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple
+
+import multiprocessing
+import os
+
+import pytest
+import pytest_asyncio
+from pony.orm import db_session
+
+from slasher_proxy.avalanche import async_ops
+from slasher_proxy.avalanche.block_checker import check_block
+from slasher_proxy.avalanche.block_parser import save_block
+from slasher_proxy.avalanche.block_stream import CompactBlock, CompactTransaction
+from slasher_proxy.avalanche.proxy_router import store_submission
+from slasher_proxy.common.async_db import AsyncDatabase
+from slasher_proxy.common.checkpoint import (
+    LAST_PROCESSED_BLOCK_KEY,
+    get_last_processed_block,
+    set_last_processed_block,
+)
+from slasher_proxy.common.model import (
+    BlockState,
+    BlockTransaction,
+    Commitment,
+    NodeStats,
+    Transaction,
+)
+
+POSTGRES_DSN = os.environ.get("SLASHER_TEST_POSTGRES_DSN")
+
+pytestmark = pytest.mark.skipif(
+    not POSTGRES_DSN, reason="SLASHER_TEST_POSTGRES_DSN is not set"
+)
+
+NODE = "node"
+TABLES = (
+    "blocktransaction",
+    "blockstate",
+    "commitment",
+    "block",
+    '"transaction"',
+    "nodestats",
+)
+
+Outcome = Dict[str, Any]
+
+Txs = List[Tuple[bytes, Optional[bytes]]]
+
+# Per step: the commitments submitted (first index, hashes), then the block
+# verified (number, [(tx hash, hash it replaces)]).
+SCENARIO: List[Tuple[int, List[bytes], int, Txs]] = [
+    (1, [b"a", b"b", b"old"], 1, [(b"a", None), (b"new", b"old")]),
+    (4, [b"c", b"d", b"e"], 2, [(b"d", None), (b"x", None)]),
+    (7, [], 3, [(b"b", None), (b"c", None), (b"e", None)]),
+]
+
+
+def _hash(name: bytes) -> bytes:
+    return name.ljust(32, b"\0")
+
+
+def _block(number: int, txs: Txs) -> CompactBlock:
+    return CompactBlock(
+        _hash(b"block%d" % number),
+        number,
+        [
+            CompactTransaction(order, _hash(tx), "0xsender", order)
+            for order, (tx, _) in enumerate(txs, start=1)
+        ],
+    )
+
+
+def _create_schema(dsn: str) -> None:
+    """Runs in a fresh process: Pony is bound to sqlite in this one."""
+    from slasher_proxy.common.database import start_db
+
+    start_db(dsn, network_name="test")
+
+
+@db_session
+def _set_replaces(txs: Txs) -> None:
+    for tx, replaces in txs:
+        if replaces:
+            Transaction.get(hash=_hash(tx)).replaces = _hash(replaces)
+
+
+def _run_pony() -> Outcome:
+    for first_index, submitted, number, txs in SCENARIO:
+        for index, tx in enumerate(submitted, start=first_index):
+            store_submission(NODE, _hash(tx), index, b"commitment")
+        save_block(_block(number, txs), NODE)
+        _set_replaces(txs)
+        check_block(number)
+        set_last_processed_block(number)
+    # Saving a block again is a no-op on both paths.
+    save_block(_block(1, SCENARIO[0][3]), NODE)
+    with db_session:
+        return {
+            "commitments": sorted(
+                (c.tx_hash, c.index, c.status) for c in Commitment.select()
+            ),
+            "states": sorted(
+                (s.block_number, s.offset_index, s.shift_index)
+                for s in BlockState.select()
+            ),
+            "transactions": sorted(
+                (t.hash, t.status, t.from_address, t.nonce)
+                for t in Transaction.select()
+            ),
+            "links": BlockTransaction.select().count(),
+            "submissions": NodeStats.get(node=NODE).total_transactions,
+            "last_processed": get_last_processed_block(),
+        }
+
+
+@pytest_asyncio.fixture
+async def adb() -> AsyncIterator[AsyncDatabase]:
+    assert POSTGRES_DSN
+    with multiprocessing.get_context("spawn").Pool(1) as pool:
+        pool.apply(_create_schema, (POSTGRES_DSN,))
+    async with AsyncDatabase(POSTGRES_DSN) as database:
+        async with database.transaction() as conn:
+            await conn.execute("TRUNCATE " + ", ".join(TABLES))
+            # The schema version and network stay.
+            await conn.execute(
+                "DELETE FROM auxiliarydata WHERE key = $1", LAST_PROCESSED_BLOCK_KEY
+            )
+        yield database
+
+
+async def _run_asyncpg(adb: AsyncDatabase) -> Outcome:
+    for first_index, submitted, number, txs in SCENARIO:
+        for index, tx in enumerate(submitted, start=first_index):
+            await async_ops.record_submission(
+                adb, NODE, _hash(tx), index, b"commitment"
+            )
+        await async_ops.save_block(adb, _block(number, txs), NODE)
+        async with adb.transaction() as conn:
+            for tx, replaces in txs:
+                if replaces:
+                    await conn.execute(
+                        'UPDATE "transaction" SET replaces = $2 WHERE hash = $1',
+                        _hash(tx),
+                        _hash(replaces),
+                    )
+        await async_ops.check_block(adb, number, checkpoint=True)
+    await async_ops.save_block(adb, _block(1, SCENARIO[0][3]), NODE)
+    async with adb.transaction() as conn:
+        return {
+            "commitments": sorted(
+                (bytes(r[0]), r[1], r[2])
+                for r in await conn.fetch(
+                    'SELECT tx_hash, "index", status FROM commitment'
+                )
+            ),
+            "states": sorted(
+                tuple(r)
+                for r in await conn.fetch(
+                    "SELECT block_number, offset_index, shift_index FROM blockstate"
+                )
+            ),
+            "transactions": sorted(
+                (bytes(r[0]), r[1], r[2], r[3])
+                for r in await conn.fetch(
+                    'SELECT hash, status, from_address, nonce FROM "transaction"'
+                )
+            ),
+            "links": await conn.fetchval("SELECT count(*) FROM blocktransaction"),
+            "submissions": await conn.fetchval(
+                "SELECT total_transactions FROM nodestats WHERE node = $1", NODE
+            ),
+            "last_processed": int(
+                await conn.fetchval(
+                    "SELECT value FROM auxiliarydata WHERE key = $1",
+                    LAST_PROCESSED_BLOCK_KEY,
+                )
+            ),
+        }
+
+
+@pytest.mark.asyncio
+async def test_asyncpg_path_matches_pony(adb: AsyncDatabase) -> None:
+    expected = _run_pony()
+    assert expected["last_processed"] == 3
+    assert await _run_asyncpg(adb) == expected
@@ -0,0 +1,99 @@
+from typing import List
+
+import asyncio
+from datetime import datetime, timedelta
+
+import pytest
+from pony.orm import db_session
+
+from slasher_proxy.common.block_cursor import BlockCursor, blocks_after
+from slasher_proxy.common.checkpoint import (
+    get_last_processed_block,
+    set_last_processed_block,
+)
+from slasher_proxy.common.model import Block
+
+
+def _add_blocks(*numbers: int) -> None:
+    with db_session:
+        for number in numbers:
+            Block(
+                number=number,
+                hash=number.to_bytes(32, "big"),
+                node_id="node",
+                created_at=datetime.now() - timedelta(seconds=1),
+            )
+
+
+def test_blocks_after() -> None:
+    _add_blocks(3, 1, 2, 5)
+    assert [n for n, _ in blocks_after(None, 10)] == [1, 2, 3, 5]
+    assert [n for n, _ in blocks_after(1, 2)] == [2, 3]
+
+
+def test_poll_verifies_batches_in_order() -> None:
+    _add_blocks(*range(1, 8))
+    set_last_processed_block(2)
+    verified: List[int] = []
+    cursor = BlockCursor(verified.append, batch_size=3)
+    cursor.last_processed = 2
+
+    assert cursor.poll() == 3
+    assert cursor.next_interval(3) == 0.0
+    assert cursor.poll() == 2
+    assert cursor.poll() == 0
+    assert verified == [3, 4, 5, 6, 7]
+    assert get_last_processed_block() == 7
+    assert cursor.metrics.last_lag >= 1
+
+
+def test_poll_waits_for_gaps_then_skips() -> None:
+    _add_blocks(1, 2, 4)
+    verified: List[int] = []
+    cursor = BlockCursor(verified.append)
+
+    cursor.poll()
+    assert verified == [1, 2]
+    _add_blocks(3)
+    cursor.poll()
+    assert verified == [1, 2, 3, 4]
+
+    _add_blocks(6)
+    cursor.poll()
+    assert verified == [1, 2, 3, 4]
+    # Skipping a missing block is opt-in.
+    cursor.gap_timeout = 0
+    cursor.poll()
+    assert verified == [1, 2, 3, 4, 6]
+    assert cursor.skipped == 1
+
+
+def test_poll_interval_adapts() -> None:
+    cursor = BlockCursor(print, batch_size=10, min_interval=0.1, max_interval=0.5)
+    assert cursor.next_interval(10) == 0.0
+    assert cursor.next_interval(0) == 0.2
+    assert cursor.next_interval(0) == 0.4
+    assert cursor.next_interval(0) == 0.5
+    assert cursor.next_interval(1) == 0.1
+
+
+@pytest.mark.asyncio
+async def test_run_resumes_from_checkpoint() -> None:
+    _add_blocks(1, 2, 3)
+    set_last_processed_block(1)
+    verified: List[int] = []
+    cursor = BlockCursor(verified.append, min_interval=0.01, max_interval=0.01)
+    task = asyncio.create_task(cursor.run())
+    try:
+        for _ in range(100):
+            if len(verified) == 2:
+                break
+            await asyncio.sleep(0.01)
+        _add_blocks(4)
+        for _ in range(100):
+            if len(verified) == 3:
+                break
+            await asyncio.sleep(0.01)
+    finally:
+        task.cancel()
+    assert verified == [2, 3, 4]
@@ -0,0 +1,91 @@
+from typing import Any, Dict, List
+
+import asyncio
+
+import pytest
+
+from slasher_proxy.avalanche.block_fetcher import (
+    BlockFetcher,
+    FetchedBlock,
+    block_height,
+    cchain_rpc_url_from_ws,
+)
+
+
+def make_block(number: int) -> Dict[str, Any]:
+    return {"result": {"number": hex(number), "hash": hex(number), "transactions": []}}
+
+
+class DelayedFetcher(BlockFetcher):
+    """Serves blocks with delays that make later heights finish first."""
+
+    def __init__(self, **kwargs: Any) -> None:
+        super().__init__("http://dummy/ext/bc/C/rpc", **kwargs)
+        self.requested: List[int] = []
+        self.batches: List[List[int]] = []
+
+    async def fetch_block(self, number: int) -> FetchedBlock:
+        self.requested.append(number)
+        await asyncio.sleep(0.01 * (10 - number % 10))
+        return make_block(number)
+
+    async def fetch_blocks(self, numbers: List[int]) -> Dict[int, FetchedBlock]:
+        self.requested.extend(numbers)
+        self.batches.append(numbers)
+        await asyncio.sleep(0.01)
+        return {n: make_block(n) for n in numbers}
+
+
+def test_cchain_rpc_url_from_ws() -> None:
+    assert (
+        cchain_rpc_url_from_ws("wss://node.example:9650/ext/bc/C/ws")
+        == "https://node.example:9650/ext/bc/C/rpc"
+    )
+    assert (
+        cchain_rpc_url_from_ws("ws://localhost/ws")
+        == "http://localhost:80/ext/bc/C/rpc"
+    )
+
+
+@pytest.mark.asyncio
+async def test_blocks_are_delivered_in_order() -> None:
+    fetcher = DelayedFetcher(prefetch=4)
+    fetcher.announce(10)
+    fetcher.announce(15)
+    numbers = [block_height(await fetcher.next_block()) for _ in range(6)]
+    assert numbers == [10, 11, 12, 13, 14, 15]
+    assert sorted(fetcher.requested) == list(range(10, 16))
+    await fetcher.close()
+
+
+@pytest.mark.asyncio
+async def test_prefetch_is_bounded() -> None:
+    fetcher = DelayedFetcher(prefetch=3, batch_size=1)
+    fetcher.announce(1)
+    fetcher.announce(100)
+    await asyncio.sleep(0)
+    assert sorted(fetcher.requested) == [1, 2, 3]
+    await fetcher.close()
+
+
+@pytest.mark.asyncio
+async def test_next_block_waits_for_announcement() -> None:
+    fetcher = DelayedFetcher()
+    waiter = asyncio.create_task(fetcher.next_block())
+    await asyncio.sleep(0.01)
+    assert not waiter.done()
+    fetcher.announce(7)
+    block = await asyncio.wait_for(waiter, timeout=1)
+    assert block_height(block) == 7
+    await fetcher.close()
+
+
+@pytest.mark.asyncio
+async def test_backfill_uses_batches_after_reset() -> None:
+    fetcher = DelayedFetcher(prefetch=2, batch_size=5)
+    fetcher.reset(100)
+    fetcher.announce(120)
+    numbers = [block_height(await fetcher.next_block()) for _ in range(21)]
+    assert numbers == list(range(100, 121))
+    assert fetcher.batches[0] == [100, 101, 102, 103, 104]
+    await fetcher.close()
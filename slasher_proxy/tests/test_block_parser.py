@@ -100,3 +100,11 @@ def test_parse_and_save_block() -> None:
             )
             tx_obj = Transaction.get(hash=tx_hash)
             assert tx_obj is not None
+
+
+def test_saving_a_block_again_adds_only_missing_links() -> None:
+    node_id = "test_node"
+    parse_and_save_block({"result": sample_block}, node_id)
+    parse_and_save_block({"result": sample_block}, node_id)
+    with db_session:
+        assert BlockTransaction.select().count() == 1
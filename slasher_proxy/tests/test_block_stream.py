@@ -0,0 +1,72 @@
+import json
+
+import pytest
+
+from slasher_proxy.avalanche.block_parser import compact_block_from_json
+from slasher_proxy.avalanche.block_stream import extract_block, extract_blocks
+from slasher_proxy.tests.test_block_parser import sample_block
+
+
+def test_extract_matches_dict_path() -> None:
+    response = {"jsonrpc": "2.0", "id": 15, "result": sample_block}
+    raw = json.dumps(response).encode()
+    assert extract_block(raw) == compact_block_from_json(response)
+
+
+def test_extract_bare_block_and_pretty_printed_json() -> None:
+    raw = json.dumps(sample_block, indent=2)
+    block = extract_block(raw)
+    assert block.number == 15
+    assert len(block.transactions) == 1
+    tx = block.transactions[0]
+    assert tx.order == 0
+    assert tx.nonce == 14
+    assert tx.from_address == "0xa28fcb2ec5e2112c57ef63292cf85ab61a95ba72"
+
+
+def test_nested_objects_are_ignored() -> None:
+    tx = dict(
+        sample_block["transactions"][0],
+        accessList=[{"address": "0x01", "storageKeys": ["0x02"], "hash": "0xff"}],
+    )
+    block = extract_block(json.dumps({"result": dict(sample_block, transactions=[tx])}))
+    assert block.transactions[0].hash == bytes.fromhex(tx["hash"][2:])
+
+
+def test_batch_reply_skips_missing_blocks() -> None:
+    second = dict(sample_block, number="0x10", hash="0x" + "11" * 32, transactions=[])
+    raw = json.dumps(
+        [
+            {"id": 15, "result": sample_block},
+            {"id": 16, "result": second},
+            {"id": 17, "result": None},
+            {"id": 18, "error": {"code": -32000, "message": "not found"}},
+        ]
+    )
+    assert [b.number for b in extract_blocks(raw)] == [15, 16]
+
+
+@pytest.mark.parametrize("transactions_first", [False, True])
+def test_batch_keeps_every_transaction(transactions_first: bool) -> None:
+    second = dict(sample_block, number="0x10", hash="0x" + "11" * 32)
+    if transactions_first:
+        second = {"transactions": second.pop("transactions"), **second}
+    for payload in (
+        [sample_block, second],
+        [{"result": b} for b in (sample_block, second)],
+    ):
+        blocks = extract_blocks(json.dumps(payload))
+        assert [(b.number, len(b.transactions)) for b in blocks] == [(15, 1), (16, 1)]
+        assert (
+            blocks[0].transactions
+            == compact_block_from_json({"result": sample_block}).transactions
+        )
+
+
+def test_invalid_payloads() -> None:
+    with pytest.raises(ValueError):
+        extract_block(json.dumps({"result": None}))
+    with pytest.raises(ValueError):
+        extract_blocks(json.dumps({"result": sample_block})[:-10])
+    with pytest.raises(ValueError):
+        extract_block(json.dumps({"result": {"transactions": []}}))
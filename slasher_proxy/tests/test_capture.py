@@ -0,0 +1,71 @@
+from typing import List
+
+import os
+
+from slasher_proxy.avalanche.block_stream import CompactBlock, CompactTransaction
+from slasher_proxy.avalanche.capture import (
+    BlockEvent,
+    CaptureLog,
+    Submission,
+    read_capture,
+)
+
+
+def test_events_read_back_in_order(tmp_path: str) -> None:
+    path = os.path.join(tmp_path, "capture.log")
+    block = CompactBlock(
+        b"\x01" * 32,
+        7,
+        [
+            CompactTransaction(0, b"\x02" * 32, "0xsender", 3),
+            CompactTransaction(1, b"\x03" * 32, "", 0),
+        ],
+    )
+    capture_log = CaptureLog(path)
+    capture_log.submission("node", b"\x02" * 32, 41, b"\x04" * 32)
+    capture_log.block("node", block)
+    capture_log.close()
+    # Reopening appends.
+    capture_log = CaptureLog(path)
+    capture_log.submission("other", b"\x05" * 32, 1, b"")
+    capture_log.close()
+
+    events = [captured.event for captured in read_capture(path)]
+    assert events == [
+        Submission("node", b"\x02" * 32, 41, b"\x04" * 32),
+        BlockEvent("node", block),
+        Submission("other", b"\x05" * 32, 1, b""),
+    ]
+
+
+def test_json_blocks_are_stored_compact(tmp_path: str) -> None:
+    path = os.path.join(tmp_path, "capture.log")
+    capture_log = CaptureLog(path)
+    tx = {"hash": "0x" + "aa" * 32, "from": "0xsender", "nonce": "0x5"}
+    capture_log.block(
+        "node",
+        {"result": {"hash": "0x" + "bb" * 32, "number": "0x9", "transactions": [tx]}},
+    )
+    capture_log.close()
+    [captured] = list(read_capture(path))
+    assert captured.event == BlockEvent(
+        "node",
+        CompactBlock(
+            b"\xbb" * 32, 9, [CompactTransaction(0, b"\xaa" * 32, "0xsender", 5)]
+        ),
+    )
+
+
+def test_a_record_cut_short_ends_the_log(tmp_path: str) -> None:
+    path = os.path.join(tmp_path, "capture.log")
+    capture_log = CaptureLog(path)
+    for index in range(3):
+        capture_log.submission("node", bytes([index]) * 32, index, b"")
+    capture_log.close()
+    with open(path, "r+b") as f:
+        f.truncate(os.path.getsize(path) - 5)
+    indexes: List[int] = [
+        captured.event.tx_index  # type: ignore[union-attr]
+        for captured in read_capture(path)
+    ]
+    assert indexes == [0, 1]
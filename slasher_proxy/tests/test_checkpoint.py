@@ -0,0 +1,47 @@
+from unittest.mock import AsyncMock, patch
+
+import pytest
+
+from slasher_proxy.avalanche import ws_blocks
+from slasher_proxy.common.backoff import Backoff
+from slasher_proxy.common.checkpoint import (
+    get_last_processed_block,
+    set_last_processed_block,
+)
+
+
+def test_last_processed_block_only_moves_forward() -> None:
+    assert get_last_processed_block() is None
+    set_last_processed_block(10)
+    set_last_processed_block(12)
+    set_last_processed_block(11)
+    assert get_last_processed_block() == 12
+
+
+def test_backoff_is_jittered_and_capped() -> None:
+    backoff = Backoff(base=1.0, cap=4.0)
+    delays = [backoff.next_delay() for _ in range(10)]
+    assert all(0 <= d <= 4.0 for d in delays)
+    assert backoff.attempt == 10
+    backoff.reset()
+    assert backoff.next_delay() <= 1.0
+
+
+def test_backoff_survives_a_long_outage() -> None:
+    backoff = Backoff(base=0.5, cap=60.0)
+    for _ in range(2000):
+        assert backoff.next_delay() <= 60.0
+
+
+@pytest.mark.asyncio
+async def test_node_id_is_cached() -> None:
+    ws_blocks._node_id_cache.clear()
+    with patch.object(
+        ws_blocks, "get_node_id", AsyncMock(return_value="NodeID-1")
+    ) as m:
+        assert await ws_blocks.get_cached_node_id("http://node/ext/info") == "NodeID-1"
+        assert await ws_blocks.get_cached_node_id("http://node/ext/info") == "NodeID-1"
+        assert m.await_count == 1
+        ws_blocks._node_id_cache.clear()
+        await ws_blocks.get_cached_node_id("http://node/ext/info")
+        assert m.await_count == 2
@@ -0,0 +1,61 @@
+from typing import List
+
+import pytest
+from pony.orm import db_session
+
+from slasher_proxy.common.checkpoint import get_last_processed_block
+from slasher_proxy.common.cluster import (
+    MEMBERS_CHANGED,
+    ClusterBlockCursor,
+    ClusterCoordinator,
+    known_tx_message,
+)
+from slasher_proxy.common.model import Block
+from slasher_proxy.common.tx_cache import KnownTxCache
+
+
+def _add_blocks(*numbers: int) -> None:
+    with db_session:
+        for number in numbers:
+            Block(number=number, hash=number.to_bytes(32, "big"), node_id="node")
+
+
+def test_one_replica_verifies_with_failover() -> None:
+    # Oldest first, as the membership query orders them.
+    members = [2, 1]
+    verified: List[int] = []
+
+    def replica(member: int) -> ClusterBlockCursor:
+        return ClusterBlockCursor(verified.append, lambda: members[0] == member)
+
+    cursors = {member: replica(member) for member in members}
+    _add_blocks(*range(1, 5))
+    assert cursors[1].poll() == 0
+    assert cursors[2].poll() == 4
+    assert verified == [1, 2, 3, 4]
+
+    # The verifier dies; the next oldest continues from the checkpoint.
+    members.remove(2)
+    _add_blocks(5, 6)
+    assert cursors[1].poll() == 2
+    assert verified == list(range(1, 7))
+    assert get_last_processed_block() == 6
+
+
+@pytest.mark.asyncio
+async def test_coordinator_handles_cluster_messages() -> None:
+    cache = KnownTxCache(10)
+    coordinator = ClusterCoordinator(
+        "postgresql://unused", "test", lambda height: None, known_txs=cache
+    )
+    tx_hash = b"\x01" * 32
+    coordinator.handle_message(known_tx_message(tx_hash))
+    coordinator.handle_message("tx:not-hex")
+    assert cache.lookup(tx_hash) is True
+
+    coordinator.handle_message(MEMBERS_CHANGED)
+    coordinator.cursor.wake()
+    await coordinator.cursor.wait(3600)
+    # Nothing is verified before joining.
+    assert not coordinator.is_verifier()
+    assert coordinator.cursor.fetch_blocks() == []
@@ -0,0 +1,130 @@
+import random
+from datetime import datetime, timedelta
+
+from pony.orm import db_session
+
+from slasher_proxy.common import (
+    C_STATUS_FULFILLED,
+    C_STATUS_OMITTED,
+    C_STATUS_PENDING,
+    T_STATUS_EXPIRED,
+    T_STATUS_IN_BLOCK,
+    T_STATUS_SUBMITTED,
+)
+from slasher_proxy.common.checkpoint import set_last_processed_block
+from slasher_proxy.common.deadlines import DeadlineScheduler
+from slasher_proxy.common.model import Block, Commitment, NodeStats, Transaction
+from slasher_proxy.common.timing_wheel import TimingWheel
+
+
+def test_timing_wheel_matches_sorting() -> None:
+    rng = random.Random(7)
+    # Small slots so the deadlines cross every level and the overflow.
+    wheel: TimingWheel[int] = TimingWheel(now=5, slot_bits=2, levels=3)
+    deadlines = {key: 5 + rng.randrange(0, 200) for key in range(300)}
+    for key, deadline in deadlines.items():
+        wheel.add(key, deadline)
+    for key in range(0, 300, 10):
+        wheel.discard(key)
+        del deadlines[key]
+    for key in range(1, 300, 10):
+        deadlines[key] += 17
+        wheel.add(key, deadlines[key])
+
+    now = 5
+    while now < 230:
+        step = rng.randrange(1, 9)
+        expired = wheel.advance(now + step)
+        expected = {
+            key for key, d in deadlines.items() if now < max(d, 6) <= now + step
+        }
+        assert set(expired) == expected
+        now += step
+    assert len(wheel) == 0
+
+
+@db_session
+def _submit(node: str, tx_hash: bytes, created_at: datetime, status: int) -> None:
+    if Transaction.get(hash=tx_hash) is None:
+        Transaction(hash=tx_hash, from_address="unknown", nonce=-1)
+    Commitment(
+        node=node, tx_hash=tx_hash, index=1, status=status, created_at=created_at
+    )
+    stats = NodeStats.get(node=node) or NodeStats(node=node)
+    stats.total_transactions += 1
+
+
+def _verify(height: int, created_at: datetime) -> None:
+    with db_session:
+        Block(number=height, hash=bytes([height]), node_id="a", created_at=created_at)
+    set_last_processed_block(height)
+
+
+def test_time_deadlines() -> None:
+    start = datetime(2025, 1, 1)
+    _submit("a", b"tx1", start, C_STATUS_PENDING)
+    _submit("b", b"tx1", start + timedelta(seconds=30), C_STATUS_PENDING)
+    _submit("a", b"tx2", start, C_STATUS_FULFILLED)
+    _submit("a", b"tx3", start + timedelta(seconds=50), C_STATUS_PENDING)
+    with db_session:
+        Transaction.get(hash=b"tx2").status = T_STATUS_IN_BLOCK
+
+    scheduler = DeadlineScheduler(expiry_seconds=60)
+    now = start.timestamp()
+    # Nothing is read before the first verified block.
+    assert scheduler.poll(now) == 0
+    assert scheduler.tracked == 0
+    _verify(1, start)
+    assert scheduler.poll(now) == 0
+    assert scheduler.tracked == 5
+    # The clock only counts up to the last verified block.
+    assert scheduler.poll(now + 200) == 0
+    _verify(2, start + timedelta(seconds=60))
+    # tx1's deadline is that of its first commitment.
+    assert scheduler.poll(now + 200) == 1
+    _verify(3, start + timedelta(seconds=90))
+    assert scheduler.poll(now + 200) == 1
+    # A commitment resolved before its deadline is left alone.
+    with db_session:
+        Commitment.get(node="a", tx_hash=b"tx3").status = C_STATUS_FULFILLED
+    _verify(4, start + timedelta(seconds=200))
+    assert scheduler.poll(now + 200) == 0
+    assert scheduler.tracked == 0
+
+    with db_session:
+        assert Commitment.get(node="a", tx_hash=b"tx1").status == C_STATUS_OMITTED
+        assert Commitment.get(node="b", tx_hash=b"tx1").status == C_STATUS_OMITTED
+        assert Transaction.get(hash=b"tx1").status == T_STATUS_EXPIRED
+        assert Transaction.get(hash=b"tx3").status == T_STATUS_EXPIRED
+        assert Transaction.get(hash=b"tx2").status == T_STATUS_IN_BLOCK
+        assert NodeStats.get(node="a").censored_count == 1
+        assert NodeStats.get(node="b").censored_count == 1
+    assert scheduler.snapshot()["expired_commitments"] == 2
+
+
+def test_block_deadlines() -> None:
+    now = datetime.now()
+    _submit("a", b"tx1", now, C_STATUS_PENDING)
+    scheduler = DeadlineScheduler(expiry_blocks=3, batch_size=2)
+    # Nothing is read before the first verified block.
+    assert scheduler.poll() == 0
+    assert scheduler.tracked == 0
+
+    set_last_processed_block(100)
+    scheduler.poll()
+    _submit("a", b"tx2", now, C_STATUS_PENDING)
+    _submit("a", b"tx3", now, C_STATUS_PENDING)
+    set_last_processed_block(101)
+    scheduler.poll()
+    assert scheduler.tracked == 3
+
+    set_last_processed_block(103)
+    assert scheduler.poll() == 1
+    set_last_processed_block(110)
+    assert scheduler.poll() == 2
+    with db_session:
+        statuses = {c.tx_hash: c.status for c in Commitment.select()}
+        assert statuses == dict.fromkeys((b"tx1", b"tx2", b"tx3"), C_STATUS_OMITTED)
+        # Only time deadlines expire transactions.
+        assert Transaction.get(hash=b"tx1").status == T_STATUS_SUBMITTED
+        assert NodeStats.get(node="a").censored_count == 3
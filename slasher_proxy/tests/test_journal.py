@@ -0,0 +1,84 @@
+from typing import List
+
+import asyncio
+import os
+
+import pytest
+from pony.orm import db_session
+
+from slasher_proxy.avalanche.capture import Submission
+from slasher_proxy.avalanche.journal import HEADER_SIZE, SubmissionJournal
+from slasher_proxy.avalanche.proxy_router import save_submission
+from slasher_proxy.common.backoff import Backoff
+from slasher_proxy.common.model import Commitment
+
+
+def _submission(n: int) -> Submission:
+    return Submission("node", n.to_bytes(32, "big"), n, b"\x00" * 32)
+
+
+async def _write(journal: SubmissionJournal, count: int) -> None:
+    await asyncio.gather(*(journal.write(_submission(n)) for n in range(1, count + 1)))
+
+
+@pytest.mark.asyncio
+async def test_undrained_records_are_replayed(tmp_path: str) -> None:
+    path = os.path.join(tmp_path, "submissions.journal")
+    journal = SubmissionJournal(path).start()
+    await _write(journal, 50)
+    # Concurrent appends share fsyncs.
+    assert journal.syncs < 50
+    offset, _ = journal.read_pending(20)[-1]
+    journal.mark_drained(offset, 20)
+    journal.stop()
+    # A crash in the middle of a write leaves a torn record behind.
+    with open(path, "ab") as f:
+        f.write(b"\x40\x00\x00\x00garbage")
+
+    journal = SubmissionJournal(path)
+    assert journal.backlog == 30
+    assert [s for _, s in journal.read_pending(100)] == [
+        _submission(n) for n in range(21, 51)
+    ]
+    assert os.path.getsize(path) == journal.size
+    journal.stop()
+
+
+@pytest.mark.asyncio
+async def test_drain_stores_in_order_and_retries(tmp_path: str) -> None:
+    journal = SubmissionJournal(
+        os.path.join(tmp_path, "submissions.journal"), compact_bytes=0
+    ).start()
+    stored: List[int] = []
+    failures = [3]
+
+    async def store(submission: Submission) -> None:
+        if submission.tx_index in failures:
+            failures.remove(submission.tx_index)
+            raise ConnectionError("database unavailable")
+        stored.append(submission.tx_index)
+
+    task = asyncio.create_task(
+        journal.drain(store, batch_size=4, backoff=Backoff(0.001, 0.001))
+    )
+    await _write(journal, 10)
+    for _ in range(100):
+        if journal.backlog == 0:
+            break
+        await asyncio.sleep(0.01)
+    task.cancel()
+    await asyncio.gather(task, return_exceptions=True)
+    assert stored == list(range(1, 11))
+    # Drained completely, so it was truncated.
+    assert journal.size == HEADER_SIZE
+    journal.stop()
+
+
+@pytest.mark.asyncio
+async def test_replayed_submission_is_stored_once() -> None:
+    submission = _submission(1)
+    assert await save_submission(*submission)
+    # Stored again after a crash before it was marked drained.
+    assert not await save_submission(*submission)
+    with db_session:
+        assert Commitment.select().count() == 1
@@ -0,0 +1,72 @@
+from typing import List
+
+import asyncio
+import os
+
+import pytest
+
+from slasher_proxy.common.backoff import Backoff
+from slasher_proxy.common.leader import FileLock, advisory_lock_key, campaign
+
+
+def test_advisory_lock_key_is_stable() -> None:
+    key = advisory_lock_key("slasher_proxy:avalanche")
+    assert key == advisory_lock_key("slasher_proxy:avalanche")
+    assert key != advisory_lock_key("slasher_proxy:fuji")
+    assert -(2**63) <= key < 2**63
+
+
+@pytest.mark.asyncio
+async def test_one_leader_with_failover(tmp_path: str) -> None:
+    path = os.path.join(tmp_path, "proxy.db.leader")
+    events: List[str] = []
+
+    def worker(name: str) -> "asyncio.Task[None]":
+        async def elected() -> None:
+            events.append(f"{name} elected")
+
+        async def deposed() -> None:
+            events.append(f"{name} deposed")
+
+        return asyncio.create_task(campaign(FileLock(path), elected, deposed, 0.01))
+
+    first, second = worker("first"), worker("second")
+    await asyncio.sleep(0.1)
+    assert events == ["first elected"]
+
+    # The leader exits; the other worker takes over.
+    first.cancel()
+    await asyncio.gather(first, return_exceptions=True)
+    await asyncio.sleep(0.1)
+    assert events == ["first elected", "first deposed", "second elected"]
+
+    second.cancel()
+    await asyncio.gather(second, return_exceptions=True)
+    assert events[-1] == "second deposed"
+
+
+@pytest.mark.asyncio
+async def test_failed_start_releases_the_lock(tmp_path: str) -> None:
+    path = os.path.join(tmp_path, "proxy.db.leader")
+    events: List[str] = []
+
+    async def elected() -> None:
+        events.append("elected")
+        if events.count("elected") == 1:
+            raise RuntimeError("no database")
+
+    async def deposed() -> None:
+        events.append("deposed")
+
+    task = asyncio.create_task(
+        campaign(FileLock(path), elected, deposed, 0.01, Backoff(0.01, 0.01))
+    )
+    for _ in range(100):
+        if len(events) == 3:
+            break
+        await asyncio.sleep(0.01)
+    assert events == ["elected", "deposed", "elected"]
+    task.cancel()
+    await asyncio.gather(task, return_exceptions=True)
+    assert events[-1] == "deposed"
+    assert await FileLock(path).try_acquire()
@@ -0,0 +1,95 @@
+from typing import Any, AsyncIterator, Dict, List
+
+import json
+
+import pytest
+import pytest_asyncio
+from aiohttp import web
+from aiohttp.test_utils import TestClient, TestServer
+
+from slasher_proxy.bench.load import drive, percentile
+from slasher_proxy.bench.mock_node import MockValidator
+from slasher_proxy.common.accumulator import RollingHashAccumulator
+
+Client = TestClient[web.Request, web.Application]
+
+
+@pytest_asyncio.fixture
+async def validator() -> AsyncIterator[MockValidator]:
+    # Blocks are produced by the tests only.
+    yield MockValidator(block_interval=3600, omit_rate=0.2, reorder_rate=0.2, seed=1)
+
+
+@pytest_asyncio.fixture
+async def client(validator: MockValidator) -> AsyncIterator[Client]:
+    app = validator.app()
+    # The proxy's submission endpoint, answered by the validator directly.
+    app.router.add_post("/eth_sendRawTransaction", validator._handle_rpc)
+    async with TestClient(TestServer(app)) as client:
+        yield client
+
+
+async def rpc(client: Client, method: str, *params: Any) -> Any:
+    payload = {"jsonrpc": "2.0", "id": 1, "method": method, "params": list(params)}
+    response = await client.post("/ext/bc/C/rpc", json=payload)
+    return (await response.json())["result"]
+
+
+@pytest.mark.asyncio
+async def test_submissions_carry_the_node_commitment(client: Client) -> None:
+    accumulator = RollingHashAccumulator()
+    for raw in ("0x01", "0x02"):
+        result = await rpc(client, "eth_sendRawTransaction", raw)
+        assert result["txIndex"] == accumulator.add_transaction(
+            bytes.fromhex(result["txHash"][2:])
+        )
+        assert result["commitment"] == "0x" + accumulator.state.hex()
+    response = await client.post(
+        "/ext/info", json={"jsonrpc": "2.0", "id": 1, "method": "info.getNodeID"}
+    )
+    assert (await response.json())["result"]["nodeID"] == "avalanche"
+
+
+@pytest.mark.asyncio
+async def test_blocks_omit_and_reorder(
+    client: Client, validator: MockValidator
+) -> None:
+    submitted = [
+        (await rpc(client, "eth_sendRawTransaction", "0x%04x" % n))["txHash"]
+        for n in range(200)
+    ]
+    websocket = await client.ws_connect("/ext/bc/C/ws")
+    await websocket.send_json({"id": 7, "method": "eth_subscribe"})
+    assert (await websocket.receive_json())["id"] == 7
+
+    blocks: List[Dict[str, Any]] = []
+    for _ in range(2):
+        await validator.produce_block()
+        head = json.loads((await websocket.receive()).data)["params"]["result"]
+        blocks.append(await rpc(client, "eth_getBlockByNumber", head["number"], True))
+    await websocket.close()
+
+    first, second = [[tx["hash"] for tx in b["transactions"]] for b in blocks]
+    # Nothing was submitted for the second block to hold back.
+    reordered = validator.reordered
+    assert validator.omitted and reordered
+    # Transactions held back by the first block lead the second one.
+    assert second[:reordered] == [h for h in submitted if h in second[:reordered]]
+    assert set(second[:reordered]).isdisjoint(first)
+    assert len(first) == len(submitted) - validator.omitted - reordered
+    assert await rpc(client, "eth_getBlockByNumber", "0x3", True) is None
+
+
+@pytest.mark.asyncio
+async def test_drive_reports_latencies(client: Client) -> None:
+    raw_txs = ["0x%04x" % n for n in range(20)]
+    result = await drive(str(client.make_url("")), raw_txs, rate=1000, concurrency=4)
+    assert result["ok"] == 20 and result["errors"] == 0
+    assert 0 < result["p50_ms"] <= result["p99_ms"] <= result["max_ms"]
+
+
+def test_percentile() -> None:
+    values = [float(n) for n in range(1, 101)]
+    assert percentile(values, 50) == 50
+    assert percentile(values, 99) == 99
+    assert percentile([], 50) == 0.0
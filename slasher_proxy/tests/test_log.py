@@ -0,0 +1,98 @@
+from typing import Generator
+
+import io
+import json
+import logging
+import sys
+
+import pytest
+
+from slasher_proxy.common import log
+from slasher_proxy.common.log import (
+    LOGGER,
+    JsonFormatter,
+    NonBlockingQueueHandler,
+    RateLimitedLog,
+    configure_logging,
+    stop_logging_thread,
+)
+
+
+@pytest.fixture
+def restore_logging() -> Generator[None, None, None]:
+    root = logging.getLogger()
+    handlers, level = root.handlers[:], LOGGER.level
+    installed = log._handlers[:]
+    yield
+    log._handlers[:] = installed
+    stop_logging_thread()
+    for handler in root.handlers[:]:
+        root.removeHandler(handler)
+    for handler in handlers:
+        root.addHandler(handler)
+    LOGGER.setLevel(level)
+
+
+def test_queued_json_output(restore_logging: None) -> None:
+    stream = io.StringIO()
+    configure_logging(logging.INFO, json_format=True, stream=stream)
+    items = [1]
+    LOGGER.info("Block %s has %s", 7, items)
+    # Changes after the call do not reach the record written later.
+    items.append(2)
+    LOGGER.debug("Not written")
+    stop_logging_thread()
+
+    lines = stream.getvalue().splitlines()
+    assert len(lines) == 1
+    entry = json.loads(lines[0])
+    assert entry["message"] == "Block 7 has [1]"
+    assert entry["level"] == "INFO"
+    assert entry["logger"] == "slasher-proxy"
+
+
+def test_configure_keeps_foreign_handlers(restore_logging: None) -> None:
+    root = logging.getLogger()
+    foreign = logging.NullHandler()
+    root.addHandler(foreign)
+    first = configure_logging(non_blocking=False, stream=io.StringIO())
+    second = configure_logging(non_blocking=False, stream=io.StringIO())
+    assert foreign in first and foreign in second
+    assert len(second) == len(first)
+    assert logging.logProcesses
+
+
+def test_full_queue_drops_records() -> None:
+    handler = NonBlockingQueueHandler(maxsize=2)
+    record = logging.LogRecord("x", logging.INFO, __file__, 1, "m", None, None)
+    for _ in range(3):
+        handler.emit(record)
+    assert handler.pending.qsize() == 2
+    assert handler.dropped == 1
+
+
+def test_json_formatter_includes_the_exception() -> None:
+    try:
+        raise ValueError("boom")
+    except ValueError:
+        record = LOGGER.makeRecord(
+            "x", logging.ERROR, __file__, 1, "failed", (), sys.exc_info()
+        )
+    entry = json.loads(JsonFormatter().format(record))
+    assert "ValueError: boom" in entry["exception"]
+
+
+def test_rate_limited_log(caplog: pytest.LogCaptureFixture) -> None:
+    log = RateLimitedLog(LOGGER, logging.WARNING, rate=0.001, burst=2)
+    with caplog.at_level(logging.WARNING, logger=LOGGER.name):
+        for i in range(5):
+            log("Commitment %s reordered.", i)
+        assert [r.getMessage() for r in caplog.records] == [
+            "Commitment 0 reordered.",
+            "Commitment 1 reordered.",
+        ]
+        log.tokens = 1
+        log("Commitment %s reordered.", 5)
+    assert caplog.records[-1].getMessage() == (
+        "Commitment 5 reordered. (3 similar messages suppressed)"
+    )
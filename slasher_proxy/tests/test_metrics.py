@@ -0,0 +1,102 @@
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from pony.orm import db_session
+
+from slasher_proxy.asgi import PIPELINE_GAUGES, _register_pipeline_gauges
+from slasher_proxy.avalanche.block_checker import check_block
+from slasher_proxy.common import C_STATUS_PENDING
+from slasher_proxy.common.async_db import AsyncDatabase
+from slasher_proxy.common.metrics import (
+    CHECK_BLOCK_SECONDS,
+    COMMITMENT_TRANSITIONS,
+    REGISTRY,
+    CallbackGauge,
+    Counter,
+    Histogram,
+    Registry,
+    router,
+)
+from slasher_proxy.common.model import Block, BlockTransaction, Commitment, Transaction
+from slasher_proxy.common.tx_cache import KNOWN_TXS
+
+
+def test_exposition_format() -> None:
+    registry = Registry()
+    histogram = registry.register(
+        Histogram("h_seconds", "A histogram.", ["op"], buckets=(0.1, 1.0))
+    )
+    counter = registry.register(Counter("c", "A counter.", ["node"]))
+    registry.register(CallbackGauge("g", "A gauge.", ("q",), lambda: {("a",): 3}))
+    assert isinstance(histogram, Histogram) and isinstance(counter, Counter)
+    child = histogram.labels("x")
+    for value in (0.05, 0.1, 0.5, 7.0):
+        child.observe(value)
+    counter.labels('say "hi"').inc(2)
+
+    lines = registry.render().splitlines()
+    assert "# TYPE h_seconds histogram" in lines
+    assert 'h_seconds_bucket{op="x",le="0.1"} 2' in lines
+    assert 'h_seconds_bucket{op="x",le="1"} 3' in lines
+    assert 'h_seconds_bucket{op="x",le="+Inf"} 4' in lines
+    assert 'h_seconds_count{op="x"} 4' in lines
+    assert 'h_seconds_sum{op="x"} 7.65' in lines
+    assert 'c_total{node="say \\"hi\\""} 2' in lines
+    assert 'g{q="a"} 3' in lines
+
+
+def test_check_block_is_measured() -> None:
+    with db_session:
+        block = Block(number=1, hash=b"block1", node_id="metrics-node")
+        for order, tx_hash in enumerate((b"a", b"b"), start=1):
+            tx = Transaction(hash=tx_hash, from_address="0x1", nonce=order)
+            BlockTransaction(block=block, transaction=tx, order=order)
+            Commitment(node="metrics-node", tx_hash=tx_hash, index=order)
+        Commitment(node="metrics-node", tx_hash=b"c", index=3)
+    fulfilled = COMMITMENT_TRANSITIONS.labels("metrics-node", "fulfilled")
+    before = fulfilled.value
+    checks = sum(CHECK_BLOCK_SECONDS.labels().counts)
+
+    check_block(1)
+
+    assert fulfilled.value == before + 2
+    assert sum(CHECK_BLOCK_SECONDS.labels().counts) == checks + 1
+    with db_session:
+        assert Commitment.get(tx_hash=b"c").status == C_STATUS_PENDING
+
+    app = FastAPI()
+    app.include_router(router)
+    response = TestClient(app).get("/metrics")
+    assert response.headers["content-type"].startswith("text/plain; version=0.0.4")
+    assert (
+        'slasher_commitment_transitions_total{node="metrics-node",status="fulfilled"}'
+        in response.text
+    )
+
+
+def test_pipeline_gauges_report_the_caches() -> None:
+    app = FastAPI()
+    for name in (
+        "cluster",
+        "websocket_listener",
+        "block_notification_consumer",
+        "block_cursor",
+        "sqlite_writer",
+        "journal",
+        "deadline_scheduler",
+    ):
+        setattr(app.state, name, None)
+    app.state.async_db = AsyncDatabase(
+        "postgresql://unused", min_size=1, max_size=4, statement_cache_size=8
+    )
+    KNOWN_TXS.add(b"tx")
+    KNOWN_TXS.lookup(b"tx")
+    _register_pipeline_gauges(app)
+    try:
+        lines = REGISTRY.render().splitlines()
+    finally:
+        for name in PIPELINE_GAUGES:
+            REGISTRY.unregister(name)
+    assert 'slasher_async_db_pool_connections{state="max"} 4' in lines
+    assert 'slasher_async_db_pool_connections{state="open"} 0' in lines
+    assert 'slasher_async_db_statement_cache{stat="size"} 8' in lines
+    assert 'slasher_known_tx_cache{stat="hits"} 1' in lines
@@ -0,0 +1,55 @@
+from typing import List
+
+import asyncio
+import time
+
+import pytest
+
+from slasher_proxy.common.pipeline import Stage, run_stages
+
+
+@pytest.mark.asyncio
+async def test_stages_chain_in_order() -> None:
+    results: List[int] = []
+
+    async def collect(item: int) -> None:
+        results.append(item)
+
+    sink: Stage[int] = Stage("sink", collect)
+    double: Stage[int] = Stage(
+        "double", lambda x: x * 2, downstream=sink, blocking=True
+    )
+    runner = asyncio.create_task(run_stages(double, sink))
+    for i in range(5):
+        await double.put(i)
+    await double.queue.join()
+    await sink.queue.join()
+    runner.cancel()
+    await asyncio.gather(runner, return_exceptions=True)
+
+    assert results == [0, 2, 4, 6, 8]
+    assert double.snapshot()["processed"] == 5
+    assert sink.snapshot()["depth"] == 0
+
+
+@pytest.mark.asyncio
+async def test_bounded_queue_applies_backpressure() -> None:
+    stage: Stage[int] = Stage(
+        "slow", lambda x: time.sleep(0.01), maxsize=2, blocking=True
+    )
+    assert stage.put_nowait(1)
+    assert stage.put_nowait(2)
+    assert not stage.put_nowait(3)
+    assert stage.depth == 2
+
+
+@pytest.mark.asyncio
+async def test_stage_failure_stops_pipeline() -> None:
+    def fail(item: int) -> None:
+        raise ValueError("boom")
+
+    stage: Stage[int] = Stage("failing", fail, blocking=True)
+    await stage.put(1)
+    with pytest.raises(ValueError):
+        await asyncio.wait_for(run_stages(stage), timeout=5)
+    assert stage.snapshot()["errors"] == 1
@@ -0,0 +1,133 @@
+from typing import List
+
+import asyncio
+
+import pytest
+from pony.orm import db_session
+
+from slasher_proxy.common.checkpoint import (
+    get_last_processed_block,
+    set_last_processed_block,
+)
+from slasher_proxy.common.metrics import NOTIFIED_BLOCK_SECONDS
+from slasher_proxy.common.model import Block
+from slasher_proxy.common.postgres_notify import (
+    BlockNotificationConsumer,
+    coalesce_heights,
+    parse_block_height,
+)
+
+
+def test_parse_block_height() -> None:
+    assert parse_block_height("42") == 42
+    assert parse_block_height(" 0x2a ") == 42
+    assert parse_block_height(None) is None
+    assert parse_block_height("not-a-block") is None
+    assert parse_block_height("-1") is None
+
+
+def test_coalesce_heights() -> None:
+    assert coalesce_heights([]) == []
+    assert coalesce_heights([1, 2, 3, 5, 7, 8]) == [(1, 3), (5, 5), (7, 8)]
+
+
+async def _drain(consumer: BlockNotificationConsumer) -> None:
+    while consumer.backlog:
+        await asyncio.sleep(0.01)
+
+
+@pytest.mark.asyncio
+async def test_consumer_verifies_in_order_and_drops_duplicates() -> None:
+    verified: List[int] = []
+    observed = sum(NOTIFIED_BLOCK_SECONDS.labels().counts)
+    consumer = BlockNotificationConsumer(verified.append, gap_timeout=0.05)
+    for payload in ["12", "10", "11", "10", "0xb", "garbage", "20"]:
+        consumer.submit(payload)
+    assert consumer.backlog == 4
+
+    task = asyncio.create_task(consumer.run())
+    try:
+        await asyncio.wait_for(_drain(consumer), 5)
+        consumer.submit("11")  # already verified
+        consumer.submit("21")
+        await asyncio.wait_for(_drain(consumer), 5)
+    finally:
+        task.cancel()
+
+    assert verified == [10, 11, 12, 20, 21]
+    snapshot = consumer.snapshot()
+    assert snapshot["depth"] == 0
+    assert snapshot["processed"] == 5
+    assert snapshot["duplicates"] == 3
+    assert snapshot["invalid"] == 1
+    # 13..19 were neither notified nor stored.
+    assert snapshot["skipped"] == 7
+    assert snapshot["max_lag"] >= snapshot["last_lag"] > 0
+    assert sum(NOTIFIED_BLOCK_SECONDS.labels().counts) == observed + 5
+    assert get_last_processed_block() == 21
+
+
+@pytest.mark.asyncio
+async def test_consumer_resumes_after_checkpoint_and_retries_failures() -> None:
+    set_last_processed_block(5)
+    verified: List[int] = []
+    failures = [7]
+
+    def verify(height: int) -> None:
+        if height in failures:
+            failures.remove(height)
+            raise RuntimeError("database went away")
+        verified.append(height)
+
+    consumer = BlockNotificationConsumer(verify)
+    consumer.backoff.base = consumer.backoff.cap = 0.01
+    task = asyncio.create_task(consumer.run())
+    try:
+        await asyncio.sleep(0.05)
+        for payload in ["5", "6", "7", "8"]:
+            consumer.submit(payload)
+        await asyncio.wait_for(_drain(consumer), 5)
+    finally:
+        task.cancel()
+
+    assert verified == [6, 7, 8]
+    assert consumer.metrics.errors == 1
+    assert consumer.duplicates == 1
+
+
+@pytest.mark.asyncio
+async def test_consumer_waits_for_a_late_notification() -> None:
+    verified: List[int] = []
+    consumer = BlockNotificationConsumer(verified.append)
+    task = asyncio.create_task(consumer.run())
+    try:
+        consumer.submit("10")
+        consumer.submit("12")
+        await asyncio.sleep(0.1)
+        assert verified == [10]
+        consumer.submit("11")
+        await asyncio.wait_for(_drain(consumer), 5)
+    finally:
+        task.cancel()
+
+    assert verified == [10, 11, 12]
+    assert consumer.duplicates == 0
+
+
+@pytest.mark.asyncio
+async def test_consumer_backfills_stored_blocks_after_the_checkpoint() -> None:
+    set_last_processed_block(5)
+    with db_session:
+        for number in (6, 7):
+            Block(number=number, hash=b"block%d" % number, node_id="node")
+    verified: List[int] = []
+    consumer = BlockNotificationConsumer(verified.append)
+    task = asyncio.create_task(consumer.run())
+    try:
+        consumer.submit("8")
+        await asyncio.wait_for(_drain(consumer), 5)
+    finally:
+        task.cancel()
+
+    assert verified == [6, 7, 8]
+    assert consumer.backfilled == 2
@@ -1,13 +1,20 @@
 from types import TracebackType
-from typing import Any, Dict, Optional, Type
+from typing import Any, Dict, Optional, Tuple, Type
+
+import asyncio
+import time
 
 import aiohttp
 import pytest
 from fastapi import FastAPI
 from fastapi.testclient import TestClient
+from pony.orm import db_session
 
 from slasher_proxy.avalanche.proxy_router import router
+from slasher_proxy.common import UNKNOWN_SENDER
+from slasher_proxy.common.model import Commitment, NodeStats, Transaction
 from slasher_proxy.common.settings import SlasherRpcProxySettings, get_settings
+from slasher_proxy.common.tx_cache import KNOWN_TXS
 
 
 # Dummy settings for testing.
@@ -57,7 +64,7 @@ class DummyClientSession:
         self,
         json_data: Optional[Dict[str, Any]] = None,
         *,
-        raise_exception: bool = False
+        raise_exception: bool = False,
     ) -> None:
         self._json_data = json_data or {}
         self.raise_exception = raise_exception
@@ -156,3 +163,102 @@ def test_forwarding_exception(monkeypatch: Any) -> None:
     assert response.status_code == 500
     detail = response.json()["detail"]
     assert "Error forwarding to validator" in detail
+
+
+def test_successful_submission_records_transaction(override_aiohttp: Any) -> None:
+    client = TestClient(app)
+
+    body = {"method": "eth_sendRawTransaction", "params": ["0xdeadbeef"]}
+    response = client.post("/eth_sendRawTransaction", json=body)
+    assert response.status_code == 200
+
+    tx_hash = bytes.fromhex("abcdef")
+    assert KNOWN_TXS.lookup(tx_hash) is True
+    with db_session:
+        txn = Transaction.get(hash=tx_hash)
+        assert txn is not None and txn.from_address == UNKNOWN_SENDER
+        assert Commitment.select().count() == 1
+
+
+def test_duplicate_submission_is_recorded_once(override_aiohttp: Any) -> None:
+    client = TestClient(app)
+
+    body = {"method": "eth_sendRawTransaction", "params": ["0xdeadbeef"]}
+    for _ in range(2):
+        assert client.post("/eth_sendRawTransaction", json=body).status_code == 200
+    with db_session:
+        assert Commitment.select().count() == 1
+        assert NodeStats.get(node="avalanche").total_transactions == 1
+
+
+class SlowResponse(DummyResponse):
+    def __init__(self, json_data: Dict[str, Any], delay: float) -> None:
+        super().__init__(json_data)
+        self.delay = delay
+
+    async def json(self) -> Dict[str, Any]:
+        await asyncio.sleep(self.delay)
+        return self._json_data
+
+
+class FanOutSession(DummyClientSession):
+    # Per validator URL: the response and how long it takes.
+    responses: Dict[str, Tuple[Dict[str, Any], float]] = {}
+
+    def post(self, url: str, json: Dict[str, Any]) -> DummyResponse:
+        return SlowResponse(*self.responses[url])
+
+
+def _accept(index: int) -> Dict[str, Any]:
+    return {"result": {"txHash": "0xabcdef", "commitment": "0x12", "txIndex": index}}
+
+
+def _fan_out_to(monkeypatch: Any, quorum: int, **responses: Any) -> None:
+    FanOutSession.responses = {f"http://{node}": r for node, r in responses.items()}
+    monkeypatch.setattr(aiohttp, "ClientSession", FanOutSession)
+    settings = DummySettings(
+        blocks_websocket_url="ws://localhost:8546",
+        fanout_validators={node: f"http://{node}" for node in responses},
+        fanout_quorum=quorum,
+    )
+    monkeypatch.setitem(app.dependency_overrides, get_settings, lambda: settings)
+
+
+def _commitments(expected: int) -> Dict[str, int]:
+    deadline = time.monotonic() + 5
+    while True:
+        with db_session:
+            indexes = {c.node: c.index for c in Commitment.select()}
+        if len(indexes) >= expected or time.monotonic() > deadline:
+            return indexes
+        time.sleep(0.02)
+
+
+def test_fan_out_answers_after_the_first_acceptance(monkeypatch: Any) -> None:
+    rejected = {"error": {"message": "nonce too low"}}
+    _fan_out_to(
+        monkeypatch, 1, a=(_accept(5), 0.0), b=(rejected, 0.0), c=(_accept(9), 1.0)
+    )
+    body = {"method": "eth_sendRawTransaction", "params": ["0xdeadbeef"]}
+    with TestClient(app) as client:
+        started = time.monotonic()
+        response = client.post("/eth_sendRawTransaction", json=body)
+        assert response.status_code == 200
+        assert response.json()["result"]["txIndex"] == 5
+        assert time.monotonic() - started < 1.0
+        # The slower validator is recorded after the client got its answer.
+        assert _commitments(2) == {"a": 5, "c": 9}
+
+
+def test_fan_out_without_a_quorum(monkeypatch: Any) -> None:
+    rejected = {"error": {"message": "nonce too low"}}
+    _fan_out_to(
+        monkeypatch, 2, a=(_accept(5), 0.0), b=(rejected, 0.0), c=(rejected, 0.1)
+    )
+    body = {"method": "eth_sendRawTransaction", "params": ["0xdeadbeef"]}
+    with TestClient(app) as client:
+        response = client.post("/eth_sendRawTransaction", json=body)
+    assert response.status_code == 400
+    assert "nonce too low" in response.json()["detail"]
+    # The acceptance is evidence all the same.
+    assert _commitments(1) == {"a": 5}
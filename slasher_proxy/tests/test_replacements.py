@@ -0,0 +1,137 @@
+from typing import Generator, List, Union
+
+import pytest
+from pony.orm import db_session
+
+from slasher_proxy.avalanche.block_checker import check_block
+from slasher_proxy.avalanche.block_parser import parse_and_save_block
+from slasher_proxy.avalanche.block_stream import CompactBlock, CompactTransaction
+from slasher_proxy.avalanche.capture import (
+    Submission,
+    decode_submission,
+    encode_submission,
+)
+from slasher_proxy.avalanche.decode import transaction_nonce
+from slasher_proxy.avalanche.proxy_router import _find_replaced, store_submission
+from slasher_proxy.avalanche.replacements import (
+    ReplacementDetector,
+    set_replacement_detector,
+)
+from slasher_proxy.common import C_STATUS_FULFILLED, C_STATUS_REVOKED
+from slasher_proxy.common.model import Commitment, Transaction
+
+# A signed legacy transfer with nonce 9, from the EIP-155 example.
+LEGACY_TX = bytes.fromhex(
+    "f86c098504a817c800825208943535353535353535353535353535353535353535880de0b6b3"
+    "a76400008025a028ef61340bd939bc2195fe537567866003e1a15d3c71ff63e1590620aa6362"
+    "76a067cbe9d8997f761aecb703304b3800ccf555c9f3dc64214b297fb1966a3b6d83"
+)
+
+
+def _rlp(item: Union[bytes, List[bytes]]) -> bytes:
+    def prefix(length: int, base: int) -> bytes:
+        if length < 56:
+            return bytes([base + length])
+        size = length.to_bytes((length.bit_length() + 7) // 8, "big")
+        return bytes([base + 55 + len(size)]) + size
+
+    if isinstance(item, list):
+        payload = b"".join(_rlp(i) for i in item)
+        return prefix(len(payload), 0xC0) + payload
+    if len(item) == 1 and item[0] < 0x80:
+        return item
+    return prefix(len(item), 0x80) + item
+
+
+@pytest.fixture
+def detector() -> Generator[ReplacementDetector, None, None]:
+    detector = ReplacementDetector(max_size=3)
+    set_replacement_detector(detector)
+    yield detector
+    set_replacement_detector(None)
+
+
+def _tx(n: int) -> bytes:
+    return n.to_bytes(32, "big")
+
+
+def test_transaction_nonce() -> None:
+    assert transaction_nonce(LEGACY_TX) == 9
+    fields = [b"\xa8\x68", (1000).to_bytes(2, "big"), b"\x01", b"", b"x" * 60]
+    assert transaction_nonce(b"\x02" + _rlp(fields)) == 1000
+    for malformed in (b"", b"\x02", LEGACY_TX[:-1], b"\x85abc"):
+        with pytest.raises(ValueError):
+            transaction_nonce(malformed)
+
+
+def test_detector_index(detector: ReplacementDetector) -> None:
+    assert detector.observe("0xAB", 1, _tx(1)) is None
+    assert detector.observe("0xab", 1, _tx(1)) is None
+    assert detector.observe("0xab", 1, _tx(2)) == _tx(1)
+    assert detector.observe("0xab", 2, _tx(3)) is None
+    mined = [CompactTransaction(0, _tx(4), "0xab", 1)]
+    assert detector.find(mined) == {_tx(4): _tx(2)}
+    detector.evict(mined)
+    assert detector.find(mined) == {}
+    # The oldest entries go beyond max_size.
+    for nonce in range(3, 6):
+        detector.observe("0xab", nonce, _tx(nonce + 10))
+    assert len(detector) == 3
+    assert detector.find([CompactTransaction(0, _tx(5), "0xab", 2)]) == {}
+
+
+def test_replacements_are_stored_and_revoked(detector: ReplacementDetector) -> None:
+    # Submitted: a replaced by b; c, which a block transaction d replaces.
+    store_submission("node", _tx(1), 1, b"c1")
+    detector.observe("0xab", 1, _tx(1))
+    replaced = detector.observe("0xab", 1, _tx(2))
+    store_submission("node", _tx(2), 2, b"c2", replaced)
+    store_submission("node", _tx(3), 3, b"c3")
+    detector.observe("0xcd", 7, _tx(3))
+
+    block = CompactBlock(
+        b"block1",
+        1,
+        [
+            CompactTransaction(0, _tx(2), "0xab", 1),
+            CompactTransaction(1, _tx(4), "0xcd", 7),
+        ],
+    )
+    parse_and_save_block(block, "node")
+    assert len(detector) == 0
+    check_block(1)
+    with db_session:
+        assert Transaction.get(hash=_tx(2)).replaces == _tx(1)
+        assert Transaction.get(hash=_tx(4)).replaces == _tx(3)
+        statuses = {c.tx_hash: c.status for c in Commitment.select()}
+    assert statuses[_tx(1)] == C_STATUS_REVOKED
+    assert statuses[_tx(2)] == C_STATUS_FULFILLED
+    assert statuses[_tx(3)] == C_STATUS_REVOKED
+
+
+def test_submission_records_keep_replaces() -> None:
+    for submission in (
+        Submission("node", _tx(2), 5, b"c", _tx(1)),
+        Submission("node", _tx(2), 5, b"c"),
+    ):
+        assert decode_submission(encode_submission(submission)) == submission
+
+
+def test_find_replaced_decodes_the_signer(detector: ReplacementDetector) -> None:
+    account = pytest.importorskip("eth_account").Account.create()
+    raw_txs = [
+        account.sign_transaction(
+            {
+                "to": account.address,
+                "value": value,
+                "gas": 21000,
+                "gasPrice": 1,
+                "nonce": 3,
+                "chainId": 43112,
+            }
+        ).raw_transaction
+        for value in (1, 2)
+    ]
+    assert _find_replaced(detector, "0x" + bytes(raw_txs[0]).hex(), _tx(1)) is None
+    assert _find_replaced(detector, "0x" + bytes(raw_txs[1]).hex(), _tx(2)) == _tx(1)
+    assert _find_replaced(detector, "0xzz", _tx(3)) is None
@@ -0,0 +1,99 @@
+from typing import Any, Generator
+
+import sqlite3
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from pony.orm import db_session
+
+from slasher_proxy.avalanche.query_router import READ_SOURCE_HEADER, router
+from slasher_proxy.common import C_STATUS_OMITTED, db
+from slasher_proxy.common.checkpoint import (
+    LAST_PROCESSED_BLOCK_KEY,
+    set_last_processed_block,
+)
+from slasher_proxy.common.model import Commitment, NodeStats, Transaction
+from slasher_proxy.common.replica import (
+    ReadRouter,
+    bind_database,
+    get_read_router,
+    set_read_router,
+)
+
+app = FastAPI()
+app.include_router(router)
+
+
+@pytest.fixture
+def replica_file(tmp_path: Any) -> Generator[str, None, None]:
+    path = str(tmp_path / "replica.sqlite")
+    with sqlite3.connect(path) as con:
+        con.executescript(db.schema.generate_create_script())
+        con.execute(
+            "INSERT INTO auxiliarydata VALUES (?, '9')", (LAST_PROCESSED_BLOCK_KEY,)
+        )
+        con.execute("INSERT INTO nodestats VALUES ('n', 5, 0, 0, '2025-01-01')")
+    default_router = get_read_router()
+    yield path
+    set_read_router(default_router)
+
+
+def _set_replica_height(path: str, height: int) -> None:
+    with sqlite3.connect(path) as con:
+        con.execute("UPDATE auxiliarydata SET value = ?", (str(height),))
+
+
+def test_reads_follow_replica_lag(replica_file: str) -> None:
+    with db_session:
+        NodeStats(node="n", total_transactions=7)
+    set_last_processed_block(10)
+    read_router = ReadRouter(
+        replica=bind_database(f"sqlite://{replica_file}"),
+        max_lag_blocks=2,
+        check_interval=0,
+    )
+    set_read_router(read_router)
+    client = TestClient(app)
+
+    response = client.get("/stats/n")
+    assert response.headers[READ_SOURCE_HEADER] == "replica"
+    assert response.json()["total_transactions"] == 5
+    assert read_router.lag_blocks == 1
+
+    _set_replica_height(replica_file, 5)
+    response = client.get("/stats/n")
+    assert response.headers[READ_SOURCE_HEADER] == "primary"
+    assert response.json()["total_transactions"] == 7
+    assert read_router.stats()["lag_blocks"] == 5
+
+    _set_replica_height(replica_file, 10)
+    with sqlite3.connect(replica_file) as con:
+        con.execute("DROP TABLE nodestats")
+    response = client.get("/stats/n")
+    assert response.headers[READ_SOURCE_HEADER] == "primary"
+    assert read_router.fallbacks == 1
+
+
+def test_status_and_evidence_lookups() -> None:
+    with db_session:
+        Transaction(hash=b"\x01\x02", from_address="0xa", nonce=3)
+        Commitment(node="n", tx_hash=b"\x01\x02", index=4, status=C_STATUS_OMITTED)
+    client = TestClient(app)
+
+    response = client.get("/transactions/0x0102")
+    assert response.status_code == 200
+    assert response.headers[READ_SOURCE_HEADER] == "primary"
+    body = response.json()
+    assert body["nonce"] == 3
+    assert body["commitments"] == [
+        {"node": "n", "index": 4, "status": C_STATUS_OMITTED}
+    ]
+    assert client.get("/transactions/0x0103").status_code == 404
+    assert client.get("/transactions/0xzz").status_code == 400
+
+    evidence = client.get("/evidence/n").json()
+    assert [(e["index"], e["tx_hash"]) for e in evidence] == [(4, "0x0102")]
+    assert client.get("/stats/n").json()["commitments_by_status"] == {
+        str(C_STATUS_OMITTED): 1
+    }
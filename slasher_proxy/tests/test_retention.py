@@ -0,0 +1,112 @@
+from datetime import datetime, timedelta
+
+from pony.orm import db_session
+
+from slasher_proxy.common import (
+    C_STATUS_FULFILLED,
+    C_STATUS_OMITTED,
+    C_STATUS_PENDING,
+    C_STATUS_REVOKED,
+)
+from slasher_proxy.common.checkpoint import set_last_processed_block
+from slasher_proxy.common.model import (
+    Block,
+    BlockTransaction,
+    Commitment,
+    CommitmentArchive,
+    CommitmentSummary,
+    Transaction,
+)
+from slasher_proxy.common.retention import (
+    archive_commitments,
+    retention_cutoff,
+    run_retention,
+)
+
+START = datetime(2025, 1, 1)
+
+
+@db_session
+def _populate() -> None:
+    # Blocks 1..10, one minute apart, one transaction each.
+    for number in range(1, 11):
+        block = Block(
+            number=number,
+            hash=b"block%d" % number,
+            node_id="node",
+            created_at=START + timedelta(minutes=number),
+        )
+        tx = Transaction(hash=b"tx%d" % number, from_address="0xa", nonce=number)
+        BlockTransaction(block=block, transaction=tx, order=1)
+    statuses = [
+        C_STATUS_FULFILLED,
+        C_STATUS_FULFILLED,
+        C_STATUS_REVOKED,
+        C_STATUS_OMITTED,
+        C_STATUS_PENDING,
+        C_STATUS_FULFILLED,  # created after the cutoff block
+    ]
+    for i, status in enumerate(statuses):
+        Commitment(
+            node="node" if i != 1 else "other",
+            tx_hash=b"tx%d" % (i + 1),
+            index=i + 1,
+            status=status,
+            created_at=START + timedelta(minutes=i + 1, seconds=-30 if i < 5 else 90),
+        )
+
+
+def test_cutoff_needs_processed_blocks() -> None:
+    _populate()
+    assert retention_cutoff(3) is None
+    set_last_processed_block(10)
+    assert retention_cutoff(3) == (7, START + timedelta(minutes=7))
+    assert retention_cutoff(20) is None
+
+
+def test_run_retention_archives_resolved_commitments_in_batches() -> None:
+    _populate()
+    set_last_processed_block(10)
+    assert run_retention(keep_blocks=4, batch_size=2) == {"archived": 3, "pruned": 6}
+
+    with db_session:
+        left = sorted((c.index, c.status) for c in Commitment.select())
+        assert left == [(4, C_STATUS_OMITTED), (5, C_STATUS_PENDING), (6, 2)]
+        assert CommitmentArchive.select().count() == 3
+        summaries = {(s.node, s.status): s.count for s in CommitmentSummary.select()}
+        assert summaries == {
+            ("node", C_STATUS_FULFILLED): 1,
+            ("other", C_STATUS_FULFILLED): 1,
+            ("node", C_STATUS_REVOKED): 1,
+        }
+        assert sorted(bt.block.number for bt in BlockTransaction.select()) == [
+            7,
+            8,
+            9,
+            10,
+        ]
+        assert Transaction.select().count() == 10
+
+    # Summaries accumulate over runs.
+    with db_session:
+        Commitment.get(index=4).status = C_STATUS_REVOKED
+    assert run_retention(keep_blocks=4, max_batches=1)["archived"] == 1
+    with db_session:
+        assert CommitmentSummary.get(node="node", status=C_STATUS_REVOKED).count == 2
+
+
+def test_archive_batches_continue_after_the_last_id() -> None:
+    _populate()
+    cutoff = START + timedelta(minutes=7)
+    archived, last_id = archive_commitments(cutoff, batch_size=1)
+    assert archived == 1
+    with db_session:
+        assert CommitmentArchive.select().first().index == 1
+    # Rows up to last_id are not considered again, whatever their status.
+    with db_session:
+        Commitment.get(index=4).status = C_STATUS_REVOKED
+        last_id = Commitment.get(index=4).id
+    assert archive_commitments(cutoff, batch_size=10, after_id=last_id) == (
+        0,
+        last_id,
+    )
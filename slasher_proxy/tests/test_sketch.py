@@ -2,6 +2,7 @@ import hashlib
 
 import pytest
 
+from slasher_proxy.bench.accumulator import PackedCountingBloomFilter
 from slasher_proxy.common.sketch import CountingBloomFilterAccumulator
 
 
@@ -112,3 +113,21 @@ def test_from_bytes_with_different_parameters() -> None:
         CountingBloomFilterAccumulator.from_bytes(
             state_bytes, num_counters=16, num_hashes=1, counter_size=2
         )
+
+
+def test_packed_variant_matches_the_baseline() -> None:
+    """The benchmarked packed filter hashes and serializes like the shipped one."""
+    salt = b"\x01" * 16
+    baseline = CountingBloomFilterAccumulator(num_counters=32, num_hashes=2, salt=salt)
+    packed = PackedCountingBloomFilter(num_counters=32, num_hashes=2, salt=salt)
+    for n in range(20):
+        baseline.add_transaction(tx_hash(b"tx%d" % n))
+        packed.add_transaction(tx_hash(b"tx%d" % n))
+    packed.delete_transaction(tx_hash(b"tx3"))
+    baseline.delete_transaction(tx_hash(b"tx3"))
+    state = baseline.to_bytes()
+    assert packed.to_bytes() == state
+    restored = PackedCountingBloomFilter.from_bytes(state, 32, 2)
+    assert restored.counters == baseline.counters
+    with pytest.raises(ValueError):
+        PackedCountingBloomFilter.from_bytes(state, 16, 2)
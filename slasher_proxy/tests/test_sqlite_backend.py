@@ -0,0 +1,156 @@
+from typing import Any, List
+
+import threading
+
+import pytest
+from pony import orm
+from pony.orm import db_session
+from pydantic import ValidationError
+
+from slasher_proxy.avalanche.block_parser import save_block
+from slasher_proxy.avalanche.block_stream import CompactBlock, CompactTransaction
+from slasher_proxy.avalanche.proxy_router import store_submission
+from slasher_proxy.common.block_cursor import BlockCursor
+from slasher_proxy.common.checkpoint import get_last_processed_block
+from slasher_proxy.common.database import (
+    configure_sqlite,
+    is_sqlite_dsn,
+    sqlite_filename,
+)
+from slasher_proxy.common.model import Block, Commitment, NodeStats, Transaction
+from slasher_proxy.common.settings import SlasherRpcProxySettings
+from slasher_proxy.common.sqlite_writer import SqliteWriter
+from slasher_proxy.common.tx_cache import KNOWN_TXS
+
+
+def test_sqlite_dsn() -> None:
+    assert is_sqlite_dsn("sqlite:///var/lib/slasher/proxy.db")
+    assert not is_sqlite_dsn("postgresql://user:pw@localhost/db")
+    assert sqlite_filename("sqlite:///var/lib/slasher/proxy.db") == (
+        "/var/lib/slasher/proxy.db"
+    )
+
+    settings = SlasherRpcProxySettings.model_validate(
+        {"dsn": "sqlite:///tmp/proxy.db", "rpc_url": "http://node"}
+    )
+    assert settings.blocks_polling
+    with pytest.raises(ValidationError):
+        SlasherRpcProxySettings.model_validate(
+            {
+                "dsn": "sqlite:///tmp/proxy.db",
+                "rpc_url": "http://node",
+                "blocks_channel": "new_block",
+            }
+        )
+
+
+def _pragma(database: orm.Database, name: str) -> Any:
+    return database.execute(f"PRAGMA {name}").fetchone()[0]
+
+
+def test_pragmas_are_set_on_connect(tmp_path: Any) -> None:
+    database = orm.Database()
+    configure_sqlite(database, mmap_size=1 << 20, cache_size_kib=2048)
+    database.bind(provider="sqlite", filename=str(tmp_path / "p.db"), create_db=True)
+    database.generate_mapping(create_tables=False)
+    with db_session:
+        assert _pragma(database, "journal_mode") == "wal"
+        assert _pragma(database, "synchronous") == 1  # NORMAL
+        assert _pragma(database, "mmap_size") == 1 << 20
+        assert _pragma(database, "cache_size") == -2048
+
+
+def _block_writer(writer: SqliteWriter) -> threading.Event:
+    """Hold the writer in a batch of its own until the returned event is set."""
+    started, release = threading.Event(), threading.Event()
+
+    def hold() -> None:
+        started.set()
+        release.wait()
+
+    writer.submit(hold)
+    assert started.wait(5)
+    return release
+
+
+@db_session
+def _add_node(node: str) -> str:
+    NodeStats(node=node, total_transactions=1)
+    return node
+
+
+def test_writer_commits_queued_writes_together() -> None:
+    writer = SqliteWriter().start()
+    try:
+        release = _block_writer(writer)
+        futures = [writer.submit(_add_node, f"n{i}") for i in range(5)]
+        release.set()
+        assert [f.result(timeout=5) for f in futures] == [f"n{i}" for i in range(5)]
+    finally:
+        writer.stop()
+    assert writer.stats()["batches"] == 2
+    assert writer.stats()["largest_batch"] == 5
+    with db_session:
+        assert NodeStats.select().count() == 5
+
+
+def test_failed_write_does_not_roll_back_its_batch() -> None:
+    writer = SqliteWriter().start()
+    try:
+        release = _block_writer(writer)
+        ok = writer.submit(_add_node, "a")
+        # The second insert of the same primary key fails.
+        duplicate = writer.submit(_add_node, "a")
+        other = writer.submit(_add_node, "b")
+        release.set()
+        assert ok.result(timeout=5) == "a"
+        assert other.result(timeout=5) == "b"
+        with pytest.raises(Exception):
+            duplicate.result(timeout=5)
+    finally:
+        writer.stop()
+    assert writer.errors == 1
+    with db_session:
+        assert {s.node for s in NodeStats.select()} == {"a", "b"}
+
+
+def test_writes_retry_integrity_errors_on_the_writer() -> None:
+    # Stored, but unknown to the cache, as after a restart: the first
+    # attempts insert the transaction again and retry with a lookup.
+    store_submission("a", b"tx1", 1, b"c1")
+    KNOWN_TXS.clear()
+    writer = SqliteWriter().start()
+    try:
+        release = _block_writer(writer)
+        submission = writer.submit(store_submission, "b", b"tx1", 1, b"c2")
+        other = writer.submit(_add_node, "c")
+        release.set()
+        submission.result(timeout=5)
+        assert other.result(timeout=5) == "c"
+        KNOWN_TXS.clear()
+        block = CompactBlock(b"block1", 1, [CompactTransaction(0, b"tx1", "0xab", 1)])
+        writer.call(save_block, block, "node")
+    finally:
+        writer.stop()
+    assert writer.errors == 0
+    with db_session:
+        assert Commitment.select().count() == 2
+        assert Transaction.get(hash=b"tx1").from_address == "0xab"
+
+
+def test_cursor_verifies_and_checkpoints_on_the_writer() -> None:
+    with db_session:
+        Block(number=1, hash=b"block1", node_id="node")
+    threads: List[str] = []
+    writer = SqliteWriter().start()
+    try:
+        cursor = BlockCursor(
+            lambda number: threads.append(threading.current_thread().name),
+            run_write=writer.call,
+        )
+        assert cursor.poll() == 1
+    finally:
+        writer.stop()
+    assert threads == ["sqlite-writer"]
+    assert writer.stats()["writes"] == 1
+    assert get_last_processed_block() == 1
@@ -0,0 +1,105 @@
+from typing import Any, Dict
+
+import threading
+import time
+
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from slasher_proxy.common.profiler import collapse
+from slasher_proxy.common.profiler import router as profiler_router
+from slasher_proxy.common.profiler import sample_stacks
+from slasher_proxy.common.settings import SlasherRpcProxySettings, get_settings
+from slasher_proxy.common.timing import DB, PARSE, stage, stage_timing_middleware
+
+
+def _app(**middleware_args: Any) -> FastAPI:
+    app = FastAPI()
+    app.middleware("http")(stage_timing_middleware(**middleware_args))
+
+    @app.get("/async")
+    async def async_endpoint() -> Dict[str, bool]:
+        with stage(PARSE):
+            pass
+        with stage(DB):
+            time.sleep(0.002)
+        return {"ok": True}
+
+    @app.get("/sync")
+    def sync_endpoint() -> Dict[str, bool]:
+        # Runs in the threadpool, which gets a copy of the request context.
+        with stage(DB):
+            time.sleep(0.002)
+        with stage(DB):
+            pass
+        return {"ok": True}
+
+    return app
+
+
+def _durations(header: str) -> Dict[str, float]:
+    entries = (entry.split(";dur=") for entry in header.split(", "))
+    return {name: float(ms) for name, ms in entries}
+
+
+def test_server_timing_header() -> None:
+    client = TestClient(_app(server_timing=True))
+    timings = _durations(client.get("/async").headers["Server-Timing"])
+    assert list(timings) == [PARSE, DB, "total"]
+    assert timings[DB] >= 2.0
+    assert timings["total"] >= timings[DB]
+
+    timings = _durations(client.get("/sync").headers["Server-Timing"])
+    assert list(timings) == [DB, "total"]
+    assert timings[DB] >= 2.0
+
+    assert "Server-Timing" not in TestClient(_app()).get("/async").headers
+
+
+def test_stage_outside_a_request() -> None:
+    with stage(DB) as timed:
+        pass
+    assert timed.started > 0
+
+
+def _spin(stop: threading.Event) -> None:
+    while not stop.is_set():
+        time.sleep(0.001)
+
+
+def test_sample_stacks() -> None:
+    stop = threading.Event()
+    thread = threading.Thread(target=_spin, args=(stop,), name="spinner")
+    thread.start()
+    try:
+        counts = sample_stacks(0.05, interval=0.005)
+    finally:
+        stop.set()
+        thread.join()
+    spinner = [s for s in counts if s.startswith("spinner;")]
+    assert spinner
+    assert spinner[0].endswith(f"{__name__}:_spin")
+    lines = collapse(counts).splitlines()
+    stack, count = lines[0].rsplit(" ", 1)
+    assert int(count) == max(counts.values())
+
+
+def test_profile_endpoint_requires_the_admin_token() -> None:
+    app = FastAPI()
+    app.include_router(profiler_router)
+    settings = SlasherRpcProxySettings.model_validate(
+        {"dsn": "sqlite:///tmp/proxy.db", "rpc_url": "http://node"}
+    )
+    app.dependency_overrides[get_settings] = lambda: settings
+    client = TestClient(app)
+    assert client.get("/admin/profile").status_code == 404
+
+    settings.admin_token = "secret"
+    assert client.get("/admin/profile").status_code == 403
+    response = client.get(
+        "/admin/profile",
+        params={"seconds": 0.02},
+        headers={"X-Admin-Token": "secret"},
+    )
+    assert response.status_code == 200
+    assert response.text.endswith("\n")
@@ -0,0 +1,127 @@
+from pony.orm import db_session
+
+from slasher_proxy.avalanche.block_parser import save_block
+from slasher_proxy.avalanche.block_stream import CompactBlock, CompactTransaction
+from slasher_proxy.avalanche.proxy_router import store_submission
+from slasher_proxy.common import T_STATUS_IN_BLOCK, UNKNOWN_SENDER
+from slasher_proxy.common.model import BlockTransaction, Commitment, Transaction
+from slasher_proxy.common.tx_cache import (
+    KNOWN_TXS,
+    BloomFilter,
+    KnownTxCache,
+    warm_known_tx_cache,
+)
+
+
+def _hash(i: int) -> bytes:
+    return i.to_bytes(32, "big")
+
+
+def test_bloom_filter_has_no_false_negatives() -> None:
+    bloom = BloomFilter(1000)
+    for i in range(1000):
+        bloom.add(_hash(i))
+    assert all(_hash(i) in bloom for i in range(1000))
+    false_positives = sum(_hash(i) in bloom for i in range(1000, 11000))
+    assert false_positives < 300
+
+
+def test_cache_lookup_states() -> None:
+    cache = KnownTxCache(capacity=2)
+    assert cache.lookup(_hash(1)) is False
+    cache.add_many([_hash(1), _hash(2), _hash(3)])
+    assert len(cache) == 2
+    assert cache.lookup(_hash(3)) is True
+    # Evicted from the LRU but still remembered by the Bloom filter.
+    assert cache.lookup(_hash(1)) is None
+    assert cache.stats() == {
+        "size": 2,
+        "capacity": 2,
+        "hits": 1,
+        "misses": 1,
+        "negatives": 1,
+    }
+
+
+def test_cache_without_trusted_negatives() -> None:
+    cache = KnownTxCache(capacity=2)
+    cache.trust_negatives = False
+    assert cache.lookup(_hash(1)) is None
+    cache.add(_hash(1))
+    assert cache.lookup(_hash(1)) is True
+    assert cache.stats()["negatives"] == 0
+
+
+def test_cache_evicts_least_recently_used() -> None:
+    cache = KnownTxCache(capacity=2)
+    cache.add(_hash(1))
+    cache.add(_hash(2))
+    cache.lookup(_hash(1))
+    cache.add(_hash(3))
+    assert cache.lookup(_hash(1)) is True
+    assert cache.lookup(_hash(2)) is None
+
+
+def test_cache_rebuilds_bloom_filter() -> None:
+    cache = KnownTxCache(capacity=4)
+    for i in range(100):
+        cache.add(_hash(i))
+    assert [cache.lookup(_hash(i)) for i in range(96, 100)] == [True] * 4
+    assert cache.lookup(_hash(0)) is False
+
+
+def test_save_block_fills_cache_and_links_known_transactions() -> None:
+    with db_session:
+        Transaction(hash=_hash(1), from_address=UNKNOWN_SENDER, nonce=0)
+    KNOWN_TXS.add(_hash(1))
+
+    block = CompactBlock(
+        b"block",
+        7,
+        [
+            CompactTransaction(0, _hash(1), "0xsender", 5),
+            CompactTransaction(1, _hash(2), "0xother", 1),
+        ],
+    )
+    assert save_block(block, "node") == {"height": 7, "transaction_count": 2}
+    assert KNOWN_TXS.lookup(_hash(2)) is True
+
+    with db_session:
+        submitted = Transaction.get(hash=_hash(1))
+        assert (submitted.from_address, submitted.nonce) == ("0xsender", 5)
+        assert BlockTransaction.select().count() == 2
+
+
+def test_save_block_retries_when_cache_misses_stored_transaction() -> None:
+    # Stored by someone else, so the cache gives a Bloom negative.
+    with db_session:
+        Transaction(hash=_hash(1), from_address="0xsender", nonce=0)
+
+    block = CompactBlock(b"block", 8, [CompactTransaction(0, _hash(1), "0xs", 0)])
+    assert save_block(block, "node")["transaction_count"] == 1
+    with db_session:
+        assert BlockTransaction.select().count() == 1
+
+
+def test_submission_retries_when_cache_misses_stored_transaction() -> None:
+    # Stored before a restart, or evicted from the cache since.
+    with db_session:
+        Transaction(hash=_hash(1), from_address="0xsender", nonce=3)
+    assert KNOWN_TXS.lookup(_hash(1)) is False
+
+    store_submission("node", _hash(1), 1, b"c")
+    with db_session:
+        assert Transaction.get(hash=_hash(1)).nonce == 3
+        assert Commitment.get(node="node", tx_hash=_hash(1)).index == 1
+
+
+def test_warm_known_tx_cache_loads_submitted_transactions() -> None:
+    with db_session:
+        Transaction(hash=_hash(1), from_address="0xa", nonce=0)
+        Transaction(
+            hash=_hash(2), from_address="0xa", nonce=1, status=T_STATUS_IN_BLOCK
+        )
+    cache = KnownTxCache(capacity=10)
+    warm_known_tx_cache(cache)
+    assert cache.lookup(_hash(1)) is True
+    assert cache.lookup(_hash(2)) is not True
@@ -0,0 +1,80 @@
+from typing import Any, List
+
+import pytest
+from pony.orm import db_session
+
+from slasher_proxy.common import db
+from slasher_proxy.common import upgrade as upgrade_module
+from slasher_proxy.common.model import AuxiliaryData
+from slasher_proxy.common.upgrade import (
+    BASE_DB_VERSION,
+    CURRENT_DB_VERSION,
+    DB_VERSION_KEY,
+    MIGRATION_PROGRESS_KEY,
+    NETWORK_NAME_KEY,
+    CreateIndex,
+    check_db_version,
+    upgrade_db,
+)
+
+
+@db_session
+def _value(key: str) -> Any:
+    entry = AuxiliaryData.get(key=key)
+    return entry.value if entry else None
+
+
+@db_session
+def _indexes() -> List[str]:
+    return list(db.select("SELECT name FROM sqlite_master WHERE type = 'index'"))
+
+
+def test_new_database_is_migrated_to_current_version() -> None:
+    check_db_version("avalanche")
+    assert _value(DB_VERSION_KEY) == CURRENT_DB_VERSION
+    assert _value(NETWORK_NAME_KEY) == "avalanche"
+    assert not _value(MIGRATION_PROGRESS_KEY)
+    indexes = _indexes()
+    assert "idx_commitment__pending_node_index" in indexes
+    assert "idx_transaction__from_address_nonce" in indexes
+
+
+def test_partial_index_statement() -> None:
+    step = CreateIndex("idx", "commitment", "node", where="status = 0")
+    assert step.statements("postgres") == [
+        "CREATE INDEX CONCURRENTLY IF NOT EXISTS idx ON commitment (node)"
+        " WHERE status = 0"
+    ]
+    assert not step.transactional("postgres")
+    assert step.statements("sqlite") == [
+        "CREATE INDEX IF NOT EXISTS idx ON commitment (node) WHERE status = 0"
+    ]
+
+
+def test_interrupted_migration_resumes(monkeypatch: Any) -> None:
+    ran: List[str] = []
+
+    def run_step(step: Any) -> None:
+        if step.name.startswith("idx_transaction") and not ran:
+            ran.append("failed")
+            raise RuntimeError("connection lost")
+        ran.append(step.name)
+
+    monkeypatch.setattr(upgrade_module, "_run_step", run_step)
+    with db_session:
+        AuxiliaryData(key=DB_VERSION_KEY, value=BASE_DB_VERSION)
+        AuxiliaryData(key=MIGRATION_PROGRESS_KEY, value="21:1")
+
+    with pytest.raises(RuntimeError):
+        upgrade_db(int(BASE_DB_VERSION))
+    assert _value(DB_VERSION_KEY) == BASE_DB_VERSION
+    assert _value(MIGRATION_PROGRESS_KEY) == "21:1"
+
+    assert upgrade_db(int(BASE_DB_VERSION)) == int(CURRENT_DB_VERSION)
+    assert ran == ["failed", "idx_transaction__from_address_nonce"]
+    assert _value(DB_VERSION_KEY) == CURRENT_DB_VERSION
+
+
+def test_newer_database_is_rejected() -> None:
+    with pytest.raises(RuntimeError):
+        upgrade_db(int(CURRENT_DB_VERSION) + 1)
@@ -1,10 +1,16 @@
+from typing import Any, List
+
+import asyncio
 import json
 from unittest.mock import AsyncMock, MagicMock
 
 import pytest
 from websockets.exceptions import ConnectionClosed
 
+from slasher_proxy.avalanche.block_fetcher import BlockFetcher
 from slasher_proxy.avalanche.ws_blocks import WebSocketListener
+from slasher_proxy.common.backoff import Backoff
+from slasher_proxy.common.pipeline import run_stages
 
 message_content = {
     "params": {
@@ -14,24 +20,100 @@ message_content = {
 
 valid_message = json.dumps(message_content)
 
+full_block = {
+    "result": {
+        "number": "0x1a",
+        "hash": "0x123456",
+        "transactions": [{"hash": "0xaa", "from": "0x01", "nonce": "0x0"}],
+    }
+}
+
 
 @pytest.mark.asyncio
 async def test_process_messages_valid_block():
     mock_websocket = AsyncMock()
+    mock_fetcher = MagicMock()
+
+    listener = WebSocketListener(
+        url="wss://test.com:443",
+        parse_and_save_func=MagicMock(),
+        check_block_func=MagicMock(),
+        fetcher=mock_fetcher,
+    )
+
+    mock_websocket.recv.side_effect = [valid_message, ConnectionClosed(None, None)]
+
+    await listener._WebSocketListener__process_messages(mock_websocket)  # type: ignore[attr-defined]
+
+    mock_fetcher.announce.assert_called_once_with(26)
+
+
+@pytest.mark.asyncio
+async def test_pipeline_persists_and_verifies_full_block():
     mock_parse_and_save = MagicMock()
-    mock_check_block = MagicMock()
+    verified = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    mock_check_block = MagicMock(
+        side_effect=lambda _: loop.call_soon_threadsafe(verified.set)
+    )
+    fetcher = BlockFetcher("http://test.com/ext/bc/C/rpc")
+    fetcher.fetch_block = AsyncMock(return_value=full_block)  # type: ignore[method-assign]
 
     listener = WebSocketListener(
         url="wss://test.com:443",
         parse_and_save_func=mock_parse_and_save,
         check_block_func=mock_check_block,
+        fetcher=fetcher,
     )
+    listener.node_id = "test_node_id"
+    listener.build_stages()
+    assert listener.persist_stage and listener.verify_stage
+    tasks = [
+        asyncio.create_task(listener._WebSocketListener__fetch_blocks()),  # type: ignore[attr-defined]
+        asyncio.create_task(run_stages(listener.persist_stage, listener.verify_stage)),
+    ]
+    fetcher.announce(26)
+    await asyncio.wait_for(verified.wait(), timeout=5)
+    await listener.verify_stage.queue.join()
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
+
+    mock_parse_and_save.assert_called_once_with(full_block, "test_node_id")
+    mock_check_block.assert_called_once_with(26)
+    metrics = listener.metrics()
+    assert metrics["persist"]["processed"] == 1
+    assert metrics["verify"]["processed"] == 1
+    assert metrics["fetch"]["depth"] == 0
 
-    mock_websocket.recv.side_effect = [valid_message, ConnectionClosed(None, None)]
 
-    await listener._WebSocketListener__process_messages(mock_websocket, "test_node_id")  # type: ignore[attr-defined]
+@pytest.mark.asyncio
+async def test_restarted_pipeline_stops_the_previous_loops():
+    receiving: List["asyncio.Task[Any]"] = []
+
+    async def receive() -> None:
+        task = asyncio.current_task()
+        assert task is not None
+        receiving.append(task)
+        await asyncio.Event().wait()
 
-    mock_parse_and_save.assert_called_once_with(
-        message_content["params"], "test_node_id"
+    fetcher = MagicMock()
+    fetcher.next_block = AsyncMock(side_effect=RuntimeError("RPC down"))
+    listener = WebSocketListener(
+        url="wss://test.com:443",
+        parse_and_save_func=MagicMock(),
+        check_block_func=MagicMock(),
+        fetcher=fetcher,
+        backoff=Backoff(base=0.01, cap=0.01),
     )
-    mock_check_block.assert_called_once_with(26)
+    listener._WebSocketListener__receive = receive  # type: ignore[attr-defined]
+    task = asyncio.create_task(listener.listen())
+    await asyncio.sleep(0.3)
+    task.cancel()
+    await asyncio.gather(task, return_exceptions=True)
+
+    assert len(receiving) > 2
+    assert all(t.done() for t in receiving)
+    assert listener.persist_stage and listener.persist_stage.executor
+    with pytest.raises(RuntimeError):
+        listener.persist_stage.executor.submit(print)